@@ -13,10 +13,12 @@ All rights reserved.
 import numpy as np
 import sys
 import threading
+import weakref
 cimport numpy as np
 cimport cython
 cimport _javabridge_osspecific
 cimport cpython
+from cpython.pythread cimport PyThread_get_thread_ident
 
 if sys.version_info >= (3, 0, 0):
     # unchir -> chr in Python 3
@@ -33,6 +35,7 @@ cdef extern from "stdlib.h":
     ctypedef unsigned long size_t
     void free(void *ptr)
     void *malloc(size_t size)
+    void *realloc(void *ptr, size_t size)
 
 cdef extern from "string.h":
     void *memset(void *, int, int)
@@ -118,6 +121,11 @@ cdef extern from "jni.h":
         jboolean ignoreUnrecognized
     ctypedef JavaVMInitArgs JavaVMInitArgs
 
+    ctypedef struct JNINativeMethod:
+        char *name
+        char *signature
+        void *fnPtr
+
     struct JNIEnv_
     struct JNINativeInterface_
     ctypedef JNINativeInterface_ *JNIEnv
@@ -127,8 +135,14 @@ cdef extern from "jni.h":
         jclass (* FindClass)(JNIEnv *env, char *name) nogil
         jclass (* GetObjectClass)(JNIEnv *env, jobject obj) nogil
         jboolean (* IsInstanceOf)(JNIEnv *env, jobject obj, jclass klass) nogil
+        jboolean (* IsSameObject)(JNIEnv *env, jobject obj1, jobject obj2) nogil
         jobject (* NewGlobalRef)(JNIEnv *env, jobject lobj) nogil
         void (* DeleteGlobalRef)(JNIEnv *env, jobject gref) nogil
+        jobject (* NewLocalRef)(JNIEnv *env, jobject ref) nogil
+        jint (* ThrowNew)(JNIEnv *env, jclass clazz, char *msg) nogil
+        jint (* RegisterNatives)(JNIEnv *env, jclass clazz,
+                                 JNINativeMethod *methods, jint nMethods) nogil
+        jint (* UnregisterNatives)(JNIEnv *env, jclass clazz) nogil
         void (* DeleteLocalRef)(JNIEnv *env, jobject obj) nogil
         #
         # Exception handling
@@ -142,7 +156,7 @@ cdef extern from "jni.h":
         jmethodID (*GetMethodID)(JNIEnv *env, jclass clazz, char *name, char *sig) nogil
         jmethodID (*GetStaticMethodID)(JNIEnv *env, jclass clazz, char *name, char *sig) nogil
         jmethodID (*FromReflectedMethod)(JNIEnv *env, jobject method) nogil
-        jmethodID (*FromReflectedField)(JNIEnv *env, jobject field) nogil
+        jfieldID (*FromReflectedField)(JNIEnv *env, jobject field) nogil
         #
         # New object
         #
@@ -317,6 +331,33 @@ cdef extern from *:
     void StopVM(JavaVM *vm) nogil
     int CreateJavaVM(JavaVM **pvm, void **pEnv, void *args) nogil
 
+#
+# The current thread's JB_Env lives in a C thread-local slot so that
+# get_env() is a single pointer read. The slot holds a strong reference.
+#
+cdef extern from *:
+    """
+    #if defined(_MSC_VER)
+    #define JB_THREAD_LOCAL __declspec(thread)
+    #else
+    #define JB_THREAD_LOCAL __thread
+    #endif
+    static JB_THREAD_LOCAL PyObject *jb_thread_env = NULL;
+
+    static PyObject *jb_get_thread_env(void) {
+        return jb_thread_env;
+    }
+
+    static void jb_set_thread_env(PyObject *env) {
+        PyObject *old = jb_thread_env;
+        Py_XINCREF(env);
+        jb_thread_env = env;
+        Py_XDECREF(old);
+    }
+    """
+    cpython.PyObject *jb_get_thread_env()
+    void jb_set_thread_env(cpython.PyObject *env)
+
 def mac_run_loop_init():
     MacRunLoopInit()
 
@@ -388,31 +429,103 @@ def get_vm():
         __vm = JB_VM()
     return __vm
     
+cdef class __ThreadEnvReleaser:
+    '''Clears the C thread-local env slot when its thread exits
+    
+    One of these is stored in the thread's threading.local the first time
+    the env slot is set. The threading.local is torn down on thread exit,
+    which releases the reference that the slot holds and, if the thread
+    was attached automatically, detaches it from the VM.
+    '''
+    cdef:
+        unsigned long thread_id
+        bint detach_on_exit
+    def __cinit__(self):
+        self.thread_id = <unsigned long>PyThread_get_thread_ident()
+        self.detach_on_exit = False
+        
+    def __dealloc__(self):
+        if <unsigned long>PyThread_get_thread_ident() != self.thread_id:
+            return
+        if self.detach_on_exit and jb_get_thread_env() != NULL:
+            vm = get_vm()
+            if vm.is_active():
+                vm.detach()
+        jb_set_thread_env(NULL)
+
+cdef set_env_slot(env):
+    if env is None:
+        jb_set_thread_env(NULL)
+    else:
+        if not hasattr(__thread_local_env, "env_releaser"):
+            __thread_local_env.env_releaser = __ThreadEnvReleaser()
+        jb_set_thread_env(<cpython.PyObject *>env)
+        
+cdef current_env():
+    '''The env in this thread's slot, without attaching'''
+    cdef cpython.PyObject *env = jb_get_thread_env()
+    if env == NULL:
+        return None
+    return <object>env
+
+__auto_attach_hook = None
+
+def set_auto_attach_hook(hook):
+    '''Set the function that get_env() calls if the thread has no env
+    
+    :param hook: a function that takes no arguments, attaches the current
+                 thread and returns its environment, or None to turn
+                 automatic attachment off.
+    '''
+    global __auto_attach_hook
+    __auto_attach_hook = hook
+    
+def detach_on_thread_exit():
+    '''Detach the current thread from the VM when the thread exits'''
+    cdef __ThreadEnvReleaser releaser
+    releaser = getattr(__thread_local_env, "env_releaser", None)
+    assert releaser is not None
+    releaser.detach_on_exit = True
+
 def get_thread_local(key, default=None):
+    if key == "env":
+        return current_env()
     if not hasattr(__thread_local_env, key):
         setattr(__thread_local_env, key, default)
     return getattr(__thread_local_env, key)
     
 def set_thread_local(key, value):
-    setattr(__thread_local_env, key, value)
+    if key == "env":
+        set_env_slot(value)
+    else:
+        setattr(__thread_local_env, key, value)
     
 def get_env():
     '''Get the environment for this thread'''
-    return get_thread_local("env")
+    cdef cpython.PyObject *env = jb_get_thread_env()
+    if env == NULL:
+        if __auto_attach_hook is not None:
+            return __auto_attach_hook()
+        return None
+    return <object>env
     
 def jb_attach():
     '''Attach to this thread's environment'''
     assert __vm is not None
-    assert get_env() is None
+    assert current_env() is None
     assert __vm.is_active()
     set_thread_local("env", __vm.attach_as_daemon())
-    return get_env()
+    return current_env()
     
 def jb_detach():
     '''Detach from this thread's environment'''
+    cdef __ThreadEnvReleaser releaser
     assert __vm is not None
-    assert get_env() is not None
+    assert current_env() is not None
     set_thread_local("env", None)
+    releaser = getattr(__thread_local_env, "env_releaser", None)
+    if releaser is not None:
+        releaser.detach_on_exit = False
     __vm.detach()
     
 def jni_enter(env):
@@ -427,7 +540,7 @@ def jni_enter(env):
     if env_stack is None:
         env_stack = []
         set_thread_local("envstack", env_stack)
-    old_env = get_env()
+    old_env = current_env()
     if old_env is not None:
         env_stack.append(old_env)
     new_env = JB_Env()
@@ -454,7 +567,7 @@ def jvm_enter(vm):
 def reap():
     '''Reap all of the garbage-collected Java objects on the dead_objects list'''
     if len(__dead_objects) > 0:
-        env = get_env()
+        env = current_env()
         assert env is not None
         try:
             while True:
@@ -463,11 +576,17 @@ def reap():
         except IndexError:
             pass
 
+#
+# JB_Object and JB_Class are allocated for every Java object that crosses
+# into Python, so they keep a free list of deallocated instances around
+# for reuse instead of going back to the Python allocator each time.
+#
+@cython.freelist(256)
 cdef class JB_Object:
     '''Represents a Java object.'''
     cdef:
         jobject o
-        gc_collect
+        bint gc_collect
     def __cinit__(self):
         self.o = NULL
         self.gc_collect = False
@@ -479,7 +598,7 @@ cdef class JB_Object:
             JB_Object alternate
         if not self.gc_collect:
             return
-        env = get_env()
+        env = current_env()
         if env is None:
             alternate = JB_Object()
             alternate.o = self.o
@@ -490,8 +609,9 @@ cdef class JB_Object:
 
     def addr(self):
         '''Return the address of the Java object as a string'''
-        return str(<int>(self.o))
+        return str(<size_t>(self.o))
         
+@cython.freelist(64)
 cdef class JB_Class:
     '''A Java class'''
     cdef:
@@ -796,8 +916,11 @@ cdef class JB_Env:
         cdef:
             jclass c
             JB_Class result
+            char *cname
         utf8name = name.encode('utf-8')
-        c = self.env[0].FindClass(self.env, utf8name)
+        cname = utf8name
+        with nogil:
+            c = self.env[0].FindClass(self.env, cname)
         if c == NULL:
             print("Failed to get class "+name)
             return
@@ -833,6 +956,18 @@ cdef class JB_Env:
         result = self.env[0].IsInstanceOf(self.env, o.o, c.c)
         return result != 0
 
+    def is_same_object(self, JB_Object o1, JB_Object o2):
+        '''Return True if two references refer to the same Java object
+        
+        :param o1: a Java object or None for null
+        :param o2: a Java object or None for null
+        :return: True if o1 and o2 are the same object or both are null
+        '''
+        cdef:
+            jobject jo1 = NULL if o1 is None else o1.o
+            jobject jo2 = NULL if o2 is None else o2.o
+        return self.env[0].IsSameObject(self.env, jo1, jo2) != 0
+
     def exception_occurred(self):
         '''Return a throwable if an exception occurred or None'''
         cdef:
@@ -905,10 +1040,11 @@ cdef class JB_Env:
         result.is_static = True
         return result
 
-    def from_reflected_method(self, JB_Object method, char *sig, is_static):
+    def from_reflected_method(self, JB_Object method, sig, is_static):
         '''Get a method_id given an instance of java.lang.reflect.Method
         
-        :param method: a method, e.g. as retrieved from getDeclaredMethods
+        :param method: a method, e.g. as retrieved from getDeclaredMethods,
+                       or a constructor
         :param sig: signature of method
         :param is_static: true if this is a static method
         '''
@@ -1110,7 +1246,8 @@ cdef class JB_Env:
                 if e is not None:
                     raise e
         elif sig == 'V':
-            self.env[0].CallStaticVoidMethodA(self.env, c.c, m.id, values)
+            with nogil:
+                jnienv[0].CallStaticVoidMethodA(jnienv, klass, m_id, values)
             result = None
         else:
             free(<void *>values)
@@ -1141,6 +1278,25 @@ cdef class JB_Env:
         jbid.is_static = False
         return jbid
         
+    def from_reflected_field(self, JB_Object field, sig, is_static):
+        '''Get a field ID given an instance of java.lang.reflect.Field
+        
+        :param field: a field, e.g. as retrieved from getFields
+        :param sig: signature of the field (e.g. Ljava/lang/String;)
+        :param is_static: true if this is a static field
+        '''
+        cdef:
+            jfieldID id
+            __JB_FieldID jbid
+        id = self.env[0].FromReflectedField(self.env, field.o)
+        if id == NULL:
+            return None
+        jbid = __JB_FieldID()
+        jbid.id = id
+        jbid.sig = sig
+        jbid.is_static = is_static
+        return jbid
+
     def get_object_field(self, JB_Object o, __JB_FieldID field):
         '''Return an object field
 
@@ -1151,7 +1307,8 @@ cdef class JB_Env:
         '''
         cdef:
             jobject subo
-        subo = self.env[0].GetObjectField(self.env, o.o, field.id)
+        with nogil:
+            subo = self.env[0].GetObjectField(self.env, o.o, field.id)
         if subo == NULL:
             return
         result, e = make_jb_object(self, subo)
@@ -1168,7 +1325,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype: bool
         '''
-        return self.env[0].GetBooleanField(self.env, o.o, field.id) != 0
+        cdef:
+            jboolean result
+        with nogil:
+            result = self.env[0].GetBooleanField(self.env, o.o, field.id)
+        return result != 0
         
     def get_byte_field(self, JB_Object o, __JB_FieldID field):
         '''Return a byte field's value
@@ -1179,7 +1340,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype: int
         '''
-        return self.env[0].GetByteField(self.env, o.o, field.id)
+        cdef:
+            jbyte result
+        with nogil:
+            result = self.env[0].GetByteField(self.env, o.o, field.id)
+        return result
         
     def get_char_field(self, JB_Object o, __JB_FieldID field):
         '''Return a char field's value
@@ -1190,7 +1355,11 @@ cdef class JB_Env:
         :return: the char value stored in the class's field
         :rtype: unichr
         '''
-        return unichr(self.env[0].GetCharField(self.env, o.o, field.id))
+        cdef:
+            jchar result
+        with nogil:
+            result = self.env[0].GetCharField(self.env, o.o, field.id)
+        return unichr(result)
 
     def get_short_field(self, JB_Object o, __JB_FieldID field):
         '''Return a short field's value
@@ -1201,7 +1370,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype:  int
         '''
-        return self.env[0].GetShortField(self.env, o.o, field.id)
+        cdef:
+            jshort result
+        with nogil:
+            result = self.env[0].GetShortField(self.env, o.o, field.id)
+        return result
         
     def get_int_field(self, JB_Object o, __JB_FieldID field):
         '''Return an int field's value
@@ -1212,7 +1385,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype:  int
         '''
-        return self.env[0].GetIntField(self.env, o.o, field.id)
+        cdef:
+            jint result
+        with nogil:
+            result = self.env[0].GetIntField(self.env, o.o, field.id)
+        return result
         
     def get_long_field(self, JB_Object o, __JB_FieldID field):
         '''Return a long field's value
@@ -1223,7 +1400,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype:  long
         '''
-        return self.env[0].GetLongField(self.env, o.o, field.id)
+        cdef:
+            jlong result
+        with nogil:
+            result = self.env[0].GetLongField(self.env, o.o, field.id)
+        return result
         
     def get_float_field(self, JB_Object o, __JB_FieldID field):
         '''Return a float field's value
@@ -1234,7 +1415,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype:  float
         '''
-        return self.env[0].GetFloatField(self.env, o.o, field.id)
+        cdef:
+            jfloat result
+        with nogil:
+            result = self.env[0].GetFloatField(self.env, o.o, field.id)
+        return result
         
     def get_double_field(self, JB_Object o, __JB_FieldID field):
         '''Return a double field's value
@@ -1245,7 +1430,11 @@ cdef class JB_Env:
         :return: the field's value
         :rtype:  float
         '''
-        return self.env[0].GetDoubleField(self.env, o.o, field.id)
+        cdef:
+            jdouble result
+        with nogil:
+            result = self.env[0].GetDoubleField(self.env, o.o, field.id)
+        return result
         
     def set_object_field(self, JB_Object o, __JB_FieldID field, JB_Object value):
         '''Set one of a Java object's object fields
@@ -1256,7 +1445,8 @@ cdef class JB_Env:
         '''
         cdef:
             jobject jvalue = NULL if value is None else value.o
-        self.env[0].SetObjectField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetObjectField(self.env, o.o, field.id, jvalue)
         
     def set_boolean_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's boolean fields
@@ -1267,7 +1457,8 @@ cdef class JB_Env:
         '''
         cdef:
             jboolean jvalue = 1 if value else 0
-        self.env[0].SetBooleanField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetBooleanField(self.env, o.o, field.id, jvalue)
         
     def set_byte_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's byte fields
@@ -1278,7 +1469,8 @@ cdef class JB_Env:
         '''
         cdef:
             jbyte jvalue = int(value)
-        self.env[0].SetByteField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetByteField(self.env, o.o, field.id, jvalue)
         
     def set_char_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's char fields
@@ -1289,7 +1481,8 @@ cdef class JB_Env:
         '''
         cdef:
             jchar jvalue = ord(value[0])
-        self.env[0].SetCharField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetCharField(self.env, o.o, field.id, jvalue)
         
     def set_short_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's short fields
@@ -1300,7 +1493,8 @@ cdef class JB_Env:
         '''
         cdef:
             jshort jvalue = int(value)
-        self.env[0].SetShortField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetShortField(self.env, o.o, field.id, jvalue)
         
     def set_int_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's byte fields
@@ -1311,7 +1505,8 @@ cdef class JB_Env:
         '''
         cdef:
             jint jvalue = int(value)
-        self.env[0].SetIntField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetIntField(self.env, o.o, field.id, jvalue)
         
     def set_long_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's long fields
@@ -1322,7 +1517,8 @@ cdef class JB_Env:
         '''
         cdef:
             jlong jvalue = int(value)
-        self.env[0].SetLongField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetLongField(self.env, o.o, field.id, jvalue)
         
     def set_float_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's byte fields
@@ -1333,7 +1529,8 @@ cdef class JB_Env:
         '''
         cdef:
             jfloat jvalue = float(value)
-        self.env[0].SetFloatField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetFloatField(self.env, o.o, field.id, jvalue)
         
     def set_double_field(self, JB_Object o, __JB_FieldID field, value):
         '''Set one of a Java object's float fields
@@ -1344,7 +1541,8 @@ cdef class JB_Env:
         '''
         cdef:
             jdouble jvalue = float(value)
-        self.env[0].SetDoubleField(self.env, o.o, field.id, jvalue)
+        with nogil:
+            self.env[0].SetDoubleField(self.env, o.o, field.id, jvalue)
 
     def get_static_field_id(self, JB_Class c, name, sig):
         '''Look up a static field ID on a class
@@ -1381,7 +1579,8 @@ cdef class JB_Env:
         '''
         cdef:
             jobject o
-        o = self.env[0].GetStaticObjectField(self.env, c.c, field.id)
+        with nogil:
+            o = self.env[0].GetStaticObjectField(self.env, c.c, field.id)
         if o == NULL:
             return
         result, e = make_jb_object(self, o)
@@ -1398,7 +1597,11 @@ cdef class JB_Env:
         :return: the boolean value stored in the class's static field
         :rtype: bool
         '''
-        return self.env[0].GetStaticBooleanField(self.env, c.c, field.id) != 0
+        cdef:
+            jboolean result
+        with nogil:
+            result = self.env[0].GetStaticBooleanField(self.env, c.c, field.id)
+        return result != 0
         
     def get_static_char_field(self, JB_Class c, __JB_FieldID field):
         '''Return a char static field's value
@@ -1409,7 +1612,11 @@ cdef class JB_Env:
         :return: the char value stored in the class's static field
         :rtype: unichr
         '''
-        return unichr(self.env[0].GetStaticCharField(self.env, c.c, field.id))
+        cdef:
+            jchar result
+        with nogil:
+            result = self.env[0].GetStaticCharField(self.env, c.c, field.id)
+        return unichr(result)
         
     def get_static_byte_field(self, JB_Class c, __JB_FieldID field):
         '''Return a byte static field's value
@@ -1420,7 +1627,11 @@ cdef class JB_Env:
         :return: the byte value stored in the class's static field
         :rtype: int
         '''
-        return self.env[0].GetStaticByteField(self.env, c.c, field.id)
+        cdef:
+            jbyte result
+        with nogil:
+            result = self.env[0].GetStaticByteField(self.env, c.c, field.id)
+        return result
         
     def get_static_short_field(self, JB_Class c, __JB_FieldID field):
         '''Return a short static field's value
@@ -1431,7 +1642,11 @@ cdef class JB_Env:
         :return: the short stored in the class's static field
         :rtype: JB_Object
         '''
-        return self.env[0].GetStaticShortField(self.env, c.c, field.id)
+        cdef:
+            jshort result
+        with nogil:
+            result = self.env[0].GetStaticShortField(self.env, c.c, field.id)
+        return result
         
     def get_static_int_field(self, JB_Class c, __JB_FieldID field):
         '''Return an int field's value
@@ -1442,7 +1657,11 @@ cdef class JB_Env:
         :return: the integer value stored in the class's static field
         :rtype: int
         '''
-        return self.env[0].GetStaticIntField(self.env, c.c, field.id)
+        cdef:
+            jint result
+        with nogil:
+            result = self.env[0].GetStaticIntField(self.env, c.c, field.id)
+        return result
         
     def get_static_long_field(self, JB_Class c, __JB_FieldID field):
         '''Return a long field's value
@@ -1453,7 +1672,11 @@ cdef class JB_Env:
         :return: the long value stored in the class's static field
         :rtype: long
         '''
-        return self.env[0].GetStaticLongField(self.env, c.c, field.id)
+        cdef:
+            jlong result
+        with nogil:
+            result = self.env[0].GetStaticLongField(self.env, c.c, field.id)
+        return result
         
     def get_static_float_field(self, JB_Class c, __JB_FieldID field):
         '''Return a float field's value
@@ -1464,7 +1687,11 @@ cdef class JB_Env:
         :return: the float value stored in the class's static field
         :rtype: float
         '''
-        return self.env[0].GetStaticFloatField(self.env, c.c, field.id)
+        cdef:
+            jfloat result
+        with nogil:
+            result = self.env[0].GetStaticFloatField(self.env, c.c, field.id)
+        return result
         
     def get_static_double_field(self, JB_Class c, __JB_FieldID field):
         '''Return a double field's value
@@ -1475,7 +1702,11 @@ cdef class JB_Env:
         :return: the double value stored in the class's static field
         :rtype: float
         '''
-        return self.env[0].GetStaticDoubleField(self.env, c.c, field.id)
+        cdef:
+            jdouble result
+        with nogil:
+            result = self.env[0].GetStaticDoubleField(self.env, c.c, field.id)
+        return result
         
     def set_static_object_field(self, JB_Class c, __JB_FieldID field, JB_Object o):
         '''Set a static object field in a class
@@ -1486,7 +1717,8 @@ cdef class JB_Env:
         '''
         cdef:
             jobject jvalue = NULL if o is None else o.o
-        self.env[0].SetStaticObjectField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticObjectField(self.env, c.c, field.id, jvalue)
         
     def set_static_boolean_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static boolean field in a class
@@ -1497,7 +1729,8 @@ cdef class JB_Env:
         '''
         cdef:
             jboolean jvalue = 1 if value else 0
-        self.env[0].SetStaticBooleanField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticBooleanField(self.env, c.c, field.id, jvalue)
         
     def set_static_char_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static char field in a class
@@ -1508,7 +1741,8 @@ cdef class JB_Env:
         '''
         cdef:
             jchar jvalue = ord(value[0])
-        self.env[0].SetStaticCharField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticCharField(self.env, c.c, field.id, jvalue)
         
     def set_static_byte_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static byte field in a class
@@ -1519,7 +1753,8 @@ cdef class JB_Env:
         '''
         cdef:
             jbyte jvalue = int(value)
-        self.env[0].SetStaticByteField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticByteField(self.env, c.c, field.id, jvalue)
         
     def set_static_char_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static char field in a class
@@ -1530,7 +1765,8 @@ cdef class JB_Env:
         '''
         cdef:
             jchar jvalue = ord(value[0])
-        self.env[0].SetStaticCharField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticCharField(self.env, c.c, field.id, jvalue)
         
     def set_static_short_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static short field in a class
@@ -1541,7 +1777,8 @@ cdef class JB_Env:
         '''
         cdef:
             jshort jvalue = int(value)
-        self.env[0].SetStaticShortField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticShortField(self.env, c.c, field.id, jvalue)
         
     def set_static_int_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static int field in a class
@@ -1552,7 +1789,8 @@ cdef class JB_Env:
         '''
         cdef:
             jint jvalue = int(value)
-        self.env[0].SetStaticIntField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticIntField(self.env, c.c, field.id, jvalue)
         
     def set_static_long_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static long field in a class
@@ -1563,7 +1801,8 @@ cdef class JB_Env:
         '''
         cdef:
             jlong jvalue = int(value)
-        self.env[0].SetStaticLongField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticLongField(self.env, c.c, field.id, jvalue)
         
     def set_static_float_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static float field in a class
@@ -1574,7 +1813,8 @@ cdef class JB_Env:
         '''
         cdef:
             jfloat jvalue = float(value)
-        self.env[0].SetStaticFloatField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticFloatField(self.env, c.c, field.id, jvalue)
         
     def set_static_double_field(self, JB_Class c, __JB_FieldID field, value):
         '''Set a static double field in a class
@@ -1585,7 +1825,8 @@ cdef class JB_Env:
         '''
         cdef:
             jdouble jvalue = float(value)
-        self.env[0].SetStaticDoubleField(self.env, c.c, field.id, jvalue)
+        with nogil:
+            self.env[0].SetStaticDoubleField(self.env, c.c, field.id, jvalue)
 
     def new_object(self, JB_Class c, __JB_MethodID m, *args):
         '''Call a class constructor with arguments
@@ -1643,7 +1884,8 @@ cdef class JB_Env:
         u16 = u.encode("utf-16")
         nchars = len(u16) // 2 - 1
         s = u16
-        o = self.env[0].NewString(self.env, <jchar *>s+1, nchars)
+        with nogil:
+            o = self.env[0].NewString(self.env, <jchar *>s+1, nchars)
         if o == NULL:
             raise MemoryError("Failed to allocate string")
         jbo, e = make_jb_object(self, o)
@@ -1660,7 +1902,11 @@ cdef class JB_Env:
         '''
         cdef:
             jobject o
-        o = self.env[0].NewStringUTF(self.env, s.encode('utf-8'))
+            char *chars
+        utf8 = s.encode('utf-8')
+        chars = utf8
+        with nogil:
+            o = self.env[0].NewStringUTF(self.env, chars)
         if o == NULL:
             raise MemoryError("Failed to allocate string")
         jbo, e = make_jb_object(self, o)
@@ -1681,10 +1927,12 @@ cdef class JB_Env:
             int byteorder = 0
         if <int>s.o == 0:
             return None
-        chars = self.env[0].GetStringChars(self.env, s.o, NULL)
+        with nogil:
+            chars = self.env[0].GetStringChars(self.env, s.o, NULL)
         result = PyUnicode_DecodeUTF16(
             <const char *>chars, nchars*2, "ignore", &byteorder)
-        self.env[0].ReleaseStringChars(self.env, s.o, chars)
+        with nogil:
+            self.env[0].ReleaseStringChars(self.env, s.o, chars)
         return result
 
     def get_string_utf(self, JB_Object s):
@@ -1698,9 +1946,11 @@ cdef class JB_Env:
            const char *chars 
         if <int> s.o == 0:
            return None
-        chars = self.env[0].GetStringUTFChars(self.env, s.o, NULL)
+        with nogil:
+            chars = self.env[0].GetStringUTFChars(self.env, s.o, NULL)
         result = chars.decode('utf-8')
-        self.env[0].ReleaseStringUTFChars(self.env, s.o, chars)
+        with nogil:
+            self.env[0].ReleaseStringUTFChars(self.env, s.o, chars)
         return result
 
     def get_array_length(self, JB_Object array):
@@ -1723,8 +1973,9 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.uint8)
         data = result.data
-        self.env[0].GetBooleanArrayRegion(self.env, array.o, 0, alen, <jboolean *>data)
-        return result.astype(np.bool8)
+        with nogil:
+            self.env[0].GetBooleanArrayRegion(self.env, array.o, 0, alen, <jboolean *>data)
+        return result.astype(np.bool_)
         
     def get_byte_array_elements(self, JB_Object array):
         '''Return the contents of a Java byte array as a numpy array
@@ -1739,7 +1990,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.uint8)
         data = result.data
-        self.env[0].GetByteArrayRegion(self.env, array.o, 0, alen, <jbyte *>data)
+        with nogil:
+            self.env[0].GetByteArrayRegion(self.env, array.o, 0, alen, <jbyte *>data)
         return result
         
     def get_short_array_elements(self, JB_Object array):
@@ -1755,7 +2007,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.int16)
         data = result.data
-        self.env[0].GetShortArrayRegion(self.env, array.o, 0, alen, <jshort *>data)
+        with nogil:
+            self.env[0].GetShortArrayRegion(self.env, array.o, 0, alen, <jshort *>data)
         return result
 
     def get_int_array_elements(self, JB_Object array):
@@ -1771,7 +2024,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.int32)
         data = result.data
-        self.env[0].GetIntArrayRegion(self.env, array.o, 0, alen, <jint *>data)
+        with nogil:
+            self.env[0].GetIntArrayRegion(self.env, array.o, 0, alen, <jint *>data)
         return result
     
     def get_long_array_elements(self, JB_Object array):
@@ -1787,7 +2041,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.int64)
         data = result.data
-        self.env[0].GetLongArrayRegion(self.env, array.o, 0, alen, <jlong *>data)
+        with nogil:
+            self.env[0].GetLongArrayRegion(self.env, array.o, 0, alen, <jlong *>data)
         return result
         
     def get_float_array_elements(self, JB_Object array):
@@ -1803,7 +2058,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.float32)
         data = result.data
-        self.env[0].GetFloatArrayRegion(self.env, array.o, 0, alen, <jfloat *>data)
+        with nogil:
+            self.env[0].GetFloatArrayRegion(self.env, array.o, 0, alen, <jfloat *>data)
         return result
         
     def get_double_array_elements(self, JB_Object array):
@@ -1819,7 +2075,8 @@ cdef class JB_Env:
 
         result = np.zeros(shape=(alen,),dtype=np.float64)
         data = result.data
-        self.env[0].GetDoubleArrayRegion(self.env, array.o, 0, alen, <jdouble *>data)
+        with nogil:
+            self.env[0].GetDoubleArrayRegion(self.env, array.o, 0, alen, <jdouble *>data)
         return result
         
     def get_object_array_elements(self, JB_Object array):
@@ -1843,15 +2100,17 @@ cdef class JB_Env:
     def make_boolean_array(self, array):
         '''Create a java boolean [] array from the contents of a numpy array'''
         cdef:
-            np.ndarray[dtype=np.uint8_t, ndim=1, negative_indices=False, mode='c'] barray = array.astype(np.bool8).astype(np.uint8)
+            np.ndarray[dtype=np.uint8_t, ndim=1, negative_indices=False, mode='c'] barray = array.astype(np.bool_).astype(np.uint8)
             jobject o
             jsize alen = barray.shape[0]
             jboolean *data = <jboolean *>(barray.data)
         
-        o = self.env[0].NewBooleanArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewBooleanArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate byte array of size %d"%alen)
-        self.env[0].SetBooleanArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetBooleanArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1864,10 +2123,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jbyte *data = <jbyte *>(array.data)
         
-        o = self.env[0].NewByteArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewByteArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate byte array of size %d"%alen)
-        self.env[0].SetByteArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetByteArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1880,10 +2141,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jshort *data = <jshort *>(array.data)
         
-        o = self.env[0].NewShortArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewShortArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate short array of size %d"%alen)
-        self.env[0].SetShortArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetShortArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1896,10 +2159,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jint *data = <jint *>(array.data)
         
-        o = self.env[0].NewIntArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewIntArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate int array of size %d"%alen)
-        self.env[0].SetIntArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetIntArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1912,10 +2177,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jlong *data = <jlong *>(array.data)
         
-        o = self.env[0].NewLongArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewLongArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate long array of size %d"%alen)
-        self.env[0].SetLongArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetLongArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1928,10 +2195,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jfloat *data = <jfloat *>(array.data)
         
-        o = self.env[0].NewFloatArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewFloatArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate float array of size %d"%alen)
-        self.env[0].SetFloatArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetFloatArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1944,10 +2213,12 @@ cdef class JB_Env:
             jsize alen = array.shape[0]
             jdouble *data = <jdouble *>(array.data)
         
-        o = self.env[0].NewDoubleArray(self.env, alen)
+        with nogil:
+            o = self.env[0].NewDoubleArray(self.env, alen)
         if o == NULL:
             raise MemoryError("Failed to allocate double array of size %d"%alen)
-        self.env[0].SetDoubleArrayRegion(self.env, o, 0, alen, data)
+        with nogil:
+            self.env[0].SetDoubleArrayRegion(self.env, o, 0, alen, data)
         result, e = make_jb_object(self, o)
         if e is not None:
             raise e
@@ -1961,7 +2232,8 @@ cdef class JB_Env:
         '''
         cdef:
             jobject o
-        o = self.env[0].NewObjectArray(self.env, len, klass.c, NULL)
+        with nogil:
+            o = self.env[0].NewObjectArray(self.env, len, klass.c, NULL)
         if o == NULL:
             raise MemoryError("Failed to allocate object array of size %d" % len)
         result, e = make_jb_object(self, o)
@@ -1999,6 +2271,80 @@ cdef class JB_Env:
         jbo.gc_collect = False
         return jbo
         
+    def wrap_local_ref(self, address):
+        '''Wrap a local reference, such as a native method's argument
+        
+        :param address: the local reference, as an integer
+        :returns: a JB_Object holding a global reference to the object,
+                  or None for a null reference
+        '''
+        cdef:
+            jobject oref
+            JB_Object jbo
+        if not address:
+            return None
+        oref = self.env[0].NewGlobalRef(self.env, <jobject><size_t>address)
+        if oref == NULL:
+            raise MemoryError("Failed to make new global reference")
+        jbo = JB_Object()
+        jbo.o = oref
+        jbo.gc_collect = True
+        return jbo
+    
+    def new_local_ref(self, JB_Object o):
+        '''Make a local reference to an object, e.g. for a native method's result
+        
+        :param o: a Java object or None
+        :returns: the local reference as an integer, 0 for None
+        '''
+        if o is None:
+            return 0
+        return <size_t>self.env[0].NewLocalRef(self.env, o.o)
+    
+    def throw_new(self, JB_Class c, message):
+        '''Throw a new exception of the given class with the given message
+        
+        The exception is thrown when control returns to Java.
+        '''
+        utf8message = message.encode("utf-8")
+        if self.env[0].ThrowNew(self.env, c.c, utf8message) != 0:
+            raise MemoryError("Failed to throw exception")
+    
+    def register_natives(self, JB_Class c, methods):
+        '''Bind native methods of a class to C functions
+        
+        :param c: the class declaring the native methods
+        :param methods: a sequence of tuples of method name, signature and
+                        the address of the C function, as an integer. The
+                        function must remain valid until the class is
+                        unloaded or unregister_natives() is called.
+        :returns: True on success, False if a Java exception was raised.
+        '''
+        cdef:
+            JNINativeMethod *native_methods
+            jint n_methods = len(methods)
+            jint result
+        encoded = [(name.encode("utf-8"), sig.encode("utf-8"), address)
+                   for name, sig, address in methods]
+        native_methods = <JNINativeMethod *>malloc(
+            sizeof(JNINativeMethod) * n_methods)
+        if native_methods == NULL:
+            raise MemoryError("Failed to allocate native methods")
+        try:
+            for i, (name, sig, address) in enumerate(encoded):
+                native_methods[i].name = name
+                native_methods[i].signature = sig
+                native_methods[i].fnPtr = <void *><size_t>address
+            result = self.env[0].RegisterNatives(
+                self.env, c.c, native_methods, n_methods)
+        finally:
+            free(native_methods)
+        return result == 0
+    
+    def unregister_natives(self, JB_Class c):
+        '''Unbind the native methods registered for a class'''
+        self.env[0].UnregisterNatives(self.env, c.c)
+        
 cdef make_jb_object(JB_Env env, jobject o):
     '''Wrap a Java object in a JB_Object with appropriate reference handling
     
@@ -2018,3 +2364,149 @@ cdef make_jb_object(JB_Env env, jobject o):
     jbo.o = oref
     jbo.gc_collect = True
     return (jbo, None)
+
+#######################################################
+#
+# The handle table lets Java refer to Python objects by an integer
+# handle, for instance for the jrefs in jutil and for JProxy handlers.
+#
+#######################################################
+
+class _HandleRef(weakref.ref):
+    '''A weak reference that knows the handle table slot it occupies'''
+    __slots__ = ("index",)
+
+cdef class HandleTable:
+    '''A table of weakly-referenced Python objects, keyed by integer handles
+    
+    A handle holds a slot index in its low 32 bits and the slot's
+    generation in the high bits. The generation is incremented whenever a
+    slot is freed, so a handle to a slot that has been reused for another
+    object is rejected instead of redeeming the wrong object.
+    
+    A slot is freed when its object is garbage-collected. lock() holds a
+    strong reference to the object until a matching number of unlock()
+    calls have been made.
+    '''
+    cdef:
+        list refs
+        list strong_refs
+        list free_slots
+        unsigned int *generations
+        unsigned int *lock_counts
+        size_t capacity
+        object on_collect
+        
+    def __cinit__(self):
+        self.refs = []
+        self.strong_refs = []
+        self.free_slots = []
+        self.generations = NULL
+        self.lock_counts = NULL
+        self.capacity = 0
+        self.on_collect = self._on_collect
+        
+    def __dealloc__(self):
+        free(self.generations)
+        free(self.lock_counts)
+        
+    def __len__(self):
+        return len(self.refs) - len(self.free_slots)
+        
+    cdef int grow(self) except -1:
+        cdef:
+            size_t capacity = max(16, 2 * self.capacity)
+            void *generations
+            void *lock_counts
+        generations = realloc(self.generations, capacity * sizeof(unsigned int))
+        if generations == NULL:
+            raise MemoryError("Failed to grow the handle table")
+        self.generations = <unsigned int *>generations
+        lock_counts = realloc(self.lock_counts, capacity * sizeof(unsigned int))
+        if lock_counts == NULL:
+            raise MemoryError("Failed to grow the handle table")
+        self.lock_counts = <unsigned int *>lock_counts
+        self.capacity = capacity
+        return 0
+        
+    def _on_collect(self, ref):
+        cdef size_t index = ref.index
+        if self.refs[index] is not ref:
+            return
+        self.refs[index] = None
+        self.generations[index] = (self.generations[index] + 1) & 0x7fffffff
+        self.free_slots.append(index)
+        
+    cdef long slot(self, handle) except -1:
+        '''Return the slot index for a handle or raise KeyError if stale'''
+        cdef:
+            unsigned long long h
+            long index
+        try:
+            h = handle
+        except (OverflowError, TypeError):
+            raise KeyError(handle)
+        index = h & 0xffffffff
+        if index >= len(self.refs) or \
+           self.generations[index] != (h >> 32) or \
+           self.refs[index] is None:
+            raise KeyError(handle)
+        return index
+        
+    def add(self, value):
+        '''Store a weak reference to a value
+        
+        :param value: the value to store. It must support weak references.
+        
+        :returns: an integer handle that can be used to get the value
+                  for as long as it is alive.
+        '''
+        cdef size_t index
+        ref = _HandleRef(value, self.on_collect)
+        if len(self.free_slots) > 0:
+            index = self.free_slots.pop()
+            self.refs[index] = ref
+        else:
+            index = len(self.refs)
+            if index == self.capacity:
+                self.grow()
+            self.generations[index] = 0
+            self.refs.append(ref)
+            self.strong_refs.append(None)
+        self.lock_counts[index] = 0
+        ref.index = index
+        return (<unsigned long long>self.generations[index] << 32) | index
+    
+    def get(self, handle):
+        '''Get the value for a handle
+        
+        Raises KeyError if the value has been garbage-collected.
+        '''
+        value = self.refs[self.slot(handle)]()
+        if value is None:
+            raise KeyError(handle)
+        return value
+    
+    def lock(self, handle):
+        '''Keep the value for a handle alive until it is unlocked'''
+        cdef long index = self.slot(handle)
+        if self.lock_counts[index] == 0:
+            value = self.refs[index]()
+            if value is None:
+                raise KeyError(handle)
+            self.strong_refs[index] = value
+        self.lock_counts[index] += 1
+        
+    def unlock(self, handle):
+        '''Undo one call to lock()
+        
+        The value can be garbage-collected once every lock() call has
+        been matched by a call to unlock(). Raises KeyError if the
+        handle is not locked.
+        '''
+        cdef long index = self.slot(handle)
+        if self.lock_counts[index] == 0:
+            raise KeyError(handle)
+        self.lock_counts[index] -= 1
+        if self.lock_counts[index] == 0:
+            self.strong_refs[index] = None
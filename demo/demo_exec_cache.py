@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""demo_exec_cache.py - measure the cost of running short scripts from Java
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+CPython.exec(String) caches the code compiled for each script, so Java
+code that runs the same snippet over and over only compiles it once.
+This times a short script run through CPython.exec when every script is
+new (so each one is compiled), when the same script is repeated and
+when it is compiled once with CPython.compile and run by handle.
+
+Usage: demo_exec_cache.py [count]
+"""
+
+from __future__ import print_function
+import sys
+import timeit
+import javabridge
+
+SCRIPT = """
+total = 0
+for i in range(10):
+    total += i * i
+"""
+
+
+def main(count=10000):
+    env = javabridge.get_env()
+    klass = env.find_class("org/cellprofiler/javabridge/CPython")
+    cpython = javabridge.make_instance(
+        "org/cellprofiler/javabridge/CPython", "()V")
+    exec_id = env.get_method_id(
+        klass, "exec", "(Ljava/lang/String;Ljava/util/Map;Ljava/util/Map;)V")
+    exec_handle_id = env.get_method_id(
+        klass, "exec", "(JLjava/util/Map;Ljava/util/Map;)V")
+    unique = [env.new_string_utf(SCRIPT + "# %d\n" % i) for i in range(count)]
+    repeated = env.new_string_utf(SCRIPT)
+    handle = javabridge.call(
+        cpython, "compile", "(Ljava/lang/String;)J", SCRIPT)
+
+    def run_unique():
+        for script in unique:
+            env.call_method(cpython, exec_id, script, None, None)
+
+    def run_repeated():
+        for _ in range(count):
+            env.call_method(cpython, exec_id, repeated, None, None)
+
+    def run_compiled():
+        for _ in range(count):
+            env.call_method(cpython, exec_handle_id, handle, None, None)
+
+    print("%d runs of a %d-line script" % (count, SCRIPT.count("\n")))
+    print("                     total s   us/run")
+    for name, fn in (("exec, new scripts", run_unique),
+                     ("exec, same script", run_repeated),
+                     ("compile + exec", run_compiled)):
+        elapsed = timeit.timeit(fn, number=1)
+        print("%-20s %8.3f %8.1f" % (name, elapsed, elapsed * 1e6 / count))
+    javabridge.call(cpython, "releaseCode", "(J)V", handle)
+
+
+if __name__ == "__main__":
+    javabridge.start_vm(run_headless=True)
+    try:
+        main(*[int(arg) for arg in sys.argv[1:2]])
+    finally:
+        javabridge.kill_vm()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""demo_threaded_transfer.py - measure how JNI work scales with threads
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+The Javabridge releases the GIL while the JVM copies arrays, looks up
+classes and runs methods, so several Python threads can keep the JVM
+busy at once. This times a fixed amount of array transfer and class
+lookup split across 1, 2, 4, ... threads.
+
+Usage: demo_threaded_transfer.py [max-threads [array-size]]
+"""
+
+from __future__ import print_function
+import sys
+import timeit
+import numpy as np
+import javabridge
+
+CLASS_NAMES = [
+    "java/lang/String", "java/lang/Integer", "java/lang/Double",
+    "java/util/ArrayList", "java/util/HashMap", "java/util/TreeMap",
+    "java/util/LinkedList", "java/util/concurrent/ConcurrentHashMap",
+    "java/util/concurrent/FutureTask", "java/io/File",
+    "java/io/ByteArrayOutputStream", "java/math/BigInteger",
+    "java/math/BigDecimal", "java/text/SimpleDateFormat",
+    "java/util/regex/Pattern", "java/util/zip/ZipFile"]
+
+
+def transfer_arrays(env, array, count):
+    for _ in range(count):
+        jarray = env.make_double_array(array)
+        env.get_double_array_elements(jarray)
+
+
+def find_classes(env, count):
+    for _ in range(count):
+        for class_name in CLASS_NAMES:
+            env.find_class(class_name)
+
+
+def run(n_threads, fn, *args):
+    with javabridge.JavaThreadPoolExecutor(
+        max_workers=n_threads, pass_env=True) as executor:
+        # Start the workers before timing
+        for future in [executor.submit(lambda env: None)
+                       for _ in range(n_threads)]:
+            future.result()
+        start = timeit.default_timer()
+        futures = [executor.submit(fn, *args) for _ in range(n_threads)]
+        for future in futures:
+            future.result()
+        return timeit.default_timer() - start
+
+
+def main(max_threads=16, array_size=1000000, total_transfers=256,
+         total_lookups=4096):
+    array = np.random.uniform(size=array_size)
+    n_threads = 1
+    print("threads  array MB/s  class lookups/s")
+    while n_threads <= max_threads:
+        transfers = max(1, total_transfers // n_threads)
+        elapsed = run(n_threads, transfer_arrays, array, transfers)
+        mbytes = 2 * transfers * n_threads * array.nbytes / 1e6
+        lookups = max(1, total_lookups // n_threads)
+        lookup_elapsed = run(n_threads, find_classes, lookups)
+        n_lookups = lookups * n_threads * len(CLASS_NAMES)
+        print("%7d  %10.0f  %15.0f" % (
+            n_threads, mbytes / elapsed, n_lookups / lookup_elapsed))
+        n_threads *= 2
+
+
+if __name__ == "__main__":
+    javabridge.start_vm(run_headless=True)
+    try:
+        main(*[int(arg) for arg in sys.argv[1:3]])
+    finally:
+        javabridge.kill_vm()
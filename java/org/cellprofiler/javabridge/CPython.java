@@ -11,10 +11,12 @@ package org.cellprofiler.javabridge;
 import java.io.File;
 import java.util.Arrays;
 import java.util.Collections;
+import java.util.LinkedHashMap;
 import java.util.List;
 import java.util.Map;
 import java.util.logging.Logger;
 import java.lang.reflect.Field;
+import java.lang.reflect.Method;
 
 /**
  * @author Lee Kamentsky
@@ -134,9 +136,27 @@ public class CPython {
 		throws WrappedException {
 		exec(script, locals, globals);
 	}
+	/**
+	 * Execute a compiled Python script (synonym for CPython.exec needed
+	 * because "exec" is a Python keyword.
+	 */
+	public void execute(long handle) throws WrappedException {
+		execCode(handle, null, null);
+	}
+	/**
+	 * Execute a compiled Python script (synonym for CPython.exec needed
+	 * because "exec" is a Python keyword.
+	 */
+	public void execute(long handle, Map<String, Object> locals, Map<String, Object> globals)
+		throws WrappedException {
+		execCode(handle, locals, globals);
+	}
 	/**
 	 * Execute a Python script
 	 * 
+	 * The compiled script is cached, so running the same script again
+	 * does not parse and compile it again.
+	 * 
 	 * @param script - the Python to be executed
 	 */
 	public void exec(String script) throws WrappedException {
@@ -158,4 +178,144 @@ public class CPython {
 	 */
 	public native void exec(String script, Map<String, Object> locals, Map<String, Object> globals)
 			throws WrappedException;
+	/**
+	 * Compile a Python script to be run repeatedly
+	 * 
+	 * @param script - the Python script to be compiled
+	 * @return a handle to the compiled script, for exec(handle, ...).
+	 *         Call releaseCode(handle) when the script is no longer needed.
+	 */
+	public native long compile(String script) throws WrappedException;
+	/**
+	 * Execute a Python script compiled using compile()
+	 * 
+	 * @param handle - the handle returned by compile()
+	 */
+	public void exec(long handle) throws WrappedException {
+		execCode(handle, null, null);
+	}
+	/**
+	 * Execute a Python script compiled using compile(), passing a local
+	 * and global execution context
+	 * 
+	 *  @param handle - the handle returned by compile()
+	 *  @param locals - the execution context local to the execution frame of the script
+	 *  @param globals - the execution context accessible by all frames of the script
+	 */
+	public void exec(long handle, Map<String, Object> locals, Map<String, Object> globals)
+		throws WrappedException {
+		execCode(handle, locals, globals);
+	}
+	/*
+	 * JNI can't tell overloaded native methods apart by their short names,
+	 * so exec(long, ...) calls a native method of its own.
+	 */
+	native void execCode(long handle, Map<String, Object> locals, Map<String, Object> globals)
+			throws WrappedException;
+	/**
+	 * Release a script compiled using compile()
+	 * 
+	 * @param handle - the handle returned by compile()
+	 */
+	public native void releaseCode(long handle);
+	/**
+	 * Call the Python callable registered for a proxy
+	 * 
+	 * @param handle - the handle of the callable, as returned by
+	 *                 javabridge.create_proxy_handle
+	 * @param proxy - the proxy whose method was invoked
+	 * @param method - the method that was invoked
+	 * @param args - the arguments to the method
+	 * @return the result of calling the callable with the proxy,
+	 *         method and arguments
+	 */
+	public native Object invokeProxy(long handle, Object proxy, Method method, Object [] args)
+			throws WrappedException;
+	/**
+	 * Call a Python function and return its result
+	 * 
+	 * Strings, boxed primitives and primitive arrays are passed to Python
+	 * as Python strings, numbers and NumPy arrays. The result is converted
+	 * back the same way - a Python int is returned as an Integer (or a
+	 * Long if it is too big) and a float as a Double, for instance.
+	 * 
+	 * @param module - the name of the module holding the function, e.g. "math"
+	 * @param function - the name of the function, e.g. "sqrt"
+	 * @param args - the arguments to the function
+	 * @return the value returned by the function
+	 */
+	public native Object call(String module, String function, Object... args)
+			throws WrappedException;
+	/**
+	 * Evaluate a Python expression and return its value
+	 * 
+	 * @param expression - the Python expression to be evaluated
+	 * @return the value of the expression, converted as for call()
+	 */
+	public Object eval(String expression) throws WrappedException {
+		return eval(expression, null);
+	}
+	/**
+	 * Evaluate a Python expression and return its value
+	 * 
+	 * @param expression - the Python expression to be evaluated
+	 * @param locals - the names that can be used in the expression. Their
+	 *                 values are converted as the arguments to call() are.
+	 * @return the value of the expression, converted as for call()
+	 */
+	public native Object eval(String expression, Map<String, Object> locals)
+			throws WrappedException;
+	/**
+	 * Choose whether to keep the Python thread state of a Java thread
+	 * 
+	 * Python needs a thread state for each thread that runs Python code.
+	 * By default, the thread state made for a Java thread the first time
+	 * it calls into Python is kept until the thread exits. Otherwise, a
+	 * new one is made and destroyed for every call. Turning persistence
+	 * off releases the calling thread's thread state at once and those
+	 * of other threads when they next return from Python.
+	 * 
+	 * @param persistent - true to keep thread states, false to make one per call
+	 */
+	public static native void setPersistentThreadStates(boolean persistent);
+	/**
+	 * Get statistics of the calls from Java into Python
+	 * 
+	 * The statistics are:
+	 * <ul>
+	 * <li>calls - the number of calls into Python</li>
+	 * <li>threadStatesCreated - the number of calls that had to make a
+	 *     Python thread state for their thread</li>
+	 * <li>persistentThreadStates - the number of thread states being kept
+	 *     for Java threads</li>
+	 * <li>gilWaitNanos - the total time that calls waited for the GIL,
+	 *     in nanoseconds</li>
+	 * <li>maxGILWaitNanos - the longest time that a call waited for the GIL</li>
+	 * </ul>
+	 * 
+	 * @return a map of statistic name to value
+	 */
+	public static Map<String, Long> getStatistics() {
+		return toStatisticsMap(statistics(false));
+	}
+	/**
+	 * Get the statistics of the calls from Java into Python and start
+	 * counting again from zero
+	 * 
+	 * @return the statistics, as for getStatistics()
+	 */
+	public static Map<String, Long> resetStatistics() {
+		return toStatisticsMap(statistics(true));
+	}
+	static native long [] statistics(boolean reset);
+	private static final String [] statisticNames = {
+		"calls", "threadStatesCreated", "persistentThreadStates",
+		"gilWaitNanos", "maxGILWaitNanos" };
+	private static Map<String, Long> toStatisticsMap(long [] values) {
+		final Map<String, Long> result = new LinkedHashMap<String, Long>();
+		for (int i = 0; i < statisticNames.length; i++) {
+			result.put(statisticNames[i], Long.valueOf(values[i]));
+		}
+		return result;
+	}
  }
\ No newline at end of file
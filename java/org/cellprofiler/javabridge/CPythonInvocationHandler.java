@@ -8,10 +8,15 @@
 
 package org.cellprofiler.javabridge;
 
+import java.lang.ref.PhantomReference;
+import java.lang.ref.ReferenceQueue;
 import java.lang.reflect.InvocationHandler;
 import java.lang.reflect.Method;
+import java.util.Collections;
+import java.util.HashSet;
 import java.util.Hashtable;
 import java.util.ArrayList;
+import java.util.Set;
 import org.cellprofiler.javabridge.CPython;
 
 /**
@@ -22,6 +27,7 @@ import org.cellprofiler.javabridge.CPython;
  */
 public class CPythonInvocationHandler implements InvocationHandler {
 	private final String ref_id;
+	private final long handle;
 	private final CPython cpython = new CPython();
 	/**
 	 *  Constructor
@@ -31,9 +37,93 @@ public class CPythonInvocationHandler implements InvocationHandler {
 	 */
 	public CPythonInvocationHandler(String ref_id) {
 		this.ref_id = ref_id;
+		this.handle = 0;
+	}
+	/**
+	 *  Constructor
+	 *  
+	 *  @param handle the handle of the Python callable, as returned by
+	 *                javabridge.create_proxy_handle. Invocations call
+	 *                the callable directly instead of running a script.
+	 */
+	public CPythonInvocationHandler(long handle) {
+		this.ref_id = null;
+		this.handle = handle;
+	}
+	/**
+	 * Unlock the handle of the Python callable once this handler has
+	 * been garbage-collected.
+	 * 
+	 * javabridge.JProxy.release() locks the handle with
+	 * javabridge.lock_jref and then calls this, so the Python callable
+	 * lives exactly as long as Java can reach the handler.
+	 */
+	public void unlockWhenCollected() {
+		if (ref_id != null) {
+			throw new IllegalStateException("The handler was not made with a handle");
+		}
+		HandleReleaser.register(this, handle);
+	}
+	/**
+	 * A phantom reference to a handler that unlocks the handle of its
+	 * Python callable once the handler has been garbage-collected.
+	 * 
+	 * The references are kept in a set until they are dequeued because
+	 * the garbage collector doesn't enqueue unreachable references. A
+	 * daemon thread takes them from the queue and unlocks the handles.
+	 */
+	static class HandleReleaser extends PhantomReference<CPythonInvocationHandler> {
+		private static final ReferenceQueue<CPythonInvocationHandler> queue =
+				new ReferenceQueue<CPythonInvocationHandler>();
+		private static final Set<HandleReleaser> pending =
+				Collections.synchronizedSet(new HashSet<HandleReleaser>());
+		private static Thread thread;
+		private final long handle;
+		HandleReleaser(CPythonInvocationHandler handler, long handle) {
+			super(handler, queue);
+			this.handle = handle;
+		}
+		static synchronized void register(CPythonInvocationHandler handler, long handle) {
+			pending.add(new HandleReleaser(handler, handle));
+			if (thread == null) {
+				thread = new Thread(new Runnable() {
+					@Override
+					public void run() {
+						releaseAll();
+					}
+				}, "CPythonInvocationHandler handle releaser");
+				thread.setDaemon(true);
+				thread.start();
+			}
+		}
+		static void releaseAll() {
+			final CPython cpython = new CPython();
+			while (true) {
+				final HandleReleaser releaser;
+				try {
+					releaser = (HandleReleaser)queue.remove();
+				} catch (InterruptedException e) {
+					return;
+				}
+				pending.remove(releaser);
+				try {
+					cpython.call("javabridge.jutil", "unlock_jref",
+							new Object [] { Long.valueOf(releaser.handle) });
+				} catch (Throwable e) {
+					// The Python traceback has already been printed.
+					// Keep going to release the other handles.
+				}
+			}
+		}
 	}
 	@Override
 	public Object invoke(Object proxy, Method method, Object [] args) throws Throwable {
+		if (args == null) {
+			args = new Object [0];
+		}
+		if (ref_id == null) {
+			return cpython.invokeProxy(handle, proxy, method, args);
+		}
 		final String script = 
 				"import javabridge\n" +
 				String.format("result = javabridge.redeem_jref('%s')(proxy, method, args);\n", ref_id) +
@@ -41,9 +131,6 @@ public class CPythonInvocationHandler implements InvocationHandler {
 		final Hashtable<String, Object> locals = new Hashtable();
 		locals.put("proxy", proxy);
 		locals.put("method", method);
-		if (args == null) {
-			args = new Object [0];
-		}
 		locals.put("args", args);
 		ArrayList<Object> result = new ArrayList<Object>();
 		locals.put("jresult", result);
@@ -0,0 +1,96 @@
+/* python-javabridge is licensed under the BSD license.  See the
+ * accompanying file LICENSE for details.
+
+ * Copyright (c) 2003-2009 Massachusetts Institute of Technology
+ * Copyright (c) 2009-2015 Broad Institute
+ * All rights reserved.
+ */
+
+package org.cellprofiler.javabridge;
+
+import java.util.Arrays;
+import java.util.function.DoubleUnaryOperator;
+import java.util.stream.DoubleStream;
+
+/**
+ * A DoubleUnaryOperator whose values are computed by a Python function
+ * that works on a whole NumPy array at a time.
+ *
+ * Calling applyAsDouble() costs one call into Python per value. The
+ * apply() methods collect their values into chunks and call Python once
+ * per chunk instead. Use javabridge.vectorized_double_operator to make one.
+ */
+public class VectorizedDoubleOperator implements DoubleUnaryOperator {
+	private final long handle;
+	private final int chunkSize;
+	private final CPython cpython = new CPython();
+	/**
+	 * Constructor
+	 *
+	 * @param handle the handle of the Python function, as returned by
+	 *               javabridge.create_proxy_handle. The function takes
+	 *               a 1-d array of doubles and returns an array of doubles
+	 *               of the same length.
+	 * @param chunkSize the maximum number of values passed to the
+	 *                  function in one call
+	 */
+	public VectorizedDoubleOperator(long handle, int chunkSize) {
+		if (chunkSize <= 0) {
+			throw new IllegalArgumentException("Chunk size must be positive");
+		}
+		this.handle = handle;
+		this.chunkSize = chunkSize;
+	}
+	@Override
+	public double applyAsDouble(double operand) {
+		return applyChunk(new double [] { operand })[0];
+	}
+	/**
+	 * Apply the operator to an array of values
+	 *
+	 * @param operands the values to be operated on
+	 * @return a new array holding the results
+	 */
+	public double [] apply(double [] operands) {
+		if (operands.length <= chunkSize) {
+			return applyChunk(operands);
+		}
+		final double [] result = new double [operands.length];
+		for (int start = 0; start < operands.length; start += chunkSize) {
+			final int end = Math.min(start + chunkSize, operands.length);
+			final double [] chunk = applyChunk(Arrays.copyOfRange(operands, start, end));
+			System.arraycopy(chunk, 0, result, start, chunk.length);
+		}
+		return result;
+	}
+	/**
+	 * Apply the operator to each value of a stream
+	 *
+	 * The stream is consumed, so this is a terminal operation on it.
+	 *
+	 * @param operands a stream of values
+	 * @return a stream of the results, in the order of the operands
+	 */
+	public DoubleStream apply(DoubleStream operands) {
+		return Arrays.stream(apply(operands.toArray()));
+	}
+	private double [] applyChunk(double [] operands) {
+		final Object result;
+		try {
+			result = cpython.call("javabridge.jutil", "invoke_handle",
+					new Object [] { new Long(handle), operands });
+		} catch (CPython.WrappedException e) {
+			throw new RuntimeException(e);
+		}
+		if (! (result instanceof double [])) {
+			throw new IllegalStateException("Python function did not return an array of doubles");
+		}
+		final double [] values = (double [])result;
+		if (values.length != operands.length) {
+			throw new IllegalStateException(String.format(
+					"Python function returned %d values for %d operands",
+					values.length, operands.length));
+		}
+		return values;
+	}
+}
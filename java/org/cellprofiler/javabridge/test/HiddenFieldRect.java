@@ -0,0 +1,11 @@
+// A RealRect whose subclass hides one of its fields. This exists only in
+// order to test the field wrappers in the Javabridge.
+
+package org.cellprofiler.javabridge.test;
+
+public class HiddenFieldRect extends RealRect {
+
+	// -- Fields --
+
+	public String f_int = "hidden";
+}
@@ -0,0 +1,25 @@
+// A class with native methods. This exists only in order to test
+// the register_natives() function in the Javabridge.
+
+package org.cellprofiler.javabridge.test;
+
+public class NativeKernel {
+
+	// -- Native methods --
+
+	public static native double apply(double x, double y);
+	public static native boolean isPositive(long value);
+	public static native char next(char c);
+	public native String describe(String name, double [] values);
+	public native void fail();
+
+	// -- Methods --
+
+	public static double applyAll(double [] x, double [] y) {
+		double total = 0;
+		for (int i = 0; i < x.length; i++) {
+			total += apply(x[i], y[i]);
+		}
+		return total;
+	}
+}
@@ -14,6 +14,12 @@ All rights reserved.
 #include <stdlib.h>
 #include <dlfcn.h>
 #endif
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <pthread.h>
+#include <time.h>
+#endif
 #include "org_cellprofiler_javabridge_CPython.h"
 
 int initialized = 0;
@@ -199,6 +205,240 @@ static void throwWrappedError(JNIEnv *pEnv, int linenumber)
              "Python exception at %s:%d", __FILE__, linenumber);
     throwError(pEnv, buffer);
 }
+/*
+ * Entering Python from Java
+ *
+ * PyGILState_Ensure makes a thread state for a thread that has none and
+ * PyGILState_Release destroys it again, so a Java thread that calls
+ * into Python over and over would make a new thread state for each
+ * call. When thread states are persistent, enter_python keeps the
+ * thread state of a Java thread until the thread exits.
+ *
+ * The statistics count the calls into Python and the time spent
+ * waiting for the GIL. They are only updated with the GIL held.
+ */
+static int persistThreadStates = 1;
+static long long statCalls = 0;
+static long long statThreadStatesCreated = 0;
+static long long statPersistentThreadStates = 0;
+static long long statGILWaitNanos = 0;
+static long long statMaxGILWaitNanos = 0;
+
+static long long now_nanos(void) {
+#ifdef _WIN32
+    LARGE_INTEGER count, frequency;
+    QueryPerformanceCounter(&count);
+    QueryPerformanceFrequency(&frequency);
+    return (long long)((double)count.QuadPart * 1e9 / (double)frequency.QuadPart);
+#else
+    struct timespec ts;
+    clock_gettime(CLOCK_MONOTONIC, &ts);
+    return (long long)ts.tv_sec * 1000000000LL + ts.tv_nsec;
+#endif
+}
+
+#ifndef _WIN32
+static pthread_key_t threadStateKey;
+static pthread_once_t threadStateKeyOnce = PTHREAD_ONCE_INIT;
+/*
+ * pythonExiting is set by an atexit function, before Python starts to
+ * finalize. Thread states are only released while holding
+ * threadStateLock with pythonExiting unset, so none is released during
+ * or after finalization - Python deletes them itself.
+ */
+static pthread_mutex_t threadStateLock = PTHREAD_MUTEX_INITIALIZER;
+static int pythonExiting = 0;
+
+static int python_is_finalizing(void) {
+#if PY_VERSION_HEX >= 0x030D0000
+    return Py_IsFinalizing();
+#elif PY_VERSION_HEX >= 0x03070000
+    return _Py_IsFinalizing();
+#else
+    return 0;
+#endif
+}
+
+/*
+ * Release a persistent thread state when its thread exits
+ *
+ * Python's own thread-specific slot for the thread state may already
+ * have been cleared at this point, so the thread state is restored from
+ * the one saved in threadStateKey.
+ */
+static void release_thread_state(void *pThreadState) {
+    PyThreadState *tstate = (PyThreadState *)pThreadState;
+    
+    pthread_mutex_lock(&threadStateLock);
+    if (! pythonExiting && Py_IsInitialized() && ! python_is_finalizing()) {
+        PyEval_RestoreThread(tstate);
+        statPersistentThreadStates--;
+        PyThreadState_Clear(tstate);
+        PyThreadState_DeleteCurrent();
+    }
+    pthread_mutex_unlock(&threadStateLock);
+}
+
+/*
+ * The atexit function that stops the release of thread states
+ *
+ * It is called with the GIL, which it gives up while waiting for the
+ * lock because release_thread_state holds the lock while taking the
+ * GIL.
+ */
+static PyObject *stop_releasing_thread_states(PyObject *self, PyObject *args) {
+    Py_BEGIN_ALLOW_THREADS
+    pthread_mutex_lock(&threadStateLock);
+    pythonExiting = 1;
+    pthread_mutex_unlock(&threadStateLock);
+    Py_END_ALLOW_THREADS
+    Py_RETURN_NONE;
+}
+
+static PyMethodDef stopReleasingThreadStatesDef = {
+    "stop_releasing_thread_states", stop_releasing_thread_states,
+    METH_NOARGS, NULL
+};
+
+/*
+ * Make the thread state key and register the atexit function. This is
+ * called with the GIL.
+ */
+static void make_thread_state_key(void) {
+    PyObject *pAtExit;
+    PyObject *pFunction;
+    PyObject *pResult = NULL;
+    
+    pthread_key_create(&threadStateKey, release_thread_state);
+    pAtExit = PyImport_ImportModule("atexit");
+    pFunction = PyCFunction_New(&stopReleasingThreadStatesDef, NULL);
+    if ((pAtExit != NULL) && (pFunction != NULL)) {
+        pResult = PyObject_CallMethod(pAtExit, "register", "O", pFunction);
+    }
+    if (pResult == NULL) {
+        PyErr_Print();
+    }
+    Py_XDECREF(pResult);
+    Py_XDECREF(pFunction);
+    Py_XDECREF(pAtExit);
+}
+
+/*
+ * Drop the extra reference that keeps this thread's thread state, if
+ * it has one. This is called with the GIL and the thread state is
+ * deleted when the thread next leaves Python.
+ */
+static void unpin_thread_state(void) {
+    pthread_once(&threadStateKeyOnce, make_thread_state_key);
+    if (pthread_getspecific(threadStateKey) != NULL) {
+        pthread_setspecific(threadStateKey, NULL);
+        statPersistentThreadStates--;
+        PyGILState_Release(PyGILState_LOCKED);
+    }
+}
+#endif
+
+/*
+    enter_python
+    
+    Take the GIL for a call from Java. Call exit_python with the result
+    when done.
+*/
+static PyGILState_STATE enter_python(void) {
+    PyGILState_STATE state;
+    int has_thread_state = (PyGILState_GetThisThreadState() != NULL);
+    long long start = now_nanos();
+    long long wait;
+    
+    state = PyGILState_Ensure();
+    wait = now_nanos() - start;
+    statCalls++;
+    statGILWaitNanos += wait;
+    if (wait > statMaxGILWaitNanos) {
+        statMaxGILWaitNanos = wait;
+    }
+    if (! has_thread_state) {
+        statThreadStatesCreated++;
+#ifndef _WIN32
+        if (persistThreadStates) {
+            pthread_once(&threadStateKeyOnce, make_thread_state_key);
+            if (pthread_setspecific(threadStateKey,
+                                    PyGILState_GetThisThreadState()) == 0) {
+                /*
+                 * An extra reference to the thread state keeps it
+                 * alive after exit_python.
+                 */
+                PyGILState_Ensure();
+                statPersistentThreadStates++;
+            }
+        }
+#endif
+    }
+    return state;
+}
+
+/*
+    exit_python
+    
+    Release the GIL taken by enter_python. If thread states are no longer
+    persistent, the thread's thread state is released too.
+*/
+static void exit_python(PyGILState_STATE state) {
+#ifndef _WIN32
+    if (! persistThreadStates) {
+        unpin_thread_state();
+    }
+#endif
+    PyGILState_Release(state);
+}
+
+/*
+ * Functions in javabridge that are called on every call from Java.
+ * They are looked up once, the first time they are needed.
+ */
+static PyObject *pJNIEnter = NULL;
+static PyObject *pJNIExit = NULL;
+static PyObject *pGetEnv = NULL;
+static PyObject *pMakeRunNamespace = NULL;
+static PyObject *pInvokeProxy = NULL;
+static PyObject *pCallFunction = NULL;
+static PyObject *pPythonToJava = NULL;
+
+/*
+   get_function
+   
+   Get a function from a module, looking it up if it has not been cached
+   
+   pEnv - JNI environment
+   ppFunction - the cached function or NULL if it has not been looked up
+   module - the name of the module
+   name - the name of the function
+   
+   Prerequisites: The GIL must be taken.
+   
+   Returns: a borrowed reference to the function or NULL if a Java
+            exception has been thrown.
+*/
+static PyObject *get_function(JNIEnv *pEnv, PyObject **ppFunction,
+                              const char *module, const char *name) {
+    PyObject *pModule;
+    
+    if (! *ppFunction) {
+        pModule = PyImport_ImportModule(module);
+        if (! pModule) {
+            throwWrappedError(pEnv, __LINE__);
+            return NULL;
+        }
+        *ppFunction = PyObject_GetAttrString(pModule, name);
+        Py_DECREF(pModule);
+        if (! *ppFunction) {
+            throwWrappedError(pEnv, __LINE__);
+            return NULL;
+        }
+    }
+    return *ppFunction;
+}
+
 /*
    attach_env
    
@@ -213,56 +453,27 @@ static void throwWrappedError(JNIEnv *pEnv, int linenumber)
 */
 static int attach_env(JNIEnv *pEnv){
     PyObject *pPyEnv;
-    PyObject *pJavabridge;
-    PyObject *pJNIEnter;
-    PyObject *pArgs;
     PyObject *pResult;
     /*
     Equivalent to:
     import javabridge
     javabridge.jni_enter(env)
     */
-    
-    pPyEnv = PyCapsule_New((void *)pEnv, NULL, NULL);
-    if (PyErr_Occurred()) {
-        throwWrappedError(pEnv, __LINE__);
+    if (! get_function(pEnv, &pJNIEnter, "javabridge", "jni_enter")) {
         return -1;
     }
-    pJavabridge = PyImport_ImportModule("javabridge");
-    if (PyErr_Occurred()) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pPyEnv);
-        return -1;
-    }
-    pJNIEnter = PyObject_GetAttrString(pJavabridge, "jni_enter");
-    if (PyErr_Occurred()) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pJavabridge);
-        Py_DECREF(pPyEnv);
-        return -1;
-    }
-    pArgs = PyTuple_Pack(1, pPyEnv);
-    if (! pArgs) {
+    pPyEnv = PyCapsule_New((void *)pEnv, NULL, NULL);
+    if (! pPyEnv) {
         throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pJNIEnter);
-        Py_DECREF(pJavabridge);
-        Py_DECREF(pPyEnv);
         return -1;
     }
-    pResult = PyObject_CallObject(pJNIEnter, pArgs);
+    pResult = PyObject_CallFunctionObjArgs(pJNIEnter, pPyEnv, NULL);
+    Py_DECREF(pPyEnv);
     if (! pResult) {
         throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pArgs);
-        Py_DECREF(pJNIEnter);
-        Py_DECREF(pJavabridge);
-        Py_DECREF(pPyEnv);
         return -1;
     }
     Py_DECREF(pResult);
-    Py_DECREF(pArgs);
-    Py_DECREF(pJNIEnter);
-    Py_DECREF(pJavabridge);
-    Py_DECREF(pPyEnv);
     return 0;    
 }
 
@@ -272,46 +483,21 @@ static int attach_env(JNIEnv *pEnv){
      Detach an environment previously attached using attach_env
 */
 static int detach_env(JNIEnv *pEnv) {
-    PyObject *pJavabridge;
-    PyObject *pJNIExit;
-    PyObject *pArgs;
     PyObject *pResult;
 
-    pJavabridge = PyImport_ImportModule("javabridge");
-    if (! pJavabridge) {
-        throwWrappedError(pEnv, __LINE__);
-        return -1;
-    }
-    pJNIExit = PyObject_GetAttrString(pJavabridge, "jni_exit");
-    if (! pJNIExit) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pJavabridge);
+    if (! get_function(pEnv, &pJNIExit, "javabridge", "jni_exit")) {
         return -1;
     }
-    pArgs = PyTuple_New(0);
-    if (! pArgs) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pJNIExit);
-        Py_DECREF(pJavabridge);
-    }
-    pResult = PyObject_CallObject(pJNIExit, pArgs);
+    pResult = PyObject_CallFunctionObjArgs(pJNIExit, NULL);
     if (! pResult) {
         throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pArgs);
-        Py_DECREF(pJNIExit);
-        Py_DECREF(pJavabridge);
         return -1;
     }
     Py_DECREF(pResult);
-    Py_DECREF(pArgs);   
-    Py_DECREF(pJNIExit);
-    Py_DECREF(pJavabridge);
     return 0;
 }
 
 static PyObject *wrapJObject(JNIEnv *pEnv, jobject j) {
-    PyObject *pJavabridge;
-    PyObject *pGetEnv;
     PyObject *pTheEnv;
     PyObject *pCapsule;
     PyObject *pResult;
@@ -319,30 +505,18 @@ static PyObject *wrapJObject(JNIEnv *pEnv, jobject j) {
     if (! j) {
         Py_RETURN_NONE;
     }
-    pJavabridge = PyImport_ImportModule("javabridge");
-    if (! pJavabridge) {
-        throwWrappedError(pEnv, __LINE__);
-        return NULL;
-    }
-    pGetEnv = PyObject_GetAttrString(pJavabridge, "get_env");
-    if (! pGetEnv) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pJavabridge);
+    if (! get_function(pEnv, &pGetEnv, "javabridge", "get_env")) {
         return NULL;
     }
-    pTheEnv = PyObject_CallObject(pGetEnv, NULL);
+    pTheEnv = PyObject_CallFunctionObjArgs(pGetEnv, NULL);
     if (! pTheEnv) {
         throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pGetEnv);
-        Py_DECREF(pJavabridge);
         return NULL;
     }
     pCapsule = PyCapsule_New((void *)j, NULL, NULL);
     if (! pCapsule) {
         throwWrappedError(pEnv, __LINE__);
         Py_DECREF(pTheEnv);
-        Py_DECREF(pGetEnv);
-        Py_DECREF(pJavabridge);
         return NULL;
     }
     pResult = PyObject_CallMethod(pTheEnv, "make_jb_object", "O", pCapsule);
@@ -351,52 +525,41 @@ static PyObject *wrapJObject(JNIEnv *pEnv, jobject j) {
     }
     Py_DECREF(pCapsule);
     Py_DECREF(pTheEnv);
-    Py_DECREF(pGetEnv);
-    Py_DECREF(pJavabridge);
     return pResult;    
 }
 
-static PyObject *mapToDictionary(JNIEnv *pEnv, jobject map) {
+/*
+   mapToNamespace
+   
+   Make a namespace for running a script from a Java map
+   
+   pEnv - JNI environment
+   map - a java.util.Map of names to values or NULL for an empty namespace
+   pParent - the namespace where names that are not in the map are looked
+             up or NULL to look them up in __main__
+   convert - nonzero to convert strings, boxed primitives and primitive
+             arrays in the map to Python values
+   
+   Returns: a new reference to the namespace or NULL if a Java exception
+            has been thrown.
+*/
+static PyObject *mapToNamespace(JNIEnv *pEnv, jobject map, PyObject *pParent,
+                               int convert) {
     PyObject *pMap;
-    PyObject *pJavabridge;
-    PyObject *pFn;
-    PyObject *pArgs;
     PyObject *pResult;
     
-    if (! map) {
-        pResult = PyDict_New();
-        if (! pResult) {
-            throwWrappedError(pEnv, __LINE__);
-        }
-        return pResult;
+    if (! get_function(pEnv, &pMakeRunNamespace,
+                       "javabridge.jutil", "make_run_namespace")) {
+        return NULL;
     }
     pMap = wrapJObject(pEnv, map);
     if (! pMap) {
         return NULL;
     }
-    pJavabridge = PyImport_ImportModule("javabridge.jutil");
-    if (! pJavabridge) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pMap);
-        return NULL;
-    }
-    pFn = PyObject_GetAttrString(pJavabridge, "make_run_dictionary");
-    Py_DECREF(pJavabridge);
-    if (! pFn) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pMap);
-        return NULL;
-    }
-    pArgs = PyTuple_Pack(1, pMap);
+    pResult = PyObject_CallFunctionObjArgs(
+        pMakeRunNamespace, pMap, pParent ? pParent : Py_None,
+        convert ? Py_True : Py_False, NULL);
     Py_DECREF(pMap);
-    if (! pArgs) {
-        throwWrappedError(pEnv, __LINE__);
-        Py_DECREF(pFn);
-        return NULL;
-    }
-    pResult = PyObject_CallObject(pFn, pArgs);
-    Py_DECREF(pFn);
-    Py_DECREF(pArgs);
     if (! pResult){
         throwWrappedError(pEnv, __LINE__);
         return NULL;
@@ -405,33 +568,130 @@ static PyObject *mapToDictionary(JNIEnv *pEnv, jobject map) {
 }
 
 /*
- * Add globals from __main__ to a dictionary of them.
+ * Compiled scripts
+ *
+ * pCodeCache maps the text and compile mode of scripts run by
+ * exec(String) and expressions evaluated by eval() to their code
+ * objects. It holds at most CODE_CACHE_SIZE entries - a hit moves the
+ * entry to the end of the dictionary and the entry at the front, the
+ * least recently used, is evicted when a new script is added.
+ *
+ * pCodeHandles maps the handles returned by compile() to their code
+ * objects until releaseCode() is called.
  */
-static int add_globals(JNIEnv *pEnv, PyObject *pGlobals) {
-    PyObject *pMain;
-    PyObject *pMainDict;
-    int result;
-    pMain = PyImport_AddModule("__main__");
-    if (! pMain) {
-        throwWrappedError(pEnv, __LINE__);
-        return -1;
+#define CODE_CACHE_SIZE 256
+static PyObject *pCodeCache = NULL;
+static PyObject *pCodeHandles = NULL;
+static long long nextCodeHandle = 1;
+
+/*
+   get_code
+   
+   Get the compiled code for a script, compiling it if it is not in
+   the cache.
+   
+   start - Py_file_input for a script or Py_eval_input for an expression
+   
+   Prerequisites: The GIL must be taken.
+   
+   Returns: a new reference to the code object or NULL if a Java exception
+            has been thrown.
+*/
+static PyObject *get_code(JNIEnv *pEnv, jstring script, int start) {
+    const char *pScript;
+    PyObject *pKey;
+    PyObject *pCode;
+    Py_ssize_t pos = 0;
+    PyObject *pOldest;
+    PyObject *pValue;
+    
+    if (! pCodeCache) {
+        pCodeCache = PyDict_New();
+        if (! pCodeCache) {
+            throwWrappedError(pEnv, __LINE__);
+            return NULL;
+        }
     }
-    pMainDict = PyModule_GetDict(pMain);
-    result = PyDict_Merge(pGlobals, pMainDict, 0);
-    if (result) {
+    pScript = (*pEnv)->GetStringUTFChars(pEnv, script, NULL);
+    if (! pScript) {
+        return NULL;
+    }
+    pKey = Py_BuildValue("(si)", pScript, start);
+    if (! pKey) {
+        (*pEnv)->ReleaseStringUTFChars(pEnv, script, pScript);
         throwWrappedError(pEnv, __LINE__);
+        return NULL;
     }
-    return result;
+    pCode = PyDict_GetItem(pCodeCache, pKey);
+    if (pCode) {
+        /* Move the script to the most recently used end */
+        Py_INCREF(pCode);
+        PyDict_DelItem(pCodeCache, pKey);
+    } else {
+        pCode = Py_CompileString(pScript, "<string>", start);
+        if (! pCode) {
+            (*pEnv)->ReleaseStringUTFChars(pEnv, script, pScript);
+            Py_DECREF(pKey);
+            throwWrappedError(pEnv, __LINE__);
+            return NULL;
+        }
+        if (PyDict_Size(pCodeCache) >= CODE_CACHE_SIZE) {
+            PyDict_Next(pCodeCache, &pos, &pOldest, &pValue);
+            PyDict_DelItem(pCodeCache, pOldest);
+        }
+    }
+    (*pEnv)->ReleaseStringUTFChars(pEnv, script, pScript);
+    if (PyDict_SetItem(pCodeCache, pKey, pCode)) {
+        PyErr_Clear();
+    }
+    Py_DECREF(pKey);
+    return pCode;
 }
 
-JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_exec
-  (JNIEnv *pEnv, jobject thiss, jstring script, jobject locals, jobject globals) {
-    PyGILState_STATE state;
+/*
+   run_code
+   
+   Run compiled code, passing a local and global execution context
+   
+   Prerequisites: The GIL must be taken and the environment attached.
+*/
+static void run_code(JNIEnv *pEnv, PyObject *pCode, jobject locals, jobject globals) {
     PyObject *pLocals;
     PyObject *pGlobals;
-    const char *pScript;
     PyObject *pResult;
     
+    pGlobals = mapToNamespace(pEnv, globals, NULL, 0);
+    if (pGlobals) {
+        if ((locals != NULL) && 
+            ((*pEnv)->IsSameObject(pEnv, locals, globals))) {
+            pLocals = pGlobals;
+            Py_INCREF(pLocals);
+        } else {
+            pLocals = mapToNamespace(pEnv, locals, pGlobals, 0);
+        }
+        if (pLocals) {
+#if PY_MAJOR_VERSION >= 3
+            pResult = PyEval_EvalCode(pCode, pGlobals, pLocals);
+#else
+            pResult = PyEval_EvalCode(
+                (PyCodeObject *)pCode, pGlobals, pLocals);
+#endif
+            if (pResult) {
+                Py_DECREF(pResult);
+            } else {
+                throwWrappedError(pEnv, __LINE__);
+            }
+            Py_DECREF(pLocals);
+        }
+        Py_DECREF(pGlobals);
+    }
+}
+
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_exec
+  (JNIEnv *pEnv, jobject thiss, jstring script, jobject locals, jobject globals) {
+    PyGILState_STATE state;
+    PyObject *pCode;
+    
     if (! pEnv) {
         throwError(pEnv, "JNIEnv was null.");
         return;
@@ -441,34 +701,394 @@ JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_exec
         return;
     }
     check_init();
-    state = PyGILState_Ensure();
+    state = enter_python();
     if (attach_env(pEnv) == 0) {
-        pLocals = mapToDictionary(pEnv, locals);
-        if (pLocals) {
-            if ((locals != NULL) && 
-                ((*pEnv)->IsSameObject(pEnv, locals, globals))) {
-                pGlobals = pLocals;
-                Py_INCREF(pGlobals);
+        pCode = get_code(pEnv, script, Py_file_input);
+        if (pCode) {
+            run_code(pEnv, pCode, locals, globals);
+            Py_DECREF(pCode);
+        }
+    }
+    detach_env(pEnv);
+    exit_python(state);
+}
+
+JNIEXPORT jlong JNICALL Java_org_cellprofiler_javabridge_CPython_compile
+  (JNIEnv *pEnv, jobject thiss, jstring script) {
+    PyGILState_STATE state;
+    PyObject *pCode;
+    PyObject *pHandle;
+    jlong handle = 0;
+    
+    if (! pEnv) {
+        throwError(pEnv, "JNIEnv was null.");
+        return 0;
+    }
+    if (! script) {
+        throwError(pEnv, "Script was null.");
+        return 0;
+    }
+    check_init();
+    state = enter_python();
+    if (! pCodeHandles) {
+        pCodeHandles = PyDict_New();
+    }
+    if (! pCodeHandles) {
+        throwWrappedError(pEnv, __LINE__);
+    } else {
+        pCode = get_code(pEnv, script, Py_file_input);
+        if (pCode) {
+            pHandle = PyLong_FromLongLong(nextCodeHandle);
+            if (! pHandle) {
+                throwWrappedError(pEnv, __LINE__);
             } else {
-                pGlobals = mapToDictionary(pEnv, globals);
+                if (PyDict_SetItem(pCodeHandles, pHandle, pCode)) {
+                    throwWrappedError(pEnv, __LINE__);
+                } else {
+                    handle = nextCodeHandle++;
+                }
+                Py_DECREF(pHandle);
+            }
+            Py_DECREF(pCode);
+        }
+    }
+    exit_python(state);
+    return handle;
+}
+
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_execCode
+  (JNIEnv *pEnv, jobject thiss, jlong handle, jobject locals, jobject globals) {
+    PyGILState_STATE state;
+    PyObject *pHandle;
+    PyObject *pCode = NULL;
+    
+    if (! pEnv) {
+        throwError(pEnv, "JNIEnv was null.");
+        return;
+    }
+    check_init();
+    state = enter_python();
+    if (pCodeHandles) {
+        pHandle = PyLong_FromLongLong(handle);
+        if (! pHandle) {
+            throwWrappedError(pEnv, __LINE__);
+            exit_python(state);
+            return;
+        }
+        pCode = PyDict_GetItem(pCodeHandles, pHandle);
+        Py_XINCREF(pCode);
+        Py_DECREF(pHandle);
+    }
+    if (! pCode) {
+        throwError(pEnv, "No compiled code for handle.");
+    } else {
+        if (attach_env(pEnv) == 0) {
+            run_code(pEnv, pCode, locals, globals);
+        }
+        detach_env(pEnv);
+        Py_DECREF(pCode);
+    }
+    exit_python(state);
+}
+
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_releaseCode
+  (JNIEnv *pEnv, jobject thiss, jlong handle) {
+    PyGILState_STATE state;
+    PyObject *pHandle;
+    
+    check_init();
+    state = enter_python();
+    if (pCodeHandles) {
+        pHandle = PyLong_FromLongLong(handle);
+        if (pHandle) {
+            if (PyDict_DelItem(pCodeHandles, pHandle)) {
+                PyErr_Clear();
             }
-            if (pGlobals) {
-                if (! add_globals(pEnv, pGlobals)) {
-                    pScript = (*pEnv)->GetStringUTFChars(pEnv, script, NULL);
-                    pResult = PyRun_String(
-                        pScript, Py_file_input, pGlobals, pLocals);
-                    (*pEnv)->ReleaseStringUTFChars(pEnv, script, NULL);
-                    if (pResult) {
-                        Py_DECREF(pResult);
-                    } else {
-                        throwWrappedError(pEnv, __LINE__);
-                    }
+            Py_DECREF(pHandle);
+        } else {
+            PyErr_Clear();
+        }
+    }
+    exit_python(state);
+}
+
+/*
+    unwrapJObject
+    
+    Get a local reference to the Java object wrapped by a JB_Object.
+    
+    pEnv - JNI environment
+    pObject - a JB_Object or None
+    pResult - on success, a new local reference to the object or NULL
+              if pObject is None.
+    
+    Returns: 0 if successful, negative value on failure indicating that a
+             Java exception has been thrown.
+*/
+static int unwrapJObject(JNIEnv *pEnv, PyObject *pObject, jobject *pResult) {
+    PyObject *pAddr;
+    PyObject *pLong;
+    jobject j;
+    
+    *pResult = NULL;
+    if (pObject == Py_None) {
+        return 0;
+    }
+    pAddr = PyObject_CallMethod(pObject, "addr", NULL);
+    if (! pAddr) {
+        throwWrappedError(pEnv, __LINE__);
+        return -1;
+    }
+    pLong = PyLong_FromUnicodeObject(pAddr, 10);
+    Py_DECREF(pAddr);
+    if (! pLong) {
+        throwWrappedError(pEnv, __LINE__);
+        return -1;
+    }
+    j = (jobject)PyLong_AsVoidPtr(pLong);
+    Py_DECREF(pLong);
+    if (PyErr_Occurred()) {
+        throwWrappedError(pEnv, __LINE__);
+        return -1;
+    }
+    *pResult = (*pEnv)->NewLocalRef(pEnv, j);
+    return 0;
+}
+
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_invokeProxy
+  (JNIEnv *pEnv, jobject thiss, jlong handle, jobject proxy, jobject method,
+   jobjectArray args) {
+    PyGILState_STATE state;
+    PyObject *pArgs;
+    PyObject *pResult;
+    jobject result = NULL;
+    
+    if (! pEnv) {
+        throwError(pEnv, "JNIEnv was null.");
+        return NULL;
+    }
+    check_init();
+    state = enter_python();
+    if ((attach_env(pEnv) == 0) &&
+        get_function(pEnv, &pInvokeProxy, "javabridge.jutil", "invoke_proxy")) {
+        /*
+        Equivalent to:
+        import javabridge.jutil
+        result = javabridge.jutil.invoke_proxy(handle, proxy, method, args)
+        */
+        pArgs = PyTuple_New(4);
+        if (! pArgs) {
+            throwWrappedError(pEnv, __LINE__);
+        } else {
+            PyTuple_SET_ITEM(pArgs, 0, PyLong_FromLongLong(handle));
+            PyTuple_SET_ITEM(pArgs, 1, wrapJObject(pEnv, proxy));
+            PyTuple_SET_ITEM(pArgs, 2, wrapJObject(pEnv, method));
+            PyTuple_SET_ITEM(pArgs, 3, wrapJObject(pEnv, args));
+            if (PyTuple_GET_ITEM(pArgs, 0) &&
+                PyTuple_GET_ITEM(pArgs, 1) &&
+                PyTuple_GET_ITEM(pArgs, 2) &&
+                PyTuple_GET_ITEM(pArgs, 3)) {
+                pResult = PyObject_CallObject(pInvokeProxy, pArgs);
+                if (pResult) {
+                    unwrapJObject(pEnv, pResult, &result);
+                    Py_DECREF(pResult);
+                } else {
+                    throwWrappedError(pEnv, __LINE__);
                 }
-                Py_DECREF(pGlobals);
+            } else if (! (*pEnv)->ExceptionCheck(pEnv)) {
+                throwWrappedError(pEnv, __LINE__);
             }
-            Py_DECREF(pLocals);
+            Py_DECREF(pArgs);
         }
     }
     detach_env(pEnv);
-    PyGILState_Release(state);
+    exit_python(state);
+    return result;
+}
+
+/*
+   toJava
+   
+   Convert the result of a call or evaluation to a local reference
+   to a Java object, releasing the Python value.
+   
+   Returns: the Java object, NULL if the value was None or a Java
+            exception has been thrown.
+*/
+static jobject toJava(JNIEnv *pEnv, PyObject *pValue) {
+    PyObject *pResult;
+    jobject result = NULL;
+    
+    if (! get_function(pEnv, &pPythonToJava, "javabridge.jutil", "python_to_java")) {
+        Py_DECREF(pValue);
+        return NULL;
+    }
+    pResult = PyObject_CallFunctionObjArgs(pPythonToJava, pValue, NULL);
+    Py_DECREF(pValue);
+    if (! pResult) {
+        throwWrappedError(pEnv, __LINE__);
+        return NULL;
+    }
+    unwrapJObject(pEnv, pResult, &result);
+    Py_DECREF(pResult);
+    return result;
+}
+
+/*
+   stringToPython
+   
+   Convert a Java string to a Python string
+   
+   Returns: a new reference to the string or NULL if a Java exception
+            has been thrown.
+*/
+static PyObject *stringToPython(JNIEnv *pEnv, jstring s) {
+    const char *pChars;
+    PyObject *pResult;
+    
+    pChars = (*pEnv)->GetStringUTFChars(pEnv, s, NULL);
+    if (! pChars) {
+        return NULL;
+    }
+    pResult = PyUnicode_FromString(pChars);
+    (*pEnv)->ReleaseStringUTFChars(pEnv, s, pChars);
+    if (! pResult) {
+        throwWrappedError(pEnv, __LINE__);
+    }
+    return pResult;
+}
+
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_call
+  (JNIEnv *pEnv, jobject thiss, jstring module, jstring function,
+   jobjectArray args) {
+    PyGILState_STATE state;
+    PyObject *pModule;
+    PyObject *pFunction;
+    PyObject *pArgs;
+    PyObject *pValue;
+    jobject result = NULL;
+    
+    if (! pEnv) {
+        throwError(pEnv, "JNIEnv was null.");
+        return NULL;
+    }
+    if ((! module) || (! function)) {
+        throwError(pEnv, "Module or function name was null.");
+        return NULL;
+    }
+    check_init();
+    state = enter_python();
+    if ((attach_env(pEnv) == 0) &&
+        get_function(pEnv, &pCallFunction, "javabridge.jutil", "call_function")) {
+        /*
+        Equivalent to:
+        import javabridge.jutil
+        value = javabridge.jutil.call_function(module, function, args)
+        */
+        pModule = stringToPython(pEnv, module);
+        pFunction = pModule ? stringToPython(pEnv, function) : NULL;
+        pArgs = pFunction ? wrapJObject(pEnv, args) : NULL;
+        if (pArgs) {
+            pValue = PyObject_CallFunctionObjArgs(
+                pCallFunction, pModule, pFunction, pArgs, NULL);
+            if (pValue) {
+                result = toJava(pEnv, pValue);
+            } else {
+                throwWrappedError(pEnv, __LINE__);
+            }
+        }
+        Py_XDECREF(pArgs);
+        Py_XDECREF(pFunction);
+        Py_XDECREF(pModule);
+    }
+    detach_env(pEnv);
+    exit_python(state);
+    return result;
+}
+
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_eval
+  (JNIEnv *pEnv, jobject thiss, jstring expression, jobject locals) {
+    PyGILState_STATE state;
+    PyObject *pCode;
+    PyObject *pNamespace;
+    PyObject *pValue;
+    jobject result = NULL;
+    
+    if (! pEnv) {
+        throwError(pEnv, "JNIEnv was null.");
+        return NULL;
+    }
+    if (! expression) {
+        throwError(pEnv, "Expression was null.");
+        return NULL;
+    }
+    check_init();
+    state = enter_python();
+    if (attach_env(pEnv) == 0) {
+        pCode = get_code(pEnv, expression, Py_eval_input);
+        if (pCode) {
+            pNamespace = mapToNamespace(pEnv, locals, NULL, 1);
+            if (pNamespace) {
+#if PY_MAJOR_VERSION >= 3
+                pValue = PyEval_EvalCode(pCode, pNamespace, pNamespace);
+#else
+                pValue = PyEval_EvalCode(
+                    (PyCodeObject *)pCode, pNamespace, pNamespace);
+#endif
+                if (pValue) {
+                    result = toJava(pEnv, pValue);
+                } else {
+                    throwWrappedError(pEnv, __LINE__);
+                }
+                Py_DECREF(pNamespace);
+            }
+            Py_DECREF(pCode);
+        }
+    }
+    detach_env(pEnv);
+    exit_python(state);
+    return result;
+}
+
+JNIEXPORT jlongArray JNICALL Java_org_cellprofiler_javabridge_CPython_statistics
+  (JNIEnv *pEnv, jclass clazz, jboolean reset) {
+    PyGILState_STATE state;
+    jlong values[5] = { 0, 0, 0, 0, 0 };
+    jlongArray result;
+    
+    if (initialized || Py_IsInitialized()) {
+        state = PyGILState_Ensure();
+        values[0] = statCalls;
+        values[1] = statThreadStatesCreated;
+        values[2] = statPersistentThreadStates;
+        values[3] = statGILWaitNanos;
+        values[4] = statMaxGILWaitNanos;
+        if (reset) {
+            statCalls = 0;
+            statThreadStatesCreated = 0;
+            statGILWaitNanos = 0;
+            statMaxGILWaitNanos = 0;
+        }
+        PyGILState_Release(state);
+    }
+    result = (*pEnv)->NewLongArray(pEnv, 5);
+    if (result) {
+        (*pEnv)->SetLongArrayRegion(pEnv, result, 0, 5, values);
+    }
+    return result;
+}
+
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_setPersistentThreadStates
+  (JNIEnv *pEnv, jclass clazz, jboolean persistent) {
+    PyGILState_STATE state;
+    
+    persistThreadStates = persistent ? 1 : 0;
+    if (! persistent && Py_IsInitialized()) {
+        /*
+         * Release this thread's thread state now. Other threads release
+         * theirs when they next return from Python or when they exit.
+         */
+        state = PyGILState_Ensure();
+        exit_python(state);
+    }
 }
@@ -15,6 +15,70 @@ extern "C" {
 JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_exec
   (JNIEnv *, jobject, jstring, jobject, jobject);
 
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    compile
+ * Signature: (Ljava/lang/String;)J
+ */
+JNIEXPORT jlong JNICALL Java_org_cellprofiler_javabridge_CPython_compile
+  (JNIEnv *, jobject, jstring);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    execCode
+ * Signature: (JLjava/util/Map;Ljava/util/Map;)V
+ */
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_execCode
+  (JNIEnv *, jobject, jlong, jobject, jobject);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    releaseCode
+ * Signature: (J)V
+ */
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_releaseCode
+  (JNIEnv *, jobject, jlong);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    invokeProxy
+ * Signature: (JLjava/lang/Object;Ljava/lang/reflect/Method;[Ljava/lang/Object;)Ljava/lang/Object;
+ */
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_invokeProxy
+  (JNIEnv *, jobject, jlong, jobject, jobject, jobjectArray);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    call
+ * Signature: (Ljava/lang/String;Ljava/lang/String;[Ljava/lang/Object;)Ljava/lang/Object;
+ */
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_call
+  (JNIEnv *, jobject, jstring, jstring, jobjectArray);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    eval
+ * Signature: (Ljava/lang/String;Ljava/util/Map;)Ljava/lang/Object;
+ */
+JNIEXPORT jobject JNICALL Java_org_cellprofiler_javabridge_CPython_eval
+  (JNIEnv *, jobject, jstring, jobject);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    statistics
+ * Signature: (Z)[J
+ */
+JNIEXPORT jlongArray JNICALL Java_org_cellprofiler_javabridge_CPython_statistics
+  (JNIEnv *, jclass, jboolean);
+
+/*
+ * Class:     org_cellprofiler_javabridge_CPython
+ * Method:    setPersistentThreadStates
+ * Signature: (Z)V
+ */
+JNIEXPORT void JNICALL Java_org_cellprofiler_javabridge_CPython_setPersistentThreadStates
+  (JNIEnv *, jclass, jboolean);
+
 #ifdef __cplusplus
 }
 #endif
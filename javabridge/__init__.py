@@ -37,7 +37,8 @@ JARS = [os.path.realpath(os.path.join(_jars_dir, name + '.jar'))
 
 from .jutil import start_vm, kill_vm, vm, activate_awt, deactivate_awt
 
-from .jutil import attach, detach, get_env
+from .jutil import attach, detach, get_env, set_auto_attach, \
+    JavaThreadPoolExecutor, get_cached_method_id
 
 
 # JavaScript
@@ -51,9 +52,11 @@ from .jutil import call, get_static_field, static_call, \
 
 # Make Python object that wraps a Java object
 from .jutil import make_method, make_new, make_call, box
-from .wrappers import JWrapper, JClassWrapper, JProxy
+from .jutil import register_natives, unregister_natives
+from .wrappers import JWrapper, JClassWrapper, JProxy, \
+     JVectorizedDoubleOperator, vectorized_double_operator
 
-from .jutil import get_nice_arg
+from .jutil import get_nice_arg, get_nice_result
 
 # Useful collection wrappers
 from .jutil import get_dictionary_wrapper, jdictionary_to_string_dictionary, \
@@ -78,9 +81,10 @@ from ._javabridge import mac_enter_run_loop, mac_stop_run_loop, mac_run_loop_ini
     
 # References
 from .jutil import create_jref, redeem_jref, create_and_lock_jref,\
-     lock_jref, unlock_jref
+     lock_jref, unlock_jref, create_proxy_handle
 
-# Don't expose: AtExit, get_nice_args,
+# Don't expose: AtExit, call_function, get_nice_args, invoke_handle,
+# invoke_proxy, java_to_python, make_run_namespace, python_to_java,
 # make_run_dictionary, run_in_main_thread, split_sig, unwrap_javascript,
 # print_all_stack_traces
 
@@ -0,0 +1,157 @@
+# -*- Encoding: utf-8 -*-
+'''aio.py - asyncio support for the javabridge
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+Coroutines here run blocking Java calls on a JavaThreadPoolExecutor so
+that they don't stall the event loop, and wrap Java futures so that they
+can be awaited. Import this module explicitly - it needs Python 3.5+::
+
+    import javabridge.aio
+
+    async def length(jstring):
+        return await javabridge.aio.call(jstring, "length", "()I")
+
+'''
+
+import asyncio
+import functools
+import threading
+
+import javabridge as J
+
+__executor = None
+__executor_lock = threading.Lock()
+#
+# Proxies handed to Java whose callbacks haven't run yet. Java only holds
+# the proxy's handle, so the proxies must be kept alive here.
+#
+__pending_proxies = set()
+
+
+def get_executor():
+    '''Return the executor that runs this module's Java calls
+
+    A JavaThreadPoolExecutor is created the first time it is needed.
+    '''
+    global __executor
+    with __executor_lock:
+        if __executor is None:
+            __executor = J.JavaThreadPoolExecutor(
+                thread_name_prefix="JavaAsyncIO")
+        return __executor
+
+
+def set_executor(executor):
+    '''Set the executor that runs this module's Java calls
+
+    :param executor: an executor whose threads are attached to the JVM,
+                     typically a JavaThreadPoolExecutor.
+    '''
+    global __executor
+    with __executor_lock:
+        __executor = executor
+
+
+def _get_loop():
+    if hasattr(asyncio, "get_running_loop"):
+        return asyncio.get_running_loop()
+    return asyncio.get_event_loop()
+
+
+async def run(fn, *args, **kwargs):
+    '''Run fn(*args, **kwargs) on an attached worker thread
+
+    :returns: the function's result
+    '''
+    return await _get_loop().run_in_executor(
+        get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+async def call(o, method_name, sig, *args):
+    '''Call a method on an object without blocking the event loop
+
+    The arguments are the same as for :py:func:`javabridge.call`.
+    '''
+    return await run(J.call, o, method_name, sig, *args)
+
+
+async def static_call(class_name, method_name, sig, *args):
+    '''Call a static method without blocking the event loop
+
+    The arguments are the same as for :py:func:`javabridge.static_call`.
+    '''
+    return await run(J.static_call, class_name, method_name, sig, *args)
+
+
+def _set_result(future, value):
+    if not future.cancelled():
+        future.set_result(value)
+
+
+def _set_exception(future, exception):
+    if not future.cancelled():
+        future.set_exception(exception)
+
+
+def wrap_future(jfuture, fn_post_process=None):
+    '''Wrap a Java future in an asyncio future
+
+    If the Java future is a ``java.util.concurrent.CompletionStage``, such
+    as a ``CompletableFuture``, the asyncio future is completed by a
+    callback registered with ``whenComplete``. Otherwise, a worker thread
+    waits on ``get()``. Cancelling the asyncio future cancels the Java one.
+
+    Call from a coroutine on an attached thread.
+
+    :param jfuture: a ``java.util.concurrent.Future`` or a wrapper of one
+    :param fn_post_process: a function to apply to the Java result. It runs
+                            on the thread that completes the Java future.
+
+    :returns: an asyncio future for the (post-processed) result. A Java
+              exception is delivered as a JavaException.
+    '''
+    jfuture = getattr(jfuture, "o", jfuture)
+    loop = _get_loop()
+    if not J.is_instance_of(jfuture, "java/util/concurrent/CompletionStage"):
+        def get():
+            result = J.call(jfuture, "get", "()Ljava/lang/Object;")
+            if fn_post_process is not None:
+                result = fn_post_process(result)
+            return result
+        future = asyncio.wrap_future(get_executor().submit(get), loop=loop)
+    else:
+        future = loop.create_future()
+        def when_complete(result, throwable):
+            __pending_proxies.discard(proxy)
+            try:
+                if throwable is not None:
+                    if J.is_instance_of(
+                        throwable, "java/util/concurrent/CompletionException"):
+                        cause = J.call(throwable, "getCause",
+                                       "()Ljava/lang/Throwable;")
+                        if cause is not None:
+                            throwable = cause
+                    raise J.JavaException(throwable)
+                if fn_post_process is not None:
+                    result = fn_post_process(result)
+            except Exception as e:
+                loop.call_soon_threadsafe(_set_exception, future, e)
+            else:
+                loop.call_soon_threadsafe(_set_result, future, result)
+        proxy = J.JProxy("java.util.function.BiConsumer",
+                         dict(accept=when_complete))
+        __pending_proxies.add(proxy)
+        J.call(jfuture, "whenComplete",
+               "(Ljava/util/function/BiConsumer;)"
+               "Ljava/util/concurrent/CompletionStage;", proxy.o)
+    def on_done(future):
+        if future.cancelled():
+            J.call(jfuture, "cancel", "(Z)Z", True)
+    future.add_done_callback(on_done)
+    return future
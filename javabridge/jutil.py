@@ -12,12 +12,21 @@ All rights reserved.
 from __future__ import print_function
 
 
+import atexit
+import concurrent.futures
+import ctypes
 import gc
+import importlib
 import inspect
 import logging
 import numpy as np
 import os
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 import threading
+import timeit
 import traceback
 import re    
 import subprocess
@@ -39,6 +48,7 @@ if sys.version_info >= (3, 0, 0):
     # basestring -> str and unicode -> str in Python 3
     basestring = str
     unicode = str
+    unichr = chr
 
 
 class JavaError(ValueError):
@@ -162,7 +172,6 @@ elif sys.platform == "darwin":
 import javabridge._javabridge as _javabridge
 __dead_event = threading.Event()
 __kill = [False]
-__main_thread_closures = []
 __run_headless = False
 
 RQCLS = "org/cellprofiler/runnablequeue/RunnableQueue"
@@ -200,7 +209,8 @@ class vm():
     def __exit__(self, type, value, traceback):
         kill_vm()
 
-def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,as_daemon=True):
+def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,as_daemon=True,
+             auto_attach=False):
     '''Start the Java Virtual Machine.
 
     :param args: a list of strings, encoding arbitrary startup options
@@ -226,6 +236,9 @@ def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,
       property. See `"Using Headless Mode in the Java SE Platform"
       <http://www.oracle.com/technetwork/articles/javase/headless-136834.html>`_.
 
+    :param auto_attach: if true, attach threads automatically the first
+      time they use the JVM. See :py:func:`javabridge.set_auto_attach`.
+
     :throws: :py:exc:`javabridge.JVMNotFoundError`
 
     '''
@@ -255,7 +268,6 @@ def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,
     def start_thread(args=args, run_headless=run_headless):
         global __i_am_the_main_thread
         global __kill
-        global __main_thread_closures
         global __run_headless
         
         args = list(args)
@@ -271,7 +283,7 @@ def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,
         # that they exist past atexit.
         #
         kill = __kill
-        main_thread_closures = __main_thread_closures
+        dispatcher = __main_thread_dispatcher
         try:
             if sys.platform == "darwin":
                 logger.debug("Launching VM in non-python thread")
@@ -295,9 +307,10 @@ def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,
         while True:
             _javabridge.wait_for_wake_event()
             _javabridge.reap()
-            while(len(main_thread_closures)):
-                main_thread_closures.pop()()
+            dispatcher.run_pending()
             if kill[0]:
+                while dispatcher.run_pending() > 0:
+                    pass
                 break
         if sys.platform == "darwin":
             #
@@ -318,6 +331,8 @@ def start_vm(args=None, class_path=None, max_heap_size=None, run_headless=False,
     if not _javabridge.get_vm().is_active():
         raise RuntimeError("Failed to start Java VM")
     attach()
+    if auto_attach:
+        set_auto_attach(True)
     
 def unwrap_javascript(o):
     '''Unwrap an object such as NativeJavaObject
@@ -413,24 +428,7 @@ def get_future_wrapper(o, fn_post_process=None):
                       the appropriate wrapper for ``T`` so you get back a
                       wrapped class of the appropriate type.
     '''
-    class Future(object):
-        def __init__(self):
-            self.o = o
-        run = make_method("run", "()V")
-        cancel = make_method("cancel", "(Z)Z")
-        raw_get = make_method(
-            "get", "()Ljava/lang/Object;",
-            "Waits if necessary for the computation to complete, and then retrieves its result.",
-            fn_post_process=fn_post_process)
-        isCancelled = make_method("isCancelled", "()Z")
-        isDone = make_method("isDone", "()Z")
-        if sys.platform != 'darwin':
-            get = raw_get
-        else:
-            def get(self):
-                '''Get the future's value after it has come done'''
-                return mac_get_future_value(self)
-    return Future()
+    return FutureWrapper(o, fn_post_process)
 
 def make_future_task(runnable_or_callable, 
                      result=None, fn_post_process=None):
@@ -649,47 +647,170 @@ def execute_callable_in_main_thread(jcallable):
             True)
     
 
-def run_in_main_thread(closure, synchronous):
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+class MainThreadDispatcher(object):
+    '''Queues closures to be run by the main Java thread
+    
+    Closures run in the order they were submitted. Closures with a higher
+    priority run before those with a lower one. The main thread runs at
+    most batch_size closures per wakeup, reaping dead Java objects between
+    batches.
+    '''
+    def __init__(self, batch_size=64):
+        self.__queues = [
+            queue.SimpleQueue() if hasattr(queue, "SimpleQueue")
+            else queue.Queue()
+            for _ in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW)]
+        self.batch_size = batch_size
+        self.__stats_lock = threading.Lock()
+        self.__submitted = 0
+        self.__completed = 0
+        self.__cancelled = 0
+        self.__timed_out = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+        
+    def submit(self, closure, priority=PRIORITY_NORMAL):
+        '''Queue a closure to be run on the main thread
+        
+        :param closure: a callable that takes no arguments
+        :param priority: one of PRIORITY_HIGH, PRIORITY_NORMAL or
+                         PRIORITY_LOW
+        
+        :returns: a concurrent.futures.Future for the closure's result
+        '''
+        future = concurrent.futures.Future()
+        with self.__stats_lock:
+            self.__submitted += 1
+        self.__queues[priority].put((future, closure, timeit.default_timer()))
+        _javabridge.set_wake_event()
+        return future
+    
+    def run_pending(self):
+        '''Run up to batch_size queued closures on the calling thread
+        
+        If closures are left over, the wake event is set so that the
+        main thread comes back for them.
+        
+        :returns: the number of closures that were run.
+        '''
+        count = 0
+        for q in self.__queues:
+            while count < self.batch_size:
+                try:
+                    future, closure, enqueued = q.get_nowait()
+                except queue.Empty:
+                    break
+                count += 1
+                if not future.set_running_or_notify_cancel():
+                    with self.__stats_lock:
+                        self.__cancelled += 1
+                    continue
+                wait = timeit.default_timer() - enqueued
+                with self.__stats_lock:
+                    self.__completed += 1
+                    self.__total_wait += wait
+                    self.__max_wait = max(self.__max_wait, wait)
+                try:
+                    future.set_result(closure())
+                except Exception as e:
+                    logger.exception("Caught exception when executing closure")
+                    future.set_exception(e)
+        if self.depth() > 0:
+            _javabridge.set_wake_event()
+        return count
+    
+    def result(self, future, timeout=None):
+        '''Wait for the result of a submitted closure
+        
+        :param future: the future returned by submit
+        :param timeout: the maximum number of seconds to wait or None to
+                        wait until the closure has run. If the closure
+                        hasn't started by then, it is cancelled.
+        
+        raises concurrent.futures.TimeoutError if the timeout expires.
+        '''
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            with self.__stats_lock:
+                self.__timed_out += 1
+            future.cancel()
+            raise
+    
+    def depth(self):
+        '''The number of closures waiting to run'''
+        return sum([q.qsize() for q in self.__queues])
+    
+    def get_statistics(self):
+        '''Return the dispatcher's queue depth and wait latency
+        
+        :returns: a dictionary with keys "depth" (closures waiting),
+                  "depth_by_priority", "submitted", "completed" (closures
+                  that ran), "cancelled" (closures cancelled before they
+                  ran), "timed_out" (synchronous calls whose timeout
+                  expired - their closures are also counted as
+                  cancelled if they hadn't started), "mean_wait" and
+                  "max_wait" (seconds between submission and the start
+                  of execution of the closures that ran).
+        '''
+        with self.__stats_lock:
+            completed = self.__completed
+            return dict(
+                depth=self.depth(),
+                depth_by_priority=[q.qsize() for q in self.__queues],
+                submitted=self.__submitted,
+                completed=completed,
+                cancelled=self.__cancelled,
+                timed_out=self.__timed_out,
+                mean_wait=self.__total_wait / completed if completed else 0.0,
+                max_wait=self.__max_wait)
+
+__main_thread_dispatcher = MainThreadDispatcher()
+
+def get_main_thread_statistics():
+    '''Queue depth and wait latency of closures run on the main thread
+    
+    See MainThreadDispatcher.get_statistics
+    '''
+    return __main_thread_dispatcher.get_statistics()
+
+def run_in_main_thread(closure, synchronous, priority=PRIORITY_NORMAL,
+                       timeout=None):
     '''Run a closure in the main Java thread
     
     :param closure: a callable object (eg lambda : print "hello, world")
     :param synchronous: True to wait for completion of execution
-
+    :param priority: PRIORITY_HIGH, PRIORITY_NORMAL or PRIORITY_LOW
+    :param timeout: if synchronous, the maximum number of seconds to wait.
+                    concurrent.futures.TimeoutError is raised if the
+                    closure hasn't finished by then and the closure is
+                    cancelled if it hasn't started.
+    
+    :returns: the closure's result if synchronous or if called on the
+              main thread, where the closure is run immediately.
+              Otherwise, a concurrent.futures.Future for the result.
     '''
-    global __main_thread_closures
     if _javabridge.get_thread_local("is_main_thread", False):
         return closure()
     
+    future = __main_thread_dispatcher.submit(closure, priority)
     if synchronous:
-        done_event = threading.Event()
-        done_event.clear()
-        result = [None]
-        exception = [None]
-        def synchronous_closure():
-            try:
-                result[0] = closure()
-            except Exception as e:
-                logger.exception("Caught exception when executing closure")
-                exception[0] = e
-            done_event.set()
-        __main_thread_closures.append(synchronous_closure)
-        _javabridge.set_wake_event()
-        done_event.wait()
-        if exception[0] is not None:
-            raise exception[0]
-        return result[0]
-    else:
-        __main_thread_closures.append(closure)
-        _javabridge.set_wake_event()
+        return __main_thread_dispatcher.result(future, timeout)
+    return future
     
 def print_all_stack_traces():
     thread_map = static_call("java/lang/Thread","getAllStackTraces",
                              "()Ljava/util/Map;")
     stack_traces = call(thread_map, "values","()Ljava/util/Collection;")
     sta = call(stack_traces, "toArray","()[Ljava/lang/Object;")
-    stal = get_env().get_object_array_elements(sta)
+    env = get_env()
+    stal = env.get_object_array_elements(sta)
     for stak in stal:
-        stakes = get_env().get_object_array_elements(stak)
+        stakes = env.get_object_array_elements(stak)
         for stake in stakes:
             print(to_string(stake))
             
@@ -739,6 +860,9 @@ def kill_vm():
     if not _javabridge.get_vm().is_active():
         return
     deactivate_awt()
+    set_auto_attach(False)
+    for executor in list(_java_executors):
+        executor.shutdown(wait=True, cancel_futures=True)
     gc.collect()
     while _javabridge.get_thread_local("attach_count", 0) > 0:
         detach()
@@ -773,6 +897,219 @@ def detach():
         return
     _javabridge.jb_detach()
 
+def set_auto_attach(enabled=True):
+    '''Attach threads to the JVM automatically on first use
+    
+    When enabled, a thread that is not attached is attached as a daemon
+    thread, with its context class loader set, the first time it calls
+    get_env() - which every jutil function does. A thread attached this
+    way is detached when it exits, so ordinary worker threads, for
+    instance those of a ThreadPoolExecutor or a web server, can use the
+    javabridge without calling attach() and detach().
+    
+    Threads that call attach() and detach() themselves are unaffected.
+    
+    :param enabled: True to turn automatic attachment on, False to turn
+                    it off.
+    '''
+    _javabridge.set_auto_attach_hook(__auto_attach if enabled else None)
+    
+def __auto_attach():
+    if not _javabridge.get_vm().is_active():
+        return None
+    env = attach()
+    _javabridge.detach_on_thread_exit()
+    return env
+
+def _cpu_count():
+    if hasattr(os, "cpu_count"):
+        return os.cpu_count() or 1
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+_java_executors = weakref.WeakSet()
+
+class JavaThreadPoolExecutor(concurrent.futures.Executor):
+    '''An executor whose worker threads stay attached to the JVM
+    
+    Each worker thread attaches when it starts and detaches when the
+    executor shuts down, so tasks do not pay for attach() and detach().
+    Before it takes its first task, a worker looks up the method IDs
+    listed in *methods*, so tasks can get them from
+    get_cached_method_id() without a lookup. Use it like
+    concurrent.futures.ThreadPoolExecutor::
+    
+        to_string = ("java/lang/Object", "toString", "()Ljava/lang/String;")
+        def task(env, jobject):
+            return env.call_method(
+                jobject, javabridge.get_cached_method_id(*to_string))
+        with javabridge.JavaThreadPoolExecutor(
+                max_workers=4, methods=[to_string], pass_env=True) as executor:
+            future = executor.submit(task, jobject)
+            
+    :param max_workers: the maximum number of worker threads. The default
+                        is the same as ThreadPoolExecutor's.
+    :param thread_name_prefix: name prefix for the worker threads
+    :param initializer: a callable run once on each worker thread after it
+                        attaches.
+    :param initargs: arguments to pass to the initializer
+    :param pass_env: if True, call each task with the worker's JB_Env as
+                     its first argument.
+    :param methods: the methods whose IDs the workers look up before
+                    running tasks, as (class_name, method_name, sig) or
+                    (class_name, method_name, sig, is_static) tuples.
+    
+    kill_vm() shuts down any executor that is still running, as does
+    the interpreter when it exits.
+    '''
+    def __init__(self, max_workers=None, thread_name_prefix="JavaWorker",
+                 initializer=None, initargs=(), pass_env=False, methods=()):
+        if max_workers is None:
+            max_workers = min(32, _cpu_count() + 4)
+        if max_workers <= 0:
+            raise ValueError("max_workers must be greater than 0")
+        if initializer is not None and not callable(initializer):
+            raise TypeError("initializer must be a callable")
+        self.__max_workers = max_workers
+        self.__thread_name_prefix = thread_name_prefix
+        self.__initializer = initializer
+        self.__initargs = initargs
+        self.__pass_env = pass_env
+        self.__methods = [tuple(method) for method in methods]
+        self.__work_queue = queue.SimpleQueue() \
+            if hasattr(queue, "SimpleQueue") else queue.Queue()
+        self.__idle_semaphore = threading.Semaphore(0)
+        self.__threads = []
+        self.__shutdown = False
+        self.__broken = False
+        self.__shutdown_lock = threading.Lock()
+        _java_executors.add(self)
+        
+    def submit(self, fn, *args, **kwargs):
+        '''Schedule fn(*args, **kwargs) on a worker thread
+        
+        :returns: a concurrent.futures.Future for the result
+        '''
+        with self.__shutdown_lock:
+            if self.__broken:
+                raise JavaError("A worker thread failed to initialize")
+            if self.__shutdown:
+                raise RuntimeError(
+                    "Cannot schedule new futures after shutdown")
+            future = concurrent.futures.Future()
+            self.__work_queue.put((future, fn, args, kwargs))
+            self.__adjust_thread_count()
+            return future
+    
+    def __adjust_thread_count(self):
+        if self.__idle_semaphore.acquire(False):
+            return
+        if len(self.__threads) < self.__max_workers:
+            t = threading.Thread(
+                target=self.__worker,
+                name="%s_%d" % (self.__thread_name_prefix, len(self.__threads)))
+            t.daemon = True
+            t.start()
+            self.__threads.append(t)
+            
+    def __worker(self):
+        attach()
+        try:
+            try:
+                for method in self.__methods:
+                    _get_method_id(*method)
+                if self.__initializer is not None:
+                    self.__initializer(*self.__initargs)
+            except:
+                logger.error("Java worker thread failed to initialize",
+                             exc_info=True)
+                self.__initializer_failed()
+                return
+            env = get_env()
+            while True:
+                item = self.__work_queue.get()
+                if item is None:
+                    # Pass the sentinel on to the next worker
+                    self.__work_queue.put(None)
+                    return
+                future, fn, args, kwargs = item
+                del item
+                if future.set_running_or_notify_cancel():
+                    try:
+                        if self.__pass_env:
+                            result = fn(env, *args, **kwargs)
+                        else:
+                            result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+                del future, fn, args, kwargs
+                self.__idle_semaphore.release()
+        finally:
+            detach()
+            
+    def __initializer_failed(self):
+        with self.__shutdown_lock:
+            self.__broken = True
+            self.__drain("A worker thread failed to initialize")
+            
+    def __drain(self, message=None):
+        while True:
+            try:
+                item = self.__work_queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                self.__work_queue.put(None)
+                return
+            future = item[0]
+            if message is None:
+                future.cancel()
+            elif future.set_running_or_notify_cancel():
+                future.set_exception(JavaError(message))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        '''Stop the worker threads, detaching them from the JVM
+        
+        :param wait: if True, wait for pending tasks to finish and for
+                     the threads to exit.
+        :param cancel_futures: if True, cancel tasks that have not
+                               started yet.
+        '''
+        with self.__shutdown_lock:
+            if not self.__shutdown:
+                self.__shutdown = True
+                if cancel_futures:
+                    self.__drain()
+                self.__work_queue.put(None)
+        if wait:
+            for t in list(self.__threads):
+                t.join()
+        _java_executors.discard(self)
+
+def _shutdown_java_executors():
+    '''Shut down the executors that are still running at exit
+    
+    Their worker threads are daemon threads that would otherwise stay
+    attached to the JVM while Python finalizes.
+    '''
+    for executor in list(_java_executors):
+        executor.shutdown(wait=True)
+
+#
+# Like concurrent.futures.ThreadPoolExecutor, shut down when threading
+# shuts down, which is before the atexit functions run and before the
+# VM is killed as __main__ is torn down.
+#
+if hasattr(threading, "_register_atexit"):
+    threading._register_atexit(_shutdown_java_executors)
+else:
+    atexit.register(_shutdown_java_executors)
+
 def init_context_class_loader():
     '''Set the thread's context class loader to the system class loader
     
@@ -808,11 +1145,11 @@ def is_instance_of(o, class_name):
         return False
     env = get_env()
     klass = env.find_class(class_name)
-    jexception = get_env().exception_occurred()
+    jexception = env.exception_occurred()
     if jexception is not None:
         raise JavaException(jexception)
     result = env.is_instance_of(o, klass)
-    jexception = get_env().exception_occurred()
+    jexception = env.exception_occurred()
     if jexception is not None:
         raise JavaException(jexception)
     return result
@@ -909,7 +1246,7 @@ def make_static_call(class_name, method_name, sig):
     env = get_env()
     klass = env.find_class(class_name)
     if klass is None:
-        jexception = get_env().exception_occurred()
+        jexception = env.exception_occurred()
         raise JavaException(jexception)
     
     method_id = env.get_static_method_id(klass, method_name, sig)
@@ -943,7 +1280,8 @@ def static_call(class_name, method_name, sig, *args):
     result = fn(*nice_args)
     return get_nice_result(result, ret_sig)
 
-def make_method(name, sig, doc='No documentation', fn_post_process=None):
+def make_method(name, sig, doc='No documentation', fn_post_process=None,
+                class_name=None):
     '''Return a class method for the given Java class. When called,
     the method expects to find its Java instance object in ``self.o``,
     which is where ``make_new`` puts it.
@@ -953,19 +1291,149 @@ def make_method(name, sig, doc='No documentation', fn_post_process=None):
     :param doc: doc string to be attached to the Python method
     :param fn_post_process: a function, such as a wrapper, that transforms
                             the method output into something more useable.
+    :param class_name: if defined, the class or interface that declares the
+                       method, in slash form. The method ID is then looked up
+                       once, on the first call, instead of on every call.
+                       Whether ``self.o`` is an instance of the class is
+                       checked once per object - if it isn't, the method
+                       is looked up by name on every call, as without
+                       ``class_name``.
     
     '''
-    
-    def method(self, *args):
-        assert isinstance(self.o, _javabridge.JB_Object)
-        result = call(self.o, name, sig, *args)
-        if fn_post_process is not None:
-            result = fn_post_process(result)
-        return result
+    if class_name is None:
+        def method(self, *args):
+            assert isinstance(self.o, _javabridge.JB_Object)
+            result = call(self.o, name, sig, *args)
+            if fn_post_process is not None:
+                result = fn_post_process(result)
+            return result
+    else:
+        ret_sig = sig[sig.find(')')+1:]
+        cache = []
+        implements_key = "_implements_" + class_name.replace("/", "_")
+        def method(self, *args):
+            o = self.o
+            assert isinstance(o, _javabridge.JB_Object)
+            env = get_env()
+            #
+            # Calling a method ID of an interface on an object that
+            # doesn't implement it is undefined.
+            #
+            implements = self.__dict__.get(implements_key)
+            if implements is None or implements[0] is not o:
+                implements = (o, env.is_instance_of(
+                    o, _find_cached_class(class_name)))
+                self.__dict__[implements_key] = implements
+            if not implements[1]:
+                result = call(o, name, sig, *args)
+                if fn_post_process is not None:
+                    result = fn_post_process(result)
+                return result
+            if len(cache) == 0:
+                #
+                # Other threads can run during the lookup, so the entry
+                # is published in one step.
+                #
+                cache[:] = [(_get_method_id(class_name, name, sig),
+                             split_sig(sig[1:sig.find(')')]))]
+            method_id, args_sig = cache[0]
+            result = env.call_method(
+                o, method_id, *get_nice_args(args, args_sig))
+            x = env.exception_occurred()
+            if x is not None:
+                raise JavaException(x)
+            result = get_nice_result(result, ret_sig)
+            if fn_post_process is not None:
+                result = fn_post_process(result)
+            return result
 
     method.__doc__ = doc
     return method
 
+#
+# Classes and method IDs looked up by name once, for classes that are
+# never unloaded
+#
+_cached_classes = {}
+_cached_method_ids = {}
+
+def _find_cached_class(class_name):
+    '''Return the JB_Class for a class name, looking it up once'''
+    klass = _cached_classes.get(class_name)
+    if klass is None:
+        env = get_env()
+        klass = env.find_class(class_name)
+        if klass is None:
+            raise JavaException(env.exception_occurred())
+        _cached_classes[class_name] = klass
+    return klass
+
+def _get_method_id(class_name, name, sig, is_static=False):
+    '''Return the method ID for a method, looking it up once'''
+    key = (class_name, name, sig, is_static)
+    method_id = _cached_method_ids.get(key)
+    if method_id is None:
+        env = get_env()
+        klass = _find_cached_class(class_name)
+        if is_static:
+            method_id = env.get_static_method_id(klass, name, sig)
+        else:
+            method_id = env.get_method_id(klass, name, sig)
+        if method_id is None:
+            jexception = env.exception_occurred()
+            if jexception is not None:
+                raise JavaException(jexception)
+            raise JavaError('Could not find method name = "%s" '
+                            'with signature = "%s"' % (name, sig))
+        _cached_method_ids[key] = method_id
+    return method_id
+
+def get_cached_method_id(class_name, method_name, sig, is_static=False):
+    '''Return the method ID for a method, looking it up only the first time
+    
+    The class and method ID are kept for the life of the VM, so use this
+    for classes that are never unloaded, such as those on the class path.
+    
+    :param class_name: the class's name, using slashes, e.g. "java/lang/String"
+    :param method_name: the name of the method
+    :param sig: the method's signature
+    :param is_static: True for a static method
+    :returns: a method ID for use with the JB_Env call functions, e.g.
+              ``env.call_method(o, method_id, ...)``
+    '''
+    return _get_method_id(class_name, method_name, sig, is_static)
+
+class FutureWrapper(object):
+    '''A wrapper of ``java.util.concurrent.Future``
+    
+    Use :py:func:`get_future_wrapper` to make one.
+    '''
+    def __init__(self, o, fn_post_process=None):
+        self.o = o
+        self.fn_post_process = fn_post_process
+        
+    run = make_method("run", "()V")
+    cancel = make_method("cancel", "(Z)Z", 
+                         class_name="java/util/concurrent/Future")
+    __get = make_method("get", "()Ljava/lang/Object;", 
+                        class_name="java/util/concurrent/Future")
+    def raw_get(self):
+        '''Waits if necessary for the computation to complete, and then retrieves its result.'''
+        result = self.__get()
+        if self.fn_post_process is not None:
+            result = self.fn_post_process(result)
+        return result
+    isCancelled = make_method("isCancelled", "()Z",
+                              class_name="java/util/concurrent/Future")
+    isDone = make_method("isDone", "()Z", 
+                         class_name="java/util/concurrent/Future")
+    if sys.platform != 'darwin':
+        get = raw_get
+    else:
+        def get(self):
+            '''Get the future's value after it has come done'''
+            return mac_get_future_value(self)
+
 def get_static_field(klass, name, sig):
     '''Get the value for a static field on a class
     
@@ -985,11 +1453,11 @@ def get_static_field(klass, name, sig):
         class_name = str(klass)
         klass = env.find_class(class_name)
         if klass is None:
-            jexception = get_env().exception_occurred()
+            jexception = env.exception_occurred()
             raise JavaException(jexception)
     field_id = env.get_static_field_id(klass, name, sig)
     if field_id is None:
-        jexception = get_env().exception_occurred()
+        jexception = env.exception_occurred()
         raise JavaException(jexception)
     if sig == 'Z':
         return env.get_static_boolean_field(klass, field_id)
@@ -1029,11 +1497,11 @@ def set_static_field(klass, name, sig, value):
         class_name = str(klass)
         klass = env.find_class(class_name)
         if klass is None:
-            jexception = get_env().exception_occurred()
+            jexception = env.exception_occurred()
             raise JavaException(jexception)
     field_id = env.get_static_field_id(klass, name, sig)
     if field_id is None:
-        jexception = get_env().exception_occurred()
+        jexception = env.exception_occurred()
         raise JavaException(jexception)
     if sig == 'Z':
         env.set_static_boolean_field(klass, field_id, value)
@@ -1069,7 +1537,7 @@ def get_field(o, name, sig):
     klass = env.get_object_class(o)
     field_id = env.get_field_id(klass, name, sig)
     if field_id is None:
-        jexception = get_env().exception_occurred()
+        jexception = env.exception_occurred()
         raise JavaException(jexception)
     if sig == 'Z':
         return env.get_boolean_field(o, field_id)
@@ -1103,7 +1571,7 @@ def set_field(o, name, sig, value):
     klass = env.get_object_class(o)
     field_id = env.get_field_id(klass, name, sig)
     if field_id is None:
-        jexception = get_env().exception_occurred()
+        jexception = env.exception_occurred()
         raise JavaException(jexception)
     if sig == 'Z':
         env.set_boolean_field(o, field_id, value)
@@ -1191,7 +1659,7 @@ def get_nice_arg(arg, sig):
     
     if isinstance(arg, np.ndarray):
         if sig == '[Z':
-            return env.make_boolean_array(np.ascontiguousarray(arg.flatten(), np.bool8))
+            return env.make_boolean_array(np.ascontiguousarray(arg.flatten(), np.bool_))
         elif sig == '[B':
             return env.make_byte_array(np.ascontiguousarray(arg.flatten(), np.uint8))
         elif sig == '[S':
@@ -1310,6 +1778,137 @@ def box(value, klass):
     sig = "L%s;" % wclass.getCanonicalName().replace(".", "/")
     return get_nice_arg(value, sig)
 
+class CollectionWrapper(object):
+    '''A wrapper of ``java.util.Collection``
+    
+    Use :py:func:`get_collection_wrapper` to make one.
+    '''
+    def __init__(self, o, fn_wrapper=None):
+        self.o = o
+        self.fn_wrapper = fn_wrapper
+        
+    def _wrap(self, x):
+        return x if self.fn_wrapper is None else self.fn_wrapper(x)
+        
+    add = make_method("add", "(Ljava/lang/Object;)Z",
+                      class_name="java/util/Collection")
+    addAll = make_method("addAll", "(Ljava/util/Collection;)Z",
+                         class_name="java/util/Collection")
+    clear = make_method("clear", "()V", class_name="java/util/Collection")
+    contains = make_method("contains", "(Ljava/lang/Object;)Z",
+                           class_name="java/util/Collection")
+    containsAll = make_method("containsAll", "(Ljava/util/Collection;)Z",
+                              class_name="java/util/Collection")
+    isEmpty = make_method("isEmpty", "()Z", class_name="java/util/Collection")
+    iterator = make_method("iterator", "()Ljava/util/Iterator;",
+                           class_name="java/util/Collection")
+    remove = make_method("remove", "(Ljava/lang/Object;)Z",
+                         class_name="java/util/Collection")
+    removeAll = make_method("removeAll", "(Ljava/util/Collection;)Z",
+                            class_name="java/util/Collection")
+    retainAll = make_method("retainAll", "(Ljava/util/Collection;)Z",
+                            class_name="java/util/Collection")
+    size = make_method("size", "()I", class_name="java/util/Collection")
+    toArray = make_method(
+        "toArray", "()[Ljava/lang/Object;",
+        fn_post_process=lambda a: get_env().get_object_array_elements(a),
+        class_name="java/util/Collection")
+    toArrayC = make_method("toArray", "([Ljava/lang/Object;)[Ljava/lang/Object;",
+                           class_name="java/util/Collection")
+    
+    def __len__(self):
+        return self.size()
+    
+    def __iter__(self):
+        return iterate_collection(self.o, fn_wrapper = self.fn_wrapper)
+    
+    def __contains__(self, item):
+        return self.contains(item)
+    
+    @staticmethod
+    def is_collection(x):
+        return (hasattr(x, "o") and 
+                is_instance_of(x.o, "java/util/Collection"))
+        
+    def __add__(self, items):
+        klass = call(self.o, "getClass", "()Ljava/lang/Class;")
+        copy = get_collection_wrapper(
+            call(klass, "newInstance", "()Ljava/lang/Object;"),
+            fn_wrapper = self.fn_wrapper)
+        copy.addAll(self.o)
+        if self.is_collection(items):
+            copy.addAll(items.o)
+        else:
+            for item in items:
+                copy.add(item)
+        return copy
+        
+    def __iadd__(self, items):
+        if self.is_collection(items):
+            self.addAll(items)
+        else:
+            for item in items:
+                self.add(item)
+        return self
+
+class ListWrapper(CollectionWrapper):
+    '''A wrapper of ``java.util.List``
+    
+    Use :py:func:`get_collection_wrapper` to make one.
+    '''
+    addI = make_method("add", "(ILjava/lang/Object;)V",
+                       class_name="java/util/List")
+    addAllI = make_method("addAll", "(ILjava/util/Collection;)Z",
+                          class_name="java/util/List")
+    indexOf = make_method("indexOf", "(Ljava/lang/Object;)I",
+                          class_name="java/util/List")
+    lastIndexOf = make_method("lastIndexOf", "(Ljava/lang/Object;)I",
+                              class_name="java/util/List")
+    __removeI = make_method("remove", "(I)Ljava/lang/Object;",
+                            class_name="java/util/List")
+    __get = make_method("get", "(I)Ljava/lang/Object;",
+                        class_name="java/util/List")
+    __set = make_method("set", "(ILjava/lang/Object;)Ljava/lang/Object;",
+                        class_name="java/util/List")
+    __subList = make_method("subList", "(II)Ljava/util/List;",
+                            class_name="java/util/List")
+    
+    def removeI(self, index):
+        return self._wrap(self.__removeI(index))
+    
+    def get(self, index):
+        return self._wrap(self.__get(index))
+    
+    def set(self, index, element):
+        return self._wrap(self.__set(index, element))
+    
+    def subList(self, start, stop):
+        return ListWrapper(self.__subList(start, stop), self.fn_wrapper)
+        
+    def __normalize_idx(self, idx, none_value):
+        if idx is None:
+            return none_value
+        elif idx < 0:
+            return max(0, self.size()+idx)
+        elif idx > self.size():
+            return self.size()
+        return idx
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start = self.__normalize_idx(idx.start, 0)
+            stop = self.__normalize_idx(idx.stop, self.size())
+            if idx.step is None or idx.step == 1:
+                return self.subList(start, stop)
+            return [self[i] for i in range(start, stop, idx.step)]
+        return self.get(self.__normalize_idx(idx, 0))
+    
+    def __setitem__(self, idx, value):
+        self.set(idx, value)
+        
+    def __delitem__(self, idx):
+        self.removeI(idx)
+
 def get_collection_wrapper(collection, fn_wrapper=None):
     '''Return a wrapper of ``java.util.Collection``
     
@@ -1335,102 +1934,9 @@ def get_collection_wrapper(collection, fn_wrapper=None):
             print(d["Foo"])
 
     '''
-    class Collection(object):
-        def __init__(self):
-            self.o = collection
-            
-        add = make_method("add", "(Ljava/lang/Object;)Z")
-        addAll = make_method("addAll", "(Ljava/util/Collection;)Z")
-        clear = make_method("clear", "()V")
-        contains = make_method("contains", "(Ljava/lang/Object;)Z")
-        containsAll = make_method("containsAll", "(Ljava/util/Collection;)Z")
-        isEmpty = make_method("isEmpty", "()Z")
-        iterator = make_method("iterator", "()Ljava/util/Iterator;")
-        remove = make_method("remove", "(Ljava/lang/Object;)Z")
-        removeAll = make_method("removeAll", "(Ljava/util/Collection;)Z")
-        retainAll = make_method("retainAll", "(Ljava/util/Collection;)Z")
-        size = make_method("size", "()I")
-        toArray = make_method(
-            "toArray", "()[Ljava/lang/Object;",
-            fn_post_process=get_env().get_object_array_elements)
-        toArrayC = make_method("toArray", "([Ljava/lang/Object;)[Ljava/lang/Object;")
-        
-        def __len__(self):
-            return self.size()
-        
-        def __iter__(self):
-            return iterate_collection(self.o, fn_wrapper = fn_wrapper)
-        
-        def __contains__(self, item):
-            return self.contains(item)
-        
-        @staticmethod
-        def is_collection(x):
-            return (hasattr(x, "o") and 
-                    is_instance_of(x.o, "java/util/Collection"))
-            
-        def __add__(self, items):
-            klass = call(self.o, "getClass", "()Ljava/lang/Class;")
-            copy = get_collection_wrapper(
-                call(klass, "newInstance", "()Ljava/lang/Object;"),
-                fn_wrapper = fn_wrapper)
-            copy.addAll(self.o)
-            if self.is_collection(items):
-                copy.addAll(items.o)
-            else:
-                for item in items:
-                    copy.add(item)
-            return copy
-            
-        def __iadd__(self, items):
-            if self.is_collection(items):
-                self.addAll(items)
-            else:
-                for item in items:
-                    self.add(item)
-            return self
-        
-        if is_instance_of(collection, 'java/util/List'):
-            addI = make_method("add", "(ILjava/lang/Object;)V")
-            addAllI = make_method("addAll", "(ILjava/util/Collection;)Z")
-            indexOf = make_method("indexOf", "(Ljava/lang/Object;)I")
-            lastIndexOf = make_method("lastIndexOf", "(Ljava/lang/Object;)I")
-            removeI = make_method("remove", "(I)Ljava/lang/Object;", 
-                                  fn_post_process=fn_wrapper)
-            get = make_method("get", "(I)Ljava/lang/Object;", 
-                              fn_post_process=fn_wrapper)
-            set = make_method("set", "(ILjava/lang/Object;)Ljava/lang/Object;",
-                              fn_post_process=fn_wrapper)
-            subList = make_method(
-                "subList",
-                "(II)Ljava/util/List;",
-                fn_post_process=lambda x: get_collection_wrapper(x, fn_wrapper))
-            
-            def __normalize_idx(self, idx, none_value):
-                if idx is None:
-                    return none_value
-                elif idx < 0:
-                    return max(0, self.size()+idx)
-                elif idx > self.size():
-                    return self.size()
-                return idx
-            
-            def __getitem__(self, idx):
-                if isinstance(idx, slice):
-                    start = self.__normalize_idx(idx.start, 0)
-                    stop = self.__normalize_idx(idx.stop, self.size())
-                    if idx.step is None or idx.step == 1:
-                        return self.subList(start, stop)
-                    return [self[i] for i in range(start, stop, idx.step)]
-                return self.get(self.__normalize_idx(idx, 0))
-            
-            def __setitem__(self, idx, value):
-                self.set(idx, value)
-                
-            def __delitem__(self, idx):
-                self.removeI(idx)
-            
-    return Collection()
+    if get_env().is_instance_of(collection, _find_cached_class("java/util/List")):
+        return ListWrapper(collection, fn_wrapper)
+    return CollectionWrapper(collection, fn_wrapper)
 
 array_list_add_method_id = None
 def make_list(elements=[]):
@@ -1472,6 +1978,35 @@ def make_list(elements=[]):
                 raise JavaException(x)
     return a
 
+class DictionaryWrapper(object):
+    '''A wrapper of ``java.util.Dictionary``
+    
+    Use :py:func:`get_dictionary_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
+    size = make_method('size', '()I',
+                       'Returns the number of entries in this dictionary',
+                       class_name="java/util/Dictionary")
+    isEmpty = make_method('isEmpty', '()Z',
+                          'Tests if this dictionary has no entries',
+                          class_name="java/util/Dictionary")
+    keys = make_method('keys', '()Ljava/util/Enumeration;',
+                       'Returns an enumeration of keys in this dictionary',
+                       class_name="java/util/Dictionary")
+    elements = make_method('elements',
+                           '()Ljava/util/Enumeration;',
+                           'Returns an enumeration of elements in this dictionary',
+                           class_name="java/util/Dictionary")
+    get = make_method('get',
+                      '(Ljava/lang/Object;)Ljava/lang/Object;',
+                      'Return the value associated with a key or None if no value',
+                      class_name="java/util/Dictionary")
+    put = make_method('put',
+                      '(Ljava/lang/Object;Ljava/lang/Object;)Ljava/lang/Object;',
+                      'Associate a value with a key in the dictionary',
+                      class_name="java/util/Dictionary")
+
 def get_dictionary_wrapper(dictionary):
     '''Return a wrapper of ``java.util.Dictionary``.
 
@@ -1484,26 +2019,52 @@ def get_dictionary_wrapper(dictionary):
     56
 
     '''
-    env = get_env()
-    class Dictionary(object):
-        def __init__(self):
-            self.o = dictionary
-        size = make_method('size', '()I',
-                           'Returns the number of entries in this dictionary')
-        isEmpty = make_method('isEmpty', '()Z',
-                              'Tests if this dictionary has no entries')
-        keys = make_method('keys', '()Ljava/util/Enumeration;',
-                           'Returns an enumeration of keys in this dictionary')
-        elements = make_method('elements',
-                               '()Ljava/util/Enumeration;',
-                               'Returns an enumeration of elements in this dictionary')
-        get = make_method('get',
-                          '(Ljava/lang/Object;)Ljava/lang/Object;',
-                          'Return the value associated with a key or None if no value')
-        put = make_method('put',
-                          '(Ljava/lang/Object;Ljava/lang/Object;)Ljava/lang/Object;',
-                          'Associate a value with a key in the dictionary')
-    return Dictionary()
+    return DictionaryWrapper(dictionary)
+
+class MapWrapper(object):
+    '''A wrapper of ``java.util.Map``
+    
+    Use :py:func:`get_map_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
+    clear = make_method("clear", "()V", class_name="java/util/Map")
+    containsKey = make_method("containsKey", "(Ljava/lang/Object;)Z",
+                              class_name="java/util/Map")
+    containsValue = make_method("containsValue", "(Ljava/lang/Object;)Z",
+                                class_name="java/util/Map")
+    entrySet = make_method("entrySet", "()Ljava/util/Set;",
+                           class_name="java/util/Map")
+    get = make_method("get", "(Ljava/lang/Object;)Ljava/lang/Object;",
+                      class_name="java/util/Map")
+    isEmpty = make_method("isEmpty", "()Z", class_name="java/util/Map")
+    keySet = make_method("keySet", "()Ljava/util/Set;",
+                         class_name="java/util/Map")
+    put = make_method(
+        "put", "(Ljava/lang/Object;Ljava/lang/Object;)Ljava/lang/Object;",
+        class_name="java/util/Map")
+    putAll = make_method("putAll", "(Ljava/util/Map;)V",
+                         class_name="java/util/Map")
+    remove = make_method("remove", "(Ljava/lang/Object;)Ljava/lang/Object;",
+                         class_name="java/util/Map")
+    size = make_method("size", "()I", class_name="java/util/Map")
+    values = make_method("values", "()Ljava/util/Collection;",
+                         class_name="java/util/Map")
+    
+    def __len__(self):
+        return self.size()
+    
+    def __getitem__(self, key):
+        return self.get(key)
+    
+    def __setitem__(self, key, value):
+        self.put(key, value)
+        
+    def __iter__(self):
+        return iterate_collection(self.keySet())
+    
+    def keys(self):
+        return tuple(iterate_collection(self.keySet()))
 
 def get_map_wrapper(o):
     '''Return a wrapper of ``java.util.Map``
@@ -1518,40 +2079,7 @@ def get_map_wrapper(o):
         > print(d["Foo"])
         Bar
     '''
-    assert is_instance_of(o, 'java/util/Map')
-    class Map(object):
-        def __init__(self):
-            self.o = o
-        clear = make_method("clear", "()V")
-        containsKey = make_method("containsKey", "(Ljava/lang/Object;)Z")
-        containsValue = make_method("containsValue", "(Ljava/lang/Object;)Z")
-        entrySet = make_method("entrySet", "()Ljava/util/Set;")
-        get = make_method("get", "(Ljava/lang/Object;)Ljava/lang/Object;")
-        isEmpty = make_method("isEmpty", "()Z")
-        keySet = make_method("keySet", "()Ljava/util/Set;")
-        put = make_method(
-            "put", "(Ljava/lang/Object;Ljava/lang/Object;)Ljava/lang/Object;")
-        putAll = make_method("putAll", "(Ljava/util/Map;)V")
-        remove = make_method("remove", "(Ljava/lang/Object;)Ljava/lang/Object;")
-        size = make_method("size", "()I")
-        values = make_method("values", "()Ljava/util/Collection;")
-        
-        def __len__(self):
-            return self.size()
-        
-        def __getitem__(self, key):
-            return self.get(key)
-        
-        def __setitem__(self, key, value):
-            self.put(key, value)
-            
-        def __iter__(self):
-            return iterate_collection(self.keySet())
-        
-        def keys(self):
-            return tuple(iterate_collection(self.keySet(self)))
-        
-    return Map()
+    return MapWrapper(o)
 
 def make_map(**kwargs):
     '''Create a wrapped ``java.util.HashMap`` from arbitrary keyword arguments.
@@ -1594,6 +2122,20 @@ def jdictionary_to_string_dictionary(hashtable):
         result[key] = to_string(jhashtable.get(key))
     return result
 
+class EnumerationWrapper(object):
+    '''A wrapper of ``java.util.Enumeration``
+    
+    Use :py:func:`get_enumeration_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
+    hasMoreElements = make_method('hasMoreElements', '()Z',
+                                  'Return true if the enumeration has more elements to retrieve',
+                                  class_name="java/util/Enumeration")
+    nextElement = make_method('nextElement', 
+                              '()Ljava/lang/Object;',
+                              class_name="java/util/Enumeration")
+
 def get_enumeration_wrapper(enumeration):
     '''Return a wrapper of java.util.Enumeration
     
@@ -1610,16 +2152,7 @@ def get_enumeration_wrapper(enumeration):
     Has java.vm.name
 
     '''
-    env = get_env()
-    class Enumeration(object):
-        def __init__(self):
-            '''Call the init method with the JB_Object'''
-            self.o = enumeration
-        hasMoreElements = make_method('hasMoreElements', '()Z',
-                                      'Return true if the enumeration has more elements to retrieve')
-        nextElement = make_method('nextElement', 
-                                  '()Ljava/lang/Object;')
-    return Enumeration()
+    return EnumerationWrapper(enumeration)
 
 iterator_has_next_id = None
 iterator_next_id = None
@@ -1633,7 +2166,7 @@ def iterate_java(iterator, fn_wrapper=None):
     '''
     global iterator_has_next_id, iterator_next_id
     env = get_env()
-    iterator_class = env.find_class("java/util/Iterator")
+    iterator_class = _find_cached_class("java/util/Iterator")
     if not isinstance(iterator, _javabridge.JB_Object):
         raise JavaError("%s is not a Javabridge JB_Object" % repr(iterator))
     if not env.is_instance_of(iterator, iterator_class):
@@ -1714,21 +2247,22 @@ def make_instance(class_name, sig, *args):
 
     '''
     args_sig = split_sig(sig[1:sig.find(')')])
-    klass = get_env().find_class(class_name)
-    jexception = get_env().exception_occurred()
+    env = get_env()
+    klass = env.find_class(class_name)
+    jexception = env.exception_occurred()
     if jexception is not None:
         raise JavaException(jexception)
-    method_id = get_env().get_method_id(klass, '<init>', sig)
-    jexception = get_env().exception_occurred()
+    method_id = env.get_method_id(klass, '<init>', sig)
+    jexception = env.exception_occurred()
     if method_id is None:
         if jexception is None:
             raise JavaError('Could not find constructor '
                             'with signature = "%s' % sig)
         else:
             raise JavaException(jexception)
-    result = get_env().new_object(klass, method_id, 
-                                  *get_nice_args(args, args_sig))
-    jexception = get_env().exception_occurred() 
+    result = env.new_object(klass, method_id, 
+                            *get_nice_args(args, args_sig))
+    jexception = env.exception_occurred() 
     if jexception is not None:
         raise JavaException(jexception)
     return result
@@ -1747,6 +2281,57 @@ def class_for_name(classname, ldr="system"):
                        'Ljava/lang/Class;', 
                        classname, True, ldr)
 
+class ClassWrapper(object):
+    '''A wrapper of ``java.lang.Class``
+    
+    Use :py:func:`get_class_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
+    getAnnotation = make_method('getAnnotation',
+                                '(Ljava/lang/Class;)Ljava/lang/annotation/Annotation;',
+                                "Returns this element's annotation if present",
+                                class_name="java/lang/Class")
+    getAnnotations = make_method('getAnnotations',
+                                 '()[Ljava/lang/annotation/Annotation;',
+                                 class_name="java/lang/Class")
+    getCanonicalName = make_method('getCanonicalName',
+                                   '()Ljava/lang/String;',
+                                   'Returns the canonical name of the class',
+                                   class_name="java/lang/Class")
+    getClasses = make_method('getClasses','()[Ljava/lang/Class;',
+                             'Returns an array containing Class objects representing all the public classes and interfaces that are members of the class represented by this Class object.',
+                             class_name="java/lang/Class")
+    getConstructor = make_method(
+        'getConstructor', 
+        '([Ljava/lang/Class;)Ljava/lang/reflect/Constructor;',
+        'Return a constructor with the given signature',
+        class_name="java/lang/Class")
+    getConstructors = make_method('getConstructors','()[Ljava/lang/reflect/Constructor;',
+                                  class_name="java/lang/Class")
+    getFields = make_method('getFields','()[Ljava/lang/reflect/Field;',
+                            class_name="java/lang/Class")
+    getField = make_method('getField','(Ljava/lang/String;)Ljava/lang/reflect/Field;',
+                           class_name="java/lang/Class")
+    getMethod = make_method('getMethod','(Ljava/lang/String;[Ljava/lang/Class;)Ljava/lang/reflect/Method;',
+                            class_name="java/lang/Class")
+    getMethods = make_method('getMethods','()[Ljava/lang/reflect/Method;',
+                             class_name="java/lang/Class")
+    cast = make_method('cast', '(Ljava/lang/Object;)Ljava/lang/Object;',
+                       'Throw an exception if object is not castable to this class',
+                       class_name="java/lang/Class")
+    isPrimitive = make_method('isPrimitive', '()Z',
+                              'Return True if the class is a primitive such as boolean or int',
+                              class_name="java/lang/Class")
+    newInstance = make_method('newInstance', '()Ljava/lang/Object;',
+                              'Make a new instance of the object with the default constructor',
+                              class_name="java/lang/Class")
+    def __repr__(self):
+        methods = get_env().get_object_array_elements(self.getMethods())
+        return "%s\n%s" % (
+            self.getCanonicalName(), 
+            "\n".join([to_string(x) for x in methods]))
+
 def get_class_wrapper(obj, is_class = False):
     '''Return a wrapper for an object's class (e.g., for
     reflection). The returned wrapper class will have the following
@@ -1784,41 +2369,7 @@ def get_class_wrapper(obj, is_class = False):
         class_object = class_for_name(obj)
     else:
         class_object = call(obj, 'getClass','()Ljava/lang/Class;')
-    class Klass(object):
-        def __init__(self):
-            self.o = class_object
-        getAnnotation = make_method('getAnnotation',
-                                    '(Ljava/lang/Class;)Ljava/lang/annotation/Annotation;',
-                                    "Returns this element's annotation if present")
-        getAnnotations = make_method('getAnnotations',
-                                     '()[Ljava/lang/annotation/Annotation;')
-        getCanonicalName = make_method('getCanonicalName',
-                                       '()Ljava/lang/String;',
-                                       'Returns the canonical name of the class')
-        getClasses = make_method('getClasses','()[Ljava/lang/Class;',
-                                 'Returns an array containing Class objects representing all the public classes and interfaces that are members of the class represented by this Class object.')
-        getConstructor = make_method(
-            'getConstructor', 
-            '([Ljava/lang/Class;)Ljava/lang/reflect/Constructor;',
-            'Return a constructor with the given signature')
-        getConstructors = make_method('getConstructors','()[Ljava/lang/reflect/Constructor;')
-        getFields = make_method('getFields','()[Ljava/lang/reflect/Field;')
-        getField = make_method('getField','(Ljava/lang/String;)Ljava/lang/reflect/Field;')
-        getMethod = make_method('getMethod','(Ljava/lang/String;[Ljava/lang/Class;)Ljava/lang/reflect/Method;')
-        getMethods = make_method('getMethods','()[Ljava/lang/reflect/Method;')
-        cast = make_method('cast', '(Ljava/lang/Object;)Ljava/lang/Object;',
-                           'Throw an exception if object is not castable to this class')
-        isPrimitive = make_method('isPrimitive', '()Z',
-                                  'Return True if the class is a primitive such as boolean or int')
-        newInstance = make_method('newInstance', '()Ljava/lang/Object;',
-                                  'Make a new instance of the object with the default constructor')
-        def __repr__(self):
-            methods = get_env().get_object_array_elements(self.getMethods())
-            return "%s\n%s" % (
-                self.getCanonicalName(), 
-                "\n".join([to_string(x) for x in methods]))
-
-    return Klass()
+    return ClassWrapper(class_object)
 
 MOD_ABSTRACT  = 'ABSTRACT'
 MOD_FINAL = 'FINAL'
@@ -1845,6 +2396,84 @@ def get_modifier_flags(modifier_flags):
             result.append(mod)
     return result
 
+class FieldWrapper(object):
+    '''A wrapper of ``java.lang.reflect.Field``
+    
+    Use :py:func:`get_field_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
+        
+    get = make_method('get', '(Ljava/lang/Object;)Ljava/lang/Object;',
+                      'Returns the value of the field represented by this '
+                      'Field, on the specified object.',
+                      class_name="java/lang/reflect/Field")
+    def getAnnotation(self, annotation_class):
+        """Returns this element's annotation for the specified type
+        
+        annotation_class - find annotations of this class
+        
+        returns the annotation or None if not annotated"""
+        
+        if isinstance(annotation_class, (str, unicode)):
+            annotation_class = class_for_name(annotation_class)
+        return call(self.o, 'getAnnotation', 
+                    '(Ljava/lang/Class;)Ljava/lang/annotation/Annotation;',
+                    annotation_class)
+    
+    getBoolean = make_method('getBoolean', '(Ljava/lang/Object;)Z',
+                             'Read a boolean field from an object',
+                             class_name="java/lang/reflect/Field")
+    getByte = make_method('getByte', '(Ljava/lang/Object;)B',
+                          'Read a byte field from an object',
+                          class_name="java/lang/reflect/Field")
+    getChar = make_method('getChar', '(Ljava/lang/Object;)C',
+                          class_name="java/lang/reflect/Field")
+    getDouble = make_method('getDouble', '(Ljava/lang/Object;)D',
+                            class_name="java/lang/reflect/Field")
+    getFloat = make_method('getFloat', '(Ljava/lang/Object;)F',
+                           class_name="java/lang/reflect/Field")
+    getInt = make_method('getInt', '(Ljava/lang/Object;)I',
+                         class_name="java/lang/reflect/Field")
+    getShort = make_method('getShort', '(Ljava/lang/Object;)S',
+                           class_name="java/lang/reflect/Field")
+    getLong = make_method('getLong', '(Ljava/lang/Object;)J',
+                          class_name="java/lang/reflect/Field")
+    getDeclaredAnnotations = make_method(
+        'getDeclaredAnnotations',
+        '()[Ljava/lang/annotation/Annotation;',
+        class_name="java/lang/reflect/Field")
+    getGenericType = make_method('getGenericType', 
+                                 '()Ljava/lang/reflect/Type;',
+                                 class_name="java/lang/reflect/Field")
+    def getModifiers(self):
+        return get_modifier_flags(call(self.o, 'getModifiers','()I'))
+    getName = make_method('getName', '()Ljava/lang/String;',
+                          class_name="java/lang/reflect/Field")
+    
+    getType = make_method('getType', '()Ljava/lang/Class;',
+                          class_name="java/lang/reflect/Field")
+    set = make_method('set', '(Ljava/lang/Object;Ljava/lang/Object;)V',
+                      class_name="java/lang/reflect/Field")
+    setBoolean = make_method('setBoolean', '(Ljava/lang/Object;Z)V',
+                             'Set a boolean field in an object',
+                             class_name="java/lang/reflect/Field")
+    setByte = make_method('setByte', '(Ljava/lang/Object;B)V',
+                          'Set a byte field in an object',
+                          class_name="java/lang/reflect/Field")
+    setChar = make_method('setChar', '(Ljava/lang/Object;C)V',
+                          class_name="java/lang/reflect/Field")
+    setDouble = make_method('setDouble', '(Ljava/lang/Object;D)V',
+                            class_name="java/lang/reflect/Field")
+    setFloat = make_method('setFloat', '(Ljava/lang/Object;F)V',
+                           class_name="java/lang/reflect/Field")
+    setInt = make_method('setInt', '(Ljava/lang/Object;I)V',
+                         class_name="java/lang/reflect/Field")
+    setShort = make_method('setShort', '(Ljava/lang/Object;S)V',
+                           class_name="java/lang/reflect/Field")
+    setLong = make_method('setLong', '(Ljava/lang/Object;J)V',
+                          class_name="java/lang/reflect/Field")
+
 def get_field_wrapper(field):
     '''
     Return a wrapper for the java.lang.reflect.Field class. The
@@ -1898,58 +2527,29 @@ def get_field_wrapper(field):
        void
 
     '''
-    class Field(object):
-        def __init__(self):
-            self.o = field
-            
-        get = make_method('get', '(Ljava/lang/Object;)Ljava/lang/Object;',
-                          'Returns the value of the field represented by this '
-                          'Field, on the specified object.')
-        def getAnnotation(self, annotation_class):
-            """Returns this element's annotation for the specified type
-            
-            annotation_class - find annotations of this class
-            
-            returns the annotation or None if not annotated"""
-            
-            if isinstance(annotation_class, (str, unicode)):
-                annotation_class = class_for_name(annotation_class)
-            return call(self.o, 'getAnnotation', 
-                        '(Ljava/lang/Class;)Ljava/lang/annotation/Annotation;',
-                        annotation_class)
-        
-        getBoolean = make_method('getBoolean', '(Ljava/lang/Object;)Z',
-                                 'Read a boolean field from an object')
-        getByte = make_method('getByte', '(Ljava/lang/Object;)B',
-                              'Read a byte field from an object')
-        getChar = make_method('getChar', '(Ljava/lang/Object;)C')
-        getDouble = make_method('getDouble', '(Ljava/lang/Object;)D')
-        getFloat = make_method('getFloat', '(Ljava/lang/Object;)F')
-        getInt = make_method('getInt', '(Ljava/lang/Object;)I')
-        getShort = make_method('getShort', '(Ljava/lang/Object;)S')
-        getLong = make_method('getLong', '(Ljava/lang/Object;)J')
-        getDeclaredAnnotations = make_method(
-            'getDeclaredAnnotations',
-            '()[Ljava/lang/annotation/Annotation;')
-        getGenericType = make_method('getGenericType', 
-                                     '()Ljava/lang/reflect/Type;')
-        def getModifiers(self):
-            return get_modifier_flags(call(self.o, 'getModifiers','()I'))
-        getName = make_method('getName', '()Ljava/lang/String;')
+    return FieldWrapper(field)
+
+class ConstructorWrapper(object):
+    '''A wrapper of ``java.lang.reflect.Constructor``
+    
+    Use :py:func:`get_constructor_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
         
-        getType = make_method('getType', '()Ljava/lang/Class;')
-        set = make_method('set', '(Ljava/lang/Object;Ljava/lang/Object;)V')
-        setBoolean = make_method('setBoolean', '(Ljava/lang/Object;Z)V',
-                                 'Set a boolean field in an object')
-        setByte = make_method('setByte', '(Ljava/lang/Object;B)V',
-                              'Set a byte field in an object')
-        setChar = make_method('setChar', '(Ljava/lang/Object;C)V')
-        setDouble = make_method('setDouble', '(Ljava/lang/Object;D)V')
-        setFloat = make_method('setFloat', '(Ljava/lang/Object;F)V')
-        setInt = make_method('setInt', '(Ljava/lang/Object;I)V')
-        setShort = make_method('setShort', '(Ljava/lang/Object;S)V')
-        setLong = make_method('setLong', '(Ljava/lang/Object;J)V')
-    return Field()
+    getParameterTypes = make_method('getParameterTypes',
+                                    '()[Ljava/lang/Class;',
+                                    'Get the types of the constructor parameters',
+                                    class_name="java/lang/reflect/Constructor")
+    getName = make_method('getName', '()Ljava/lang/String;',
+                          class_name="java/lang/reflect/Constructor")
+    newInstance = make_method('newInstance',
+                              '([Ljava/lang/Object;)Ljava/lang/Object;',
+                              class_name="java/lang/reflect/Constructor")
+    getAnnotation = make_method('getAnnotation', 
+                                '()Ljava/lang/annotation/Annotation;')
+    getModifiers = make_method('getModifiers', '()I',
+                               class_name="java/lang/reflect/Constructor")
 
 def get_constructor_wrapper(obj):
     '''
@@ -1968,21 +2568,30 @@ def get_constructor_wrapper(obj):
        Python list of strings indicating the modifier flags
 
     '''
-    class Constructor(object):
-        def __init__(self):
-            self.o = obj
-            
-        getParameterTypes = make_method('getParameterTypes',
-                                        '()[Ljava/lang/Class;',
-                                        'Get the types of the constructor parameters')
-        getName = make_method('getName', '()Ljava/lang/String;')
-        newInstance = make_method('newInstance',
-                                  '([Ljava/lang/Object;)Ljava/lang/Object;')
-        getAnnotation = make_method('getAnnotation', 
-                                    '()Ljava/lang/annotation/Annotation;')
-        getModifiers = make_method('getModifiers', '()I')
-    return Constructor()
+    return ConstructorWrapper(obj)
+
+class MethodWrapper(object):
+    '''A wrapper of ``java.lang.reflect.Method``
+    
+    Use :py:func:`get_method_wrapper` to make one.
+    '''
+    def __init__(self, o):
+        self.o = o
         
+    getParameterTypes = make_method('getParameterTypes',
+                                    '()[Ljava/lang/Class;',
+                                    'Get the types of the constructor parameters',
+                                    class_name="java/lang/reflect/Method")
+    getName = make_method('getName', '()Ljava/lang/String;',
+                          class_name="java/lang/reflect/Method")
+    invoke = make_method('invoke',
+                         '(Ljava/lang/Object;[Ljava/lang/Object;)Ljava/lang/Object;',
+                         class_name="java/lang/reflect/Method")
+    getAnnotation = make_method('getAnnotation', 
+                                '()Ljava/lang/annotation/Annotation;')
+    getModifiers = make_method('getModifiers', '()I',
+                               class_name="java/lang/reflect/Method")
+
 def get_method_wrapper(obj):
     '''
     Get a wrapper for calling methods on the method object. The
@@ -2000,39 +2609,172 @@ def get_method_wrapper(obj):
        Python list of strings indicating the modifier flags
 
     '''
-    class Method(object):
-        def __init__(self):
-            self.o = obj
-            
-        getParameterTypes = make_method('getParameterTypes',
-                                        '()[Ljava/lang/Class;',
-                                        'Get the types of the constructor parameters')
-        getName = make_method('getName', '()Ljava/lang/String;')
-        invoke = make_method('invoke',
-                             '(Ljava/lang/Object;[Ljava/lang/Object;)Ljava/lang/Object;')
-        getAnnotation = make_method('getAnnotation', 
-                                    '()Ljava/lang/annotation/Annotation;')
-        getModifiers = make_method('getModifiers', '()I')
-    return Method()
-        
+    return MethodWrapper(obj)
+
 def make_run_dictionary(jobject):
     '''Support function for Py_RunString - jobject -> globals / locals
     
     jobject_address - address of a Java Map of string to object
     '''
-    result = {}
-    jmap = javabridge.JWrapper(jobject)
-    jentry_set = jmap.entrySet()
-    jentry_set_iterator = jentry_set.iterator()
-    while jentry_set_iterator.hasNext():
-        entry = jentry_set_iterator.next()
-        key, value = [o if not isinstance(o, javabridge.JWrapper) else o.o
-                      for o in (entry.getKey(), entry.getValue())]
-        result[to_string(key)] = value
+    jmap = get_map_wrapper(jobject)
+    return dict([(to_string(key), jmap.get(key)) for key in jmap])
+
+class _RunNamespace(dict):
+    '''A namespace for CPython.exec that falls back to another namespace
+    
+    Names that aren't in the namespace are looked up in the parent
+    namespace or, if there is none, in ``__main__``. Scripts can use
+    the ``__main__`` globals without them being copied for every run.
+    '''
+    def __init__(self, parent=None):
+        dict.__init__(self)
+        self.parent = parent
+        
+    def __missing__(self, key):
+        if self.parent is not None:
+            return self.parent[key]
+        return sys.modules["__main__"].__dict__[key]
+
+def make_run_namespace(jobject, parent=None, convert=False):
+    '''Support function for CPython.exec - jobject -> globals / locals
+    
+    :param jobject: a Java Map of string to object or None
+    :param parent: the namespace to look in for names that aren't in
+                   the map or None to look in ``__main__``
+    :param convert: if True, convert the values using
+                    :py:func:`java_to_python`
+    '''
+    result = _RunNamespace(parent)
+    if jobject is not None:
+        d = make_run_dictionary(jobject)
+        if convert:
+            d = dict([(k, java_to_python(v)) for k, v in d.items()])
+        result.update(d)
     return result
 
-__weakrefdict = weakref.WeakValueDictionary()
-__strongrefdict = {}
+def _unboxer(class_name, method_name, sig):
+    '''Make a function that gets the value of a boxed primitive'''
+    def unbox(env, o):
+        return env.call_method(o, _get_method_id(class_name, method_name, sig))
+    return unbox
+
+def _boxer(class_name, sig):
+    '''Make a function that boxes a value using the class's valueOf'''
+    method_id = []
+    def box(env, value):
+        klass = _find_cached_class(class_name)
+        if len(method_id) == 0:
+            method_id.append(env.get_static_method_id(klass, "valueOf", sig))
+        return env.call_static_method(klass, method_id[0], value)
+    return box
+
+__to_python = {
+    "java.lang.String": lambda env, o: env.get_string_utf(o),
+    "java.lang.Boolean": _unboxer("java/lang/Boolean", "booleanValue", "()Z"),
+    "java.lang.Character": _unboxer("java/lang/Character", "charValue", "()C"),
+    "java.lang.Byte": _unboxer("java/lang/Number", "longValue", "()J"),
+    "java.lang.Short": _unboxer("java/lang/Number", "longValue", "()J"),
+    "java.lang.Integer": _unboxer("java/lang/Number", "longValue", "()J"),
+    "java.lang.Long": _unboxer("java/lang/Number", "longValue", "()J"),
+    "java.lang.Float": _unboxer("java/lang/Number", "doubleValue", "()D"),
+    "java.lang.Double": _unboxer("java/lang/Number", "doubleValue", "()D"),
+    "[Z": lambda env, o: env.get_boolean_array_elements(o),
+    "[B": lambda env, o: env.get_byte_array_elements(o),
+    "[S": lambda env, o: env.get_short_array_elements(o),
+    "[I": lambda env, o: env.get_int_array_elements(o),
+    "[J": lambda env, o: env.get_long_array_elements(o),
+    "[F": lambda env, o: env.get_float_array_elements(o),
+    "[D": lambda env, o: env.get_double_array_elements(o) }
+
+__box_boolean = _boxer("java/lang/Boolean", "(Z)Ljava/lang/Boolean;")
+__box_int = _boxer("java/lang/Integer", "(I)Ljava/lang/Integer;")
+__box_long = _boxer("java/lang/Long", "(J)Ljava/lang/Long;")
+__box_double = _boxer("java/lang/Double", "(D)Ljava/lang/Double;")
+
+__to_java_array = {
+    np.dtype(np.bool_): lambda env, a: env.make_boolean_array(a),
+    np.dtype(np.uint8): lambda env, a: env.make_byte_array(a),
+    np.dtype(np.int8): lambda env, a: env.make_byte_array(a.view(np.uint8)),
+    np.dtype(np.int16): lambda env, a: env.make_short_array(a),
+    np.dtype(np.int32): lambda env, a: env.make_int_array(a),
+    np.dtype(np.int64): lambda env, a: env.make_long_array(a),
+    np.dtype(np.float32): lambda env, a: env.make_float_array(a),
+    np.dtype(np.float64): lambda env, a: env.make_double_array(a) }
+
+def java_to_python(o):
+    '''Support function for CPython.call - convert an argument to Python
+    
+    Strings and boxed primitives become Python strings and numbers and
+    primitive arrays become 1-d NumPy arrays. Other objects are
+    returned as they are.
+    '''
+    if not isinstance(o, _javabridge.JB_Object):
+        return o
+    env = get_env()
+    klass = env.get_object_class(o).as_class_object()
+    class_name = env.get_string_utf(env.call_method(
+        klass, _get_method_id("java/lang/Class", "getName",
+                              "()Ljava/lang/String;")))
+    fn = __to_python.get(class_name)
+    if fn is None:
+        return o
+    return fn(env, o)
+
+def python_to_java(value):
+    '''Support function for CPython.call and eval - convert a result to Java
+    
+    Python strings and numbers become Strings and boxed primitives, with
+    an int that doesn't fit in an Integer becoming a Long. 1-d NumPy
+    arrays of booleans and numbers become primitive arrays.
+    
+    :returns: a JB_Object or None
+    '''
+    if value is None or isinstance(value, _javabridge.JB_Object):
+        return value
+    if hasattr(value, "o"):
+        return value.o
+    env = get_env()
+    if isinstance(value, np.ndarray):
+        fn = __to_java_array.get(value.dtype)
+        if fn is None or value.ndim != 1:
+            raise TypeError("Can't convert a %d-d array of %s to Java" %
+                            (value.ndim, value.dtype))
+        return fn(env, np.ascontiguousarray(value))
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        return __box_boolean(env, value)
+    if isinstance(value, (int, long)):
+        if -2**31 <= value < 2**31:
+            return __box_int(env, value)
+        return __box_long(env, value)
+    if isinstance(value, float):
+        return __box_double(env, value)
+    if isinstance(value, (str, unicode)):
+        return env.new_string_utf(value)
+    raise TypeError("Can't convert %s to Java" % type(value).__name__)
+
+def call_function(module_name, function_name, args):
+    '''Support function for CPython.call - call a Python function
+    
+    :param module_name: the name of the module holding the function
+    :param function_name: the name of the function
+    :param args: the arguments, as a Java object array
+    '''
+    fn = getattr(importlib.import_module(module_name), function_name)
+    if args is None:
+        args = []
+    else:
+        args = [java_to_python(arg)
+                for arg in get_env().get_object_array_elements(args)]
+    return fn(*args)
+
+#
+# jrefs and proxy handlers live in one table, keyed by integer handles.
+# A handle stays valid for as long as its _JRef is alive. jref tokens are
+# the handles as strings so that Java code can hold them in Strings.
+#
+__jrefs = _javabridge.HandleTable()
 
 class _JRef(object):
     '''A reference to some Python value for Java scripting
@@ -2041,6 +2783,8 @@ class _JRef(object):
     might want to maintain and refer to objects and values. This class
     wraps the value so that it can be referred to later.
     '''
+    __slots__ = ("__value", "__weakref__")
+    
     def __init__(self, value):
         self.__value = value
         
@@ -2062,9 +2806,7 @@ def create_jref(value):
               in order to retrieve it later
     '''
     ref = _JRef(value)
-    ref_id = uuid.uuid4().hex
-    __weakrefdict[ref_id] = ref
-    return ref_id, ref
+    return str(__jrefs.add(ref)), ref
 
 def create_and_lock_jref(value):
     '''Create and lock a value in one step
@@ -2086,7 +2828,7 @@ def redeem_jref(ref_id):
     
     :returns: the value
     '''
-    return __weakrefdict[ref_id]()
+    return __jrefs.get(__jref_handle(ref_id))()
 
 def lock_jref(ref_id):
     '''Lock a reference to maintain it across CPython.exec() invocations
@@ -2097,9 +2839,7 @@ def lock_jref(ref_id):
     
     :param ref_id: the ID returned from create_ref
     '''
-    if ref_id not in __strongrefdict:
-        __strongrefdict[ref_id] = []
-    __strongrefdict[ref_id].append(__weakrefdict[ref_id])
+    __jrefs.lock(__jref_handle(ref_id))
     
 def unlock_jref(ref_id):
     '''Unlock a reference locked by lock_jref
@@ -2108,12 +2848,170 @@ def unlock_jref(ref_id):
     
     :param ref_id: the ID used to lock the reference
     '''
-    refs = __strongrefdict[ref_id]
-    if len(refs) == 1:
-        del __strongrefdict[ref_id]
-    else:
-        refs.pop()
+    __jrefs.unlock(__jref_handle(ref_id))
+
+def __jref_handle(ref_id):
+    '''The handle table's handle for a ref_id token'''
+    try:
+        return int(ref_id)
+    except (TypeError, ValueError):
+        raise KeyError(ref_id)
+
+def create_proxy_handle(value):
+    '''Create an integer handle to a Python callable for a Java proxy
+    
+    A ``CPythonInvocationHandler`` constructed with the handle calls
+    ``value(proxy, method, args)`` through ``CPython.invokeProxy()``
+    whenever a method of its proxy is invoked. As with
+    :py:func:`create_jref`, the reference that is returned must be kept
+    for the handle to stay valid.
+    
+    :param value: the callable that handles the proxy's methods
+    
+    :returns: a tuple of an integer handle and a reference that must be
+              maintained in order to invoke the callable later
+    '''
+    ref = _JRef(value)
+    return __jrefs.add(ref), ref
+
+def invoke_proxy(handle, proxy, method, args):
+    '''Support function for CPython.invokeProxy - call a proxy's handler
+    
+    :param handle: the handle returned by :py:func:`create_proxy_handle`
+    :param proxy: the proxy whose method was invoked
+    :param method: the ``java.lang.reflect.Method`` that was invoked
+    :param args: the arguments, as a Java object array
+    
+    :returns: the result, converted to a Java object
+    '''
+    result = __jrefs.get(handle)()(proxy, method, args)
+    return get_nice_arg(result, "Ljava/lang/Object;")
+
+def invoke_handle(handle, *args):
+    '''Support function for Java adapters - call a callable by its handle
+    
+    Java classes such as ``VectorizedDoubleOperator`` call this through
+    ``CPython.call()``, which converts the arguments and result.
+    
+    :param handle: the handle returned by :py:func:`create_proxy_handle`
+    
+    :returns: the result of calling the callable with the arguments
+    '''
+    return __jrefs.get(handle)()(*args)
         
+#
+# Native methods implemented in Python. ctypes makes a C function for
+# each one that converts its arguments and calls the Python function.
+#
+__native_ctypes = dict(
+    Z=ctypes.c_ubyte, B=ctypes.c_byte, C=ctypes.c_ushort, S=ctypes.c_short,
+    I=ctypes.c_int32, J=ctypes.c_int64, F=ctypes.c_float, D=ctypes.c_double)
+__native_arg_converters = {
+    "Ljava/lang/String;": _javabridge.JB_Env.get_string_utf }
+for __sig, __name in (("Z", "boolean"), ("B", "byte"), ("S", "short"),
+                      ("I", "int"), ("J", "long"), ("F", "float"),
+                      ("D", "double")):
+    __native_arg_converters["[" + __sig] = getattr(
+        _javabridge.JB_Env, "get_%s_array_elements" % __name)
+__registered_natives = {}
+__new_capsule = ctypes.pythonapi.PyCapsule_New
+__new_capsule.restype = ctypes.py_object
+__new_capsule.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p]
+
+def __make_native_function(fn, sig):
+    '''Make a C function implementing a native method by calling fn'''
+    arg_sigs = split_sig(sig[1:sig.index(")")])
+    ret_sig = sig[sig.index(")") + 1:]
+    restype = None if ret_sig == "V" else \
+        __native_ctypes.get(ret_sig, ctypes.c_void_p)
+    argtypes = [ctypes.c_void_p, ctypes.c_void_p] + [
+        __native_ctypes.get(arg_sig, ctypes.c_void_p) for arg_sig in arg_sigs]
+    object_args = [(i, __native_arg_converters.get(arg_sig))
+                   for i, arg_sig in enumerate(arg_sigs)
+                   if arg_sig not in __native_ctypes]
+    char_args = [i for i, arg_sig in enumerate(arg_sigs) if arg_sig == "C"]
+    default = None if restype is None else 0
+    
+    def native_function(penv, this, *args):
+        entered = _javabridge.get_thread_local("env") is None
+        if entered:
+            _javabridge.jni_enter(__new_capsule(penv, None, None))
+        try:
+            if object_args or char_args:
+                env = get_env()
+                args = list(args)
+                for i, converter in object_args:
+                    o = env.wrap_local_ref(args[i])
+                    if converter is not None and o is not None:
+                        o = converter(env, o)
+                    args[i] = o
+                for i in char_args:
+                    args[i] = unichr(args[i])
+            result = fn(*args)
+            if ret_sig == "C":
+                return ord(result)
+            if restype is ctypes.c_void_p:
+                return get_env().new_local_ref(get_nice_arg(result, ret_sig))
+            return result
+        except Exception as e:
+            logger.debug("Exception in native method", exc_info=True)
+            get_env().throw_new(_find_cached_class("java/lang/RuntimeException"),
+                                "%s: %s" % (type(e).__name__, e))
+            return default
+        finally:
+            if entered:
+                _javabridge.jni_exit()
+    return ctypes.CFUNCTYPE(restype, *argtypes)(native_function)
+
+def register_natives(class_name, methods):
+    '''Implement a Java class's native methods with Python functions
+    
+    Each native method is bound directly to a C function that converts
+    its arguments and calls the Python function, which costs much less per
+    call than a :py:class:`JProxy`. Primitive arguments are passed as
+    Python numbers (a ``char`` as a one-character string), Strings as
+    Python strings, primitive arrays as NumPy arrays and other objects as
+    JB_Objects. Results are converted using :py:func:`get_nice_arg`. An
+    exception raised by the function is thrown in Java as a
+    ``java.lang.RuntimeException``.
+    
+    >>> javabridge.register_natives("com/example/Kernel", {
+    ...     "apply": ("(DD)D", lambda x, y: x * y)})
+    
+    :param class_name: the class declaring the native methods, with
+                       "/" as the path separator
+    :param methods: a dictionary of method name to a tuple of the
+                    method's signature and the Python function. The
+                    function is called with the method's arguments, but
+                    not with the object or class that it was called on.
+    '''
+    env = get_env()
+    klass = _find_cached_class(class_name)
+    functions = dict([((name, sig), __make_native_function(fn, sig))
+                      for name, (sig, fn) in methods.items()])
+    natives = [(name, sig, ctypes.cast(function, ctypes.c_void_p).value)
+               for (name, sig), function in functions.items()]
+    if not env.register_natives(klass, natives):
+        jexception = env.exception_occurred()
+        if jexception is not None:
+            raise JavaException(jexception)
+        raise JavaError("Failed to register natives for %s" % class_name)
+    #
+    # The C functions must outlive the registration.
+    #
+    __registered_natives.setdefault(class_name, {}).update(functions)
+
+def unregister_natives(class_name):
+    '''Unbind the native methods bound using :py:func:`register_natives`
+    
+    Calling one of the class's native methods afterwards raises
+    ``UnsatisfiedLinkError`` unless a library implementing it is loaded.
+    
+    :param class_name: the class, with "/" as the path separator
+    '''
+    get_env().unregister_natives(_find_cached_class(class_name))
+    __registered_natives.pop(class_name, None)
+
 if __name__=="__main__":
     import wx
     app = wx.PySimpleApp(False)
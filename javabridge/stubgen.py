@@ -0,0 +1,573 @@
+# -*- Encoding: utf-8 -*-
+'''stubgen.py - generate Python bindings for Java classes ahead of time
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+JWrapper and JClassWrapper discover a class's methods by reflection each
+time a class is first wrapped in a process. This module does the
+reflection once, ahead of time, and writes a Python module per Java
+package with a class per Java class. The generated classes carry the
+JNI signatures of every overload, so at run time they make no
+reflection calls; method IDs are looked up the first time they are used.
+A .pyi stub with type annotations is written next to each module::
+
+    python -m javabridge.stubgen java.util.ArrayList java.lang.Integer -o mypkg
+
+    import javabridge, mypkg.java_util
+    javabridge.start_vm()
+    a = mypkg.java_util.ArrayList()
+    a.add("Hello")
+
+'''
+
+from __future__ import print_function
+
+import argparse
+import keyword
+import os
+import threading
+import zipfile
+
+import numpy as np
+import javabridge as J
+from .jutil import split_sig
+from .wrappers import _type_key
+
+try:
+    basestring            # Python 2
+except NameError:
+    basestring = (str, )  # Python 3
+
+#
+# Runtime support for the generated bindings
+#
+
+#
+# Generated classes by the JNI name of their Java class. Results whose
+# declared type is a generated class are wrapped in it.
+#
+_classes = {}
+
+def register(cls):
+    '''Register a generated class so that results of its type are wrapped'''
+    _classes[cls._class_name] = cls
+    return cls
+
+_jclasses = {}
+_jclasses_lock = threading.Lock()
+
+def _find_class(class_name):
+    '''Return the JB_Class for a class name or array signature, cached'''
+    klass = _jclasses.get(class_name)
+    if klass is None:
+        env = J.get_env()
+        klass = env.find_class(class_name)
+        if klass is None:
+            jexception = env.exception_occurred()
+            if jexception is not None:
+                raise J.JavaException(jexception)
+            raise J.JavaError("Could not find class %s" % class_name)
+        with _jclasses_lock:
+            klass = _jclasses.setdefault(class_name, klass)
+    return klass
+
+class JavaObject(object):
+    '''Base class of the generated bindings
+
+    ``self.o`` is the wrapped Java object.
+    '''
+    __slots__ = ("o", )
+    _class_name = "java/lang/Object"
+
+    def __init__(self, *args):
+        raise TypeError("%s has no public constructor. Use from_java to "
+                        "wrap an existing object" % type(self).__name__)
+
+    @classmethod
+    def from_java(cls, o):
+        '''Wrap an existing Java object without calling a constructor'''
+        self = cls.__new__(cls)
+        self.o = o
+        return self
+
+    def __str__(self):
+        return J.to_string(self.o)
+
+    def __repr__(self):
+        return "<%s %s>" % (type(self).__name__, J.to_string(self.o))
+
+_NICE_SIGS = {
+    "Ljava/lang/CharSequence;": "Ljava/lang/String;" }
+
+_INT_SIGS = set("BSIJFD") | set(["Ljava/lang/Integer;", "Ljava/lang/Object;"])
+_FLOAT_SIGS = set("FD") | set(["Ljava/lang/Object;"])
+_BOOL_SIGS = set("Z") | set(["Ljava/lang/Boolean;", "Ljava/lang/Object;"])
+_STRING_SIGS = set(["Ljava/lang/String;", "Ljava/lang/CharSequence;",
+                    "Ljava/lang/Object;"])
+
+def _accepts(arg, sig):
+    '''Return True if arg can be passed as an argument with signature sig'''
+    is_object = sig[0] in "L["
+    if arg is None:
+        return is_object
+    if isinstance(arg, J.JB_Object) or hasattr(arg, "o"):
+        arg = getattr(arg, "o", arg)
+        if not isinstance(arg, J.JB_Object) or not is_object:
+            return False
+        lookup = sig[1:-1] if sig[0] == "L" else sig
+        return J.get_env().is_instance_of(arg, _find_class(lookup))
+    if isinstance(arg, bool):
+        return sig in _BOOL_SIGS
+    if isinstance(arg, (int, np.integer)) and not isinstance(arg, np.bool_):
+        return sig in _INT_SIGS
+    if isinstance(arg, (float, np.floating)):
+        return sig in _FLOAT_SIGS
+    if isinstance(arg, basestring):
+        if sig == "C":
+            return len(arg) == 1
+        return sig in _STRING_SIGS
+    if sig[0] == "[" and not np.isscalar(arg):
+        if isinstance(arg, np.ndarray) and len(sig) == 2:
+            return True
+        return len(arg) == 0 or _accepts(arg[0], sig[1:])
+    return False
+
+class _Signature(object):
+    '''One overload: its signature and, once looked up, its method ID'''
+    def __init__(self, sig, is_var_args):
+        self.sig = sig
+        self.arg_sigs = split_sig(sig[1:sig.find(")")])
+        self.nice_sigs = [_NICE_SIGS.get(s, s) for s in self.arg_sigs]
+        self.ret_sig = sig[sig.find(")")+1:]
+        self.is_var_args = is_var_args
+        self.method_id = None
+
+    def match_args(self, args):
+        '''Return the args packed for this overload or None if they don't fit'''
+        nparams = len(self.arg_sigs)
+        if self.is_var_args:
+            if len(args) < nparams - 1:
+                return None
+            args = list(args[:nparams-1]) + [list(args[nparams-1:])]
+        elif len(args) != nparams:
+            return None
+        for arg, sig in zip(args, self.arg_sigs):
+            if not _accepts(arg, sig):
+                return None
+        return args
+
+class _Overloads(object):
+    '''The overloads of a method or constructor
+
+    The overload chosen for a tuple of argument types is remembered, as
+    in JWrapper.
+    '''
+    def __init__(self, class_name, name, signatures, is_static):
+        self.class_name = class_name
+        self.name = name
+        self.is_static = is_static
+        self.signatures = [_Signature(sig, is_var_args)
+                           for sig, is_var_args in signatures]
+        self.table = {}
+
+    def resolve(self, args):
+        '''Return the chosen _Signature and the Java arguments for a call'''
+        key = _type_key(args)
+        signature = self.table.get(key) if key is not None else None
+        packed = None
+        if signature is not None:
+            packed = signature.match_args(args)
+        if packed is None:
+            for signature in self.signatures:
+                packed = signature.match_args(args)
+                if packed is not None:
+                    if key is not None:
+                        self.table.setdefault(key, signature)
+                    break
+            else:
+                raise TypeError("No matching overload found for %s.%s" %
+                                (self.class_name.replace("/", "."), self.name))
+        if signature.method_id is None:
+            env = J.get_env()
+            klass = _find_class(self.class_name)
+            if self.is_static:
+                method_id = env.get_static_method_id(
+                    klass, self.name, signature.sig)
+            else:
+                method_id = env.get_method_id(klass, self.name, signature.sig)
+            if method_id is None:
+                jexception = env.exception_occurred()
+                if jexception is not None:
+                    raise J.JavaException(jexception)
+                raise J.JavaError('Could not find method name = "%s" '
+                                  'with signature = "%s"' %
+                                  (self.name, signature.sig))
+            signature.method_id = method_id
+        return signature, [_convert_arg(arg, sig) for arg, sig in 
+                           zip(packed, signature.nice_sigs)]
+
+_ARRAY_DTYPES = {
+    "[Z": np.bool_, "[B": np.uint8, "[S": np.int16, "[I": np.int32,
+    "[J": np.int64, "[F": np.float32, "[D": np.float64 }
+
+def _convert_arg(arg, sig):
+    '''Convert an argument that _accepts matched to its Java value'''
+    if sig in _ARRAY_DTYPES and arg is not None and \
+       not isinstance(arg, (J.JB_Object, np.ndarray)) and not hasattr(arg, "o"):
+        arg = np.array(arg, _ARRAY_DTYPES[sig])
+    return J.get_nice_arg(arg, sig)
+
+def _nice_result(result, sig):
+    '''Convert a result, wrapping objects of generated classes'''
+    result = J.get_nice_result(result, sig)
+    if isinstance(result, J.JB_Object) and sig[0] == "L":
+        cls = _classes.get(sig[1:-1])
+        if cls is not None:
+            result = cls.from_java(result)
+    return result
+
+def _check_exception(env):
+    jexception = env.exception_occurred()
+    if jexception is not None:
+        raise J.JavaException(jexception)
+
+def method(class_name, name, signatures, doc=None):
+    '''Make an instance method of a generated class
+
+    :param class_name: the class name in slash form
+    :param name: the Java method name
+    :param signatures: a sequence of (signature, is_var_args) per overload
+    :param doc: the method's docstring
+    '''
+    overloads = _Overloads(class_name, name, signatures, False)
+    def fn(self, *args):
+        signature, jargs = overloads.resolve(args)
+        env = J.get_env()
+        result = env.call_method(self.o, signature.method_id, *jargs)
+        _check_exception(env)
+        return _nice_result(result, signature.ret_sig)
+    fn.__name__ = str(name)
+    fn.__doc__ = doc
+    return fn
+
+def static_method(class_name, name, signatures, doc=None):
+    '''Make a static method of a generated class
+
+    The arguments are the same as for :py:func:`method`.
+    '''
+    overloads = _Overloads(class_name, name, signatures, True)
+    def fn(*args):
+        signature, jargs = overloads.resolve(args)
+        env = J.get_env()
+        result = env.call_static_method(
+            _find_class(class_name), signature.method_id, *jargs)
+        _check_exception(env)
+        return _nice_result(result, signature.ret_sig)
+    fn.__name__ = str(name)
+    fn.__doc__ = doc
+    return staticmethod(fn)
+
+def constructor(class_name, signatures, doc=None):
+    '''Make the __init__ method of a generated class
+
+    :param class_name: the class name in slash form
+    :param signatures: a sequence of (signature, is_var_args) per overload
+    :param doc: the constructor's docstring
+    '''
+    overloads = _Overloads(class_name, "<init>", signatures, False)
+    def __init__(self, *args):
+        signature, jargs = overloads.resolve(args)
+        env = J.get_env()
+        self.o = env.new_object(
+            _find_class(class_name), signature.method_id, *jargs)
+        _check_exception(env)
+    __init__.__doc__ = doc
+    return __init__
+
+class field(object):
+    '''A descriptor for a public field of a generated class
+
+    Static fields can be read from the class or an instance. Use
+    javabridge.set_static_field to set a static field.
+    '''
+    def __init__(self, class_name, name, sig, is_static):
+        self.class_name = class_name
+        self.name = name
+        self.sig = sig
+        self.is_static = is_static
+
+    def __get__(self, instance, owner):
+        if self.is_static:
+            result = J.get_static_field(self.class_name, self.name, self.sig)
+        elif instance is None:
+            return self
+        else:
+            result = J.get_field(instance.o, self.name, self.sig)
+        return _nice_result(result, self.sig)
+
+    def __set__(self, instance, value):
+        if self.is_static:
+            J.set_static_field(self.class_name, self.name, self.sig, value)
+        else:
+            J.set_field(instance.o, self.name, self.sig, value)
+
+#
+# The generator
+#
+
+_STATIC = 0x0008
+_ABSTRACT = 0x0400
+_PUBLIC = 0x0001
+
+def _python_name(name):
+    '''Return a legal Python attribute name for a Java member name'''
+    if keyword.iskeyword(name) or name in ("o", "from_java"):
+        return name + "_"
+    return name
+
+def module_name(class_name):
+    '''Return the name of the module generated for a class's package
+
+    :param class_name: the class name in dotted form
+    '''
+    package = class_name.rsplit(".", 1)[0] if "." in class_name else "default"
+    return package.replace(".", "_")
+
+def reflect_class(class_name):
+    '''Describe a class's public constructors, methods and fields
+
+    :param class_name: the class name in dotted form
+
+    :returns: a dictionary with keys, "name" (slash form), "python_name",
+              "constructors" (a list of (sig, is_var_args)),
+              "methods" and "static_methods" (dictionaries of method name
+              to a list of (sig, is_var_args)) and "fields" (a list of
+              (name, sig, is_static)).
+    '''
+    from .wrappers import sig
+    env = J.get_env()
+    jclass = J.class_for_name(class_name)
+    klass = J.get_class_wrapper(jclass, True)
+    jni_name = class_name.replace(".", "/")
+    description = dict(
+        name=jni_name,
+        python_name=jni_name.rsplit("/", 1)[-1].replace("$", "_"),
+        constructors=[], methods={}, static_methods={}, fields=[])
+    def signature(params, return_type):
+        return "(%s)%s" % ("".join([sig(p) for p in params]),
+                           "V" if return_type is None else sig(return_type))
+    modifiers = J.call(jclass, "getModifiers", "()I")
+    if not (J.call(jclass, "isInterface", "()Z") or (modifiers & _ABSTRACT)):
+        for jconstructor in env.get_object_array_elements(
+            klass.getConstructors()):
+            constructor = J.get_constructor_wrapper(jconstructor)
+            description["constructors"].append((
+                signature(env.get_object_array_elements(
+                    constructor.getParameterTypes()), None),
+                bool(J.call(jconstructor, "isVarArgs", "()Z"))))
+    for jmethod in env.get_object_array_elements(klass.getMethods()):
+        if J.call(jmethod, "isBridge", "()Z") or \
+           J.call(jmethod, "isSynthetic", "()Z"):
+            continue
+        method = J.get_method_wrapper(jmethod)
+        if method.getModifiers() & _STATIC:
+            methods = description["static_methods"]
+        else:
+            methods = description["methods"]
+        msig = signature(
+            env.get_object_array_elements(method.getParameterTypes()),
+            J.call(jmethod, "getReturnType", "()Ljava/lang/Class;"))
+        overloads = methods.setdefault(method.getName(), [])
+        if msig not in [s for s, is_var_args in overloads]:
+            overloads.append(
+                (msig, bool(J.call(jmethod, "isVarArgs", "()Z"))))
+    for jfield in env.get_object_array_elements(klass.getFields()):
+        field = J.get_field_wrapper(jfield)
+        description["fields"].append((
+            field.getName(), sig(field.getType()),
+            bool(J.call(jfield, "getModifiers", "()I") & _STATIC)))
+    return description
+
+def _format_signatures(signatures):
+    return "(%s)" % "".join(["(%r, %r), " % (s, bool(v))
+                             for s, v in signatures])
+
+def _format_doc(name, signatures):
+    return "\n".join(["%s%s" % (name, s) for s, is_var_args in signatures])
+
+def generate_module(descriptions):
+    '''Return the source of a module of bindings for the given classes
+
+    :param descriptions: class descriptions from :py:func:`reflect_class`
+    '''
+    lines = [
+        "# Generated by javabridge.stubgen - do not edit",
+        "import javabridge.stubgen as _stubgen",
+        "",
+        "__all__ = [%s]" % ", ".join(
+            [repr(str(d["python_name"])) for d in descriptions]),
+        ""]
+    for d in descriptions:
+        name = d["name"]
+        lines += ["", "class %s(_stubgen.JavaObject):" % d["python_name"],
+                  "    '''Binding for %s'''" % name.replace("/", "."),
+                  "    __slots__ = ()",
+                  "    _class_name = %r" % name]
+        if len(d["constructors"]) > 0:
+            lines.append("    __init__ = _stubgen.constructor(%r, %s, %r)" % (
+                name, _format_signatures(d["constructors"]),
+                _format_doc("<init>", d["constructors"])))
+        for kind, members in (("method", d["methods"]),
+                              ("static_method", d["static_methods"])):
+            for method_name in sorted(members):
+                signatures = members[method_name]
+                lines.append("    %s = _stubgen.%s(%r, %r, %s, %r)" % (
+                    _python_name(method_name), kind, name, method_name,
+                    _format_signatures(signatures),
+                    _format_doc(method_name, signatures)))
+        for field_name, field_sig, is_static in d["fields"]:
+            lines.append("    %s = _stubgen.field(%r, %r, %r, %r)" % (
+                _python_name(field_name), name, field_name, field_sig,
+                is_static))
+        lines += ["", "_stubgen.register(%s)" % d["python_name"]]
+    return "\n".join(lines) + "\n"
+
+_PYTHON_TYPES = dict(
+    Z="bool", B="int", S="int", I="int", J="int", F="float", D="float",
+    C="str", V="None")
+
+def _python_type(sig, local_classes):
+    '''Return the annotation for a JNI type signature
+
+    :param sig: the type's signature
+    :param local_classes: a dictionary of JNI class name to Python class
+                          name of the classes generated in the module
+    '''
+    if sig in _PYTHON_TYPES:
+        return _PYTHON_TYPES[sig]
+    if sig == "Ljava/lang/String;":
+        return "str"
+    if sig == "Ljava/lang/Object;":
+        return "Any"
+    if sig[0] == "L" and sig[1:-1] in local_classes:
+        return local_classes[sig[1:-1]]
+    if sig == "[B":
+        return "numpy.ndarray"
+    return "JB_Object"
+
+def generate_stub(descriptions):
+    '''Return the source of the .pyi type stub for a generated module
+
+    :param descriptions: class descriptions from :py:func:`reflect_class`
+    '''
+    local_classes = dict([(d["name"], d["python_name"]) for d in descriptions])
+    def arguments(sig, first):
+        arg_sigs = split_sig(sig[1:sig.find(")")])
+        return ", ".join([first] + [
+            "arg%d: %s" % (i, _python_type(s, local_classes))
+            for i, s in enumerate(arg_sigs)])
+    def returns(sig):
+        return _python_type(sig[sig.find(")")+1:], local_classes)
+    lines = [
+        "# Generated by javabridge.stubgen - do not edit",
+        "from typing import Any, overload",
+        "import numpy",
+        "from javabridge import JB_Object",
+        "from javabridge.stubgen import JavaObject",
+        ""]
+    for d in descriptions:
+        lines += ["", "class %s(JavaObject):" % d["python_name"]]
+        for field_name, field_sig, is_static in d["fields"]:
+            lines.append("    %s: %s" % (_python_name(field_name),
+                                         _python_type(field_sig, local_classes)))
+        members = [("__init__", "self", d["constructors"], False)]
+        members += [(_python_name(name), "self", d["methods"][name], False)
+                    for name in sorted(d["methods"])]
+        members += [(_python_name(name), "", d["static_methods"][name], True)
+                    for name in sorted(d["static_methods"])]
+        for name, first, signatures, is_static in members:
+            for sig, is_var_args in signatures:
+                if len(signatures) > 1:
+                    lines.append("    @overload")
+                if is_static:
+                    lines.append("    @staticmethod")
+                ret = "None" if name == "__init__" else returns(sig)
+                lines.append("    def %s(%s) -> %s: ..." % (
+                    name, arguments(sig, first).lstrip(", "), ret))
+        if len(lines) and lines[-1].startswith("class"):
+            lines.append("    ...")
+    return "\n".join(lines) + "\n"
+
+def list_jar_classes(path):
+    '''List the names of the top-level classes in a jar in dotted form'''
+    with zipfile.ZipFile(path) as jar:
+        return sorted([
+            name[:-len(".class")].replace("/", ".")
+            for name in jar.namelist()
+            if name.endswith(".class") and "$" not in name and
+            not name.endswith("module-info.class") and
+            not name.endswith("package-info.class")])
+
+def generate(class_names, output_dir):
+    '''Generate bindings for classes
+
+    The VM must be running and the classes must be on its class path.
+    A module and a .pyi stub are written to the output directory for each
+    Java package, named as by :py:func:`module_name`.
+
+    :param class_names: the classes to generate, in dotted form
+    :param output_dir: the directory for the generated package
+
+    :returns: the names of the modules written.
+    '''
+    packages = {}
+    for class_name in class_names:
+        modifiers = J.call(J.class_for_name(class_name), "getModifiers", "()I")
+        if not (modifiers & _PUBLIC):
+            continue
+        packages.setdefault(module_name(class_name), []).append(
+            reflect_class(class_name))
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    init_path = os.path.join(output_dir, "__init__.py")
+    if not os.path.exists(init_path):
+        with open(init_path, "w") as fd:
+            fd.write("# Generated by javabridge.stubgen\n")
+    for name, descriptions in packages.items():
+        with open(os.path.join(output_dir, name + ".py"), "w") as fd:
+            fd.write(generate_module(descriptions))
+        with open(os.path.join(output_dir, name + ".pyi"), "w") as fd:
+            fd.write(generate_stub(descriptions))
+    return sorted(packages)
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m javabridge.stubgen",
+        description="Generate Python bindings for Java classes")
+    parser.add_argument("classes", nargs="*",
+                        help="classes to generate, e.g. java.util.ArrayList")
+    parser.add_argument("-o", "--output", default=".",
+                        help="directory for the generated package")
+    parser.add_argument("--jar", action="append", default=[],
+                        help="generate every public class in this jar, which "
+                        "is added to the class path")
+    options = parser.parse_args(args)
+    class_names = list(options.classes)
+    for jar in options.jar:
+        class_names += list_jar_classes(jar)
+    if len(class_names) == 0:
+        parser.error("No classes to generate")
+    J.start_vm(class_path=J.JARS + options.jar, run_headless=True)
+    try:
+        for name in generate(class_names, options.output):
+            print(os.path.join(options.output, name + ".py"))
+    finally:
+        J.kill_vm()
+
+if __name__ == "__main__":
+    main()
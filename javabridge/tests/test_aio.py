@@ -0,0 +1,98 @@
+'''test_aio.py - test asyncio support
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+'''
+import asyncio
+import unittest
+import javabridge
+import javabridge.aio
+
+class TestAIO(unittest.TestCase):
+    def setUp(self):
+        self.env = javabridge.attach()
+
+    def tearDown(self):
+        javabridge.detach()
+
+    def run_coroutine(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_01_01_call(self):
+        jstring = self.env.new_string_utf("Hello, world")
+        result = self.run_coroutine(
+            javabridge.aio.call(jstring, "length", "()I"))
+        self.assertEqual(result, 12)
+
+    def test_01_02_static_call(self):
+        result = self.run_coroutine(javabridge.aio.static_call(
+            "java/lang/String", "valueOf", "(I)Ljava/lang/String;", 123))
+        self.assertEqual(result, "123")
+
+    def test_01_03_call_exception(self):
+        coroutine = javabridge.aio.static_call(
+            "java/lang/Integer", "parseInt", "(Ljava/lang/String;)I", "foo")
+        self.assertRaises(javabridge.JavaException,
+                          self.run_coroutine, coroutine)
+
+    def test_02_01_wrap_completed_future(self):
+        jfuture = javabridge.static_call(
+            "java/util/concurrent/CompletableFuture", "completedFuture",
+            "(Ljava/lang/Object;)Ljava/util/concurrent/CompletableFuture;",
+            "foo")
+        async def fn():
+            return await javabridge.aio.wrap_future(
+                jfuture, fn_post_process=javabridge.to_string)
+        self.assertEqual(self.run_coroutine(fn()), "foo")
+
+    def test_02_02_wrap_future_completed_later(self):
+        jfuture = javabridge.make_instance(
+            "java/util/concurrent/CompletableFuture", "()V")
+        async def fn():
+            future = javabridge.aio.wrap_future(jfuture)
+            self.assertFalse(future.done())
+            await javabridge.aio.call(
+                jfuture, "complete", "(Ljava/lang/Object;)Z",
+                javabridge.make_instance("java/lang/Integer", "(I)V", 42))
+            return await future
+        result = self.run_coroutine(fn())
+        self.assertEqual(javabridge.call(result, "intValue", "()I"), 42)
+
+    def test_02_03_wrap_future_exception(self):
+        jfuture = javabridge.make_instance(
+            "java/util/concurrent/CompletableFuture", "()V")
+        jexception = javabridge.make_instance(
+            "java/lang/IllegalStateException", "(Ljava/lang/String;)V",
+            "bar")
+        async def fn():
+            future = javabridge.aio.wrap_future(jfuture)
+            await javabridge.aio.call(
+                jfuture, "completeExceptionally", "(Ljava/lang/Throwable;)Z",
+                jexception)
+            return await future
+        with self.assertRaises(javabridge.JavaException) as cm:
+            self.run_coroutine(fn())
+        self.assertEqual(str(cm.exception), "bar")
+
+    def test_02_04_wrap_future_task(self):
+        callable = javabridge.run_script(
+            "new java.util.concurrent.Callable() { call: function() { return 'baz'; }};")
+        jfuture = javabridge.make_future_task(callable)
+        async def fn():
+            future = javabridge.aio.wrap_future(
+                jfuture, fn_post_process=javabridge.to_string)
+            await javabridge.aio.call(jfuture.o, "run", "()V")
+            return await future
+        self.assertEqual(self.run_coroutine(fn()), "baz")
+
+if __name__=="__main__":
+    unittest.main()
@@ -8,7 +8,9 @@ Copyright (c) 2009-2013 Broad Institute
 All rights reserved.
 
 '''
+import time
 import unittest
+import numpy as np
 import javabridge
 
 class TestCPython(unittest.TestCase):
@@ -69,4 +71,183 @@ def fn():
     javabridge.call(answer, "add", "(Ljava/lang/Object;)Z", str(result))
 fn()
 """, jglobals.o, jglobals.o)
-        self.assertEqual(float(javabridge.to_string(jref.get(0))), 3)
\ No newline at end of file
+        self.assertEqual(float(javabridge.to_string(jref.get(0))), 3)
+    def test_01_05_exec_repeated(self):
+        code = """
+import javabridge
+javabridge.call(answer, "add", "(Ljava/lang/Object;)Z", str(int(value) * 2))
+"""
+        jref = javabridge.JClassWrapper('java.util.ArrayList')()
+        for value in ("1", "2", "3"):
+            jlocals = javabridge.JClassWrapper('java.util.HashMap')()
+            jlocals.put("value", value)
+            jlocals.put("answer", jref.o)
+            self.cpython.execute(code, jlocals.o, None)
+        self.assertEqual([javabridge.to_string(x) for x in jref],
+                         ["2", "4", "6"])
+
+    def test_01_06_compile(self):
+        handle = self.cpython.compile("""
+import javabridge
+javabridge.call(answer, "add", "(Ljava/lang/Object;)Z", str(int(value) + 1))
+""")
+        jref = javabridge.JClassWrapper('java.util.ArrayList')()
+        for value in ("1", "2"):
+            jlocals = javabridge.JClassWrapper('java.util.HashMap')()
+            jlocals.put("value", value)
+            jlocals.put("answer", jref.o)
+            self.cpython.execute(handle, jlocals.o, None)
+        self.assertEqual([javabridge.to_string(x) for x in jref], ["2", "3"])
+        self.cpython.releaseCode(handle)
+        self.assertRaises(javabridge.JavaException,
+                          self.cpython.execute, handle)
+
+    def test_01_07_compile_error(self):
+        self.assertRaises(javabridge.JavaException,
+                          self.cpython.compile, "def fn(:")
+
+    def test_01_08_main_globals(self):
+        import __main__
+        __main__.test_01_08_value = "main"
+        try:
+            code = """
+import javabridge
+def fn():
+    return test_01_08_value
+javabridge.call(answer, "add", "(Ljava/lang/Object;)Z", fn())
+"""
+            jref = javabridge.JClassWrapper('java.util.ArrayList')()
+            jlocals = javabridge.JClassWrapper('java.util.HashMap')()
+            jlocals.put("answer", jref.o)
+            self.cpython.execute(code, jlocals.o, None)
+            jglobals = javabridge.JClassWrapper('java.util.HashMap')()
+            jglobals.put("test_01_08_value", "java")
+            self.cpython.execute(code, jlocals.o, jglobals.o)
+            self.assertEqual([javabridge.to_string(x) for x in jref],
+                             ["main", "java"])
+            self.assertFalse(hasattr(__main__, "fn"))
+        finally:
+            del __main__.test_01_08_value
+
+    def test_02_01_call(self):
+        result = self.cpython.call("math", "sqrt", 16.0)
+        self.assertEqual(javabridge.to_string(result), "4.0")
+        result = self.cpython.call("operator", "add", 1, 2)
+        self.assertTrue(javabridge.is_instance_of(
+            result.o, "java/lang/Integer"))
+        self.assertEqual(javabridge.to_string(result), "3")
+        result = self.cpython.call("operator", "mul", 2**16, 2**16)
+        self.assertEqual(javabridge.to_string(result), str(2**32))
+        result = self.cpython.call("operator", "add", "Hello, ", "world")
+        self.assertEqual(result, "Hello, world")
+
+    def test_02_02_call_arrays(self):
+        env = javabridge.get_env()
+        a = env.make_double_array(np.array([1.5, 2.5, 3.0]))
+        result = self.cpython.call("numpy", "sum", a)
+        self.assertEqual(javabridge.to_string(result), "7.0")
+        result = self.cpython.call("numpy", "cumsum", a)
+        np.testing.assert_array_equal(
+            env.get_double_array_elements(result.o), [1.5, 4.0, 7.0])
+        b = env.make_int_array(np.array([1, 2, 3], np.int32))
+        result = self.cpython.call("numpy", "multiply", b, b)
+        np.testing.assert_array_equal(
+            env.get_int_array_elements(result.o), [1, 4, 9])
+
+    def test_02_03_call_exception(self):
+        self.assertRaises(javabridge.JavaException,
+                          self.cpython.call, "math", "sqrt", "not a number")
+
+    def test_02_04_eval(self):
+        jlocals = javabridge.JClassWrapper('java.util.HashMap')()
+        jlocals.put("x", 3)
+        result = self.cpython.eval("x * 2 + 1", jlocals.o)
+        self.assertEqual(javabridge.to_string(result), "7")
+        self.assertEqual(self.cpython.eval("'a' * 3"), "aaa")
+        self.assertIsNone(self.cpython.eval("None"))
+
+    def get_statistics(self):
+        stats = javabridge.JClassWrapper(
+            "org.cellprofiler.javabridge.CPython").getStatistics()
+        return dict([(key, int(stats.get(key))) for key in stats.keySet()])
+
+    def test_03_01_statistics(self):
+        before = self.get_statistics()
+        for _ in range(3):
+            self.cpython.execute("pass")
+        after = self.get_statistics()
+        self.assertEqual(after["calls"] - before["calls"], 3)
+        self.assertGreaterEqual(after["gilWaitNanos"], before["gilWaitNanos"])
+        self.assertGreaterEqual(after["gilWaitNanos"], after["maxGILWaitNanos"])
+
+    def test_03_02_persistent_thread_states(self):
+        executor = javabridge.JClassWrapper(
+            "java.util.concurrent.Executors").newSingleThreadExecutor()
+        proxy = javabridge.JProxy("java.util.concurrent.Callable",
+                                  dict(call=lambda: "done"))
+        try:
+            before = self.get_statistics()
+            for _ in range(5):
+                self.assertEqual(executor.submit(proxy.o).get(), "done")
+            after = self.get_statistics()
+        finally:
+            executor.shutdown()
+        # The executor's thread only needed a thread state once.
+        self.assertEqual(after["calls"] - before["calls"], 5)
+        self.assertEqual(after["threadStatesCreated"] -
+                         before["threadStatesCreated"], 1)
+        self.assertEqual(after["persistentThreadStates"] -
+                         before["persistentThreadStates"], 1)
+        # ... and releases it when it exits
+        executor.awaitTermination(
+            10, javabridge.get_static_field(
+                "java/util/concurrent/TimeUnit", "SECONDS",
+                "Ljava/util/concurrent/TimeUnit;"))
+        for _ in range(100):
+            if self.get_statistics()["persistentThreadStates"] == \
+               before["persistentThreadStates"]:
+                break
+            time.sleep(.01)
+        self.assertEqual(self.get_statistics()["persistentThreadStates"],
+                         before["persistentThreadStates"])
+
+    def wait_for_persistent_thread_states(self, expected):
+        for _ in range(100):
+            if self.get_statistics()["persistentThreadStates"] == expected:
+                break
+            time.sleep(.01)
+        self.assertEqual(self.get_statistics()["persistentThreadStates"],
+                         expected)
+
+    def test_03_03_thread_exit_releases_thread_state(self):
+        calls = []
+        proxy = javabridge.JProxy("java.lang.Runnable",
+                                  dict(run=lambda: calls.append(1)))
+        before = self.get_statistics()
+        thread = javabridge.JClassWrapper("java.lang.Thread")(proxy.o)
+        thread.start()
+        thread.join()
+        self.assertEqual(calls, [1])
+        self.wait_for_persistent_thread_states(
+            before["persistentThreadStates"])
+
+    def test_03_04_stop_persisting_thread_states(self):
+        cpython = javabridge.JClassWrapper("org.cellprofiler.javabridge.CPython")
+        executor = javabridge.JClassWrapper(
+            "java.util.concurrent.Executors").newSingleThreadExecutor()
+        proxy = javabridge.JProxy("java.util.concurrent.Callable",
+                                  dict(call=lambda: "done"))
+        try:
+            before = self.get_statistics()
+            executor.submit(proxy.o).get()
+            self.assertEqual(self.get_statistics()["persistentThreadStates"],
+                             before["persistentThreadStates"] + 1)
+            cpython.setPersistentThreadStates(False)
+            # The executor's thread is still alive, but releases its
+            # thread state when it returns from Python.
+            executor.submit(proxy.o).get()
+            self.wait_for_persistent_thread_states(
+                before["persistentThreadStates"])
+        finally:
+            cpython.setPersistentThreadStates(True)
+            executor.shutdown()
@@ -101,6 +101,19 @@ class TestJavabridge(unittest.TestCase):
         klassString = self.env.find_class("java/lang/String")
         self.assertFalse(self.env.is_instance_of(jbyte, klassString))
     
+    def test_01_11_03_is_same_object(self):
+        klass = self.env.find_class("java/lang/Object")
+        method_id = self.env.get_method_id(klass, '<init>', '()V')
+        o1 = self.env.new_object(klass, method_id)
+        o2 = self.env.new_object(klass, method_id)
+        jarray = self.env.make_object_array(1, klass)
+        self.env.set_object_array_element(jarray, 0, o1)
+        o1_again = self.env.get_object_array_elements(jarray)[0]
+        self.assertTrue(self.env.is_same_object(o1, o1_again))
+        self.assertFalse(self.env.is_same_object(o1, o2))
+        self.assertFalse(self.env.is_same_object(o1, None))
+        self.assertTrue(self.env.is_same_object(None, None))
+        
     def test_01_12_get_static_field_id(self):
         klass = self.env.find_class("java/lang/Boolean")
         field_id = self.env.get_static_field_id(klass, "FALSE","Ljava/lang/Boolean;")
@@ -347,7 +360,28 @@ class TestJavabridge(unittest.TestCase):
         method_id = self.env.get_method_id(klass, 'concat', '(Ljava/lang/String;)Ljava/lang/String;')
         result = self.env.call_method(hello, method_id, world)
         self.assertEqual("Hello, world", self.env.get_string_utf(result))
-    
+
+    def test_03_11_from_reflected_method(self):
+        hello = self.env.new_string_utf("Hello, ")
+        world = self.env.new_string_utf("world")
+        klass = self.env.get_object_class(hello)
+        method_id = self.env.get_method_id(
+            klass, 'getClass', '()Ljava/lang/Class;')
+        string_class = self.env.call_method(hello, method_id)
+        method_id = self.env.get_method_id(
+            self.env.get_object_class(string_class), 'getMethod',
+            '(Ljava/lang/String;[Ljava/lang/Class;)Ljava/lang/reflect/Method;')
+        parameter_types = self.env.make_object_array(
+            1, self.env.find_class("java/lang/Class"))
+        self.env.set_object_array_element(parameter_types, 0, string_class)
+        method = self.env.call_method(
+            string_class, method_id, self.env.new_string_utf("concat"),
+            parameter_types)
+        method_id = self.env.from_reflected_method(
+            method, '(Ljava/lang/String;)Ljava/lang/String;', False)
+        result = self.env.call_method(hello, method_id, world)
+        self.assertEqual("Hello, world", self.env.get_string_utf(result))
+
     def test_04_01_call_static_bool(self):
         klass = self.env.find_class("java/lang/Boolean")
         method_id = self.env.get_static_method_id(klass, "parseBoolean",'(Ljava/lang/String;)Z')
@@ -459,7 +493,19 @@ class TestJavabridge(unittest.TestCase):
         field_id = self.env.get_static_field_id(klass, "PI","D")
         result = self.env.get_static_double_field(klass, field_id)
         self.assertAlmostEqual(result, 3.141592653589793)
-        
+
+    def test_05_09_from_reflected_field(self):
+        klass = self.env.find_class("java/lang/Math")
+        klass_obj = klass.as_class_object()
+        method_id = self.env.get_method_id(
+            self.env.get_object_class(klass_obj), "getField",
+            "(Ljava/lang/String;)Ljava/lang/reflect/Field;")
+        field = self.env.call_method(
+            klass_obj, method_id, self.env.new_string_utf("PI"))
+        field_id = self.env.from_reflected_field(field, "D", True)
+        result = self.env.get_static_double_field(klass, field_id)
+        self.assertAlmostEqual(result, 3.141592653589793)
+
     def test_06_01_class_as_object(self):
         klass_map = self.env.find_class("java/util/Map")
         klass_map_obj = klass_map.as_class_object()
@@ -245,7 +245,46 @@ class TestJutil(unittest.TestCase):
         t = threading.Thread(target = run)
         t.start()
         t.join()
-        
+
+    def test_02_05_env_is_thread_local(self):
+        '''Attaching and detaching another thread leaves this env alone'''
+        env = javabridge.get_env()
+        self.assertTrue(env is javabridge._javabridge.get_thread_local("env"))
+        result = []
+        def run():
+            result.append(javabridge.get_env())
+            other_env = javabridge.attach()
+            result.append(other_env is javabridge.get_env())
+            javabridge.detach()
+            result.append(javabridge.get_env())
+        t = threading.Thread(target = run)
+        t.start()
+        t.join()
+        self.assertEqual(result, [None, True, None])
+        self.assertTrue(javabridge.get_env() is env)
+
+    def test_02_06_auto_attach(self):
+        result = []
+        def run():
+            jthread = javabridge.static_call(
+                "java/lang/Thread", "currentThread", "()Ljava/lang/Thread;")
+            result.append(javabridge.call(jthread, "isDaemon", "()Z"))
+            result.append(javabridge.call(
+                jthread, "getContextClassLoader",
+                "()Ljava/lang/ClassLoader;") is not None)
+            result.append(jthread)
+        javabridge.set_auto_attach(True)
+        try:
+            t = threading.Thread(target = run)
+            t.start()
+            t.join()
+        finally:
+            javabridge.set_auto_attach(False)
+        self.assertTrue(result[0])
+        self.assertTrue(result[1])
+        # The thread was detached from Java when it exited
+        self.assertFalse(javabridge.call(result[2], "isAlive", "()Z"))
+
     def test_03_01_cw_from_class(self):
         '''Get a class wrapper from a class'''
         c = javabridge.get_class_wrapper(javabridge.make_instance('java/lang/Integer', '(I)V',
@@ -361,6 +400,70 @@ class TestJutil(unittest.TestCase):
             javabridge.make_future_task(c, fn_post_process=javabridge.unwrap_javascript))
         self.assertEqual(result, 4)
         
+    def test_06_04_main_thread_fifo(self):
+        from javabridge.jutil import run_in_main_thread
+        order = []
+        futures = [run_in_main_thread(lambda i=i: order.append(i), False)
+                   for i in range(100)]
+        for future in futures:
+            future.result()
+        self.assertEqual(order, list(range(100)))
+
+    def test_06_05_main_thread_future(self):
+        from javabridge.jutil import run_in_main_thread
+        future = run_in_main_thread(
+            lambda: javabridge.static_call(
+                "java/lang/Integer", "toString", "(I)Ljava/lang/String;", 42),
+            False)
+        self.assertEqual(future.result(), "42")
+        def fn():
+            raise ValueError("oops")
+        self.assertRaises(ValueError, run_in_main_thread, fn, True)
+
+    def test_06_06_main_thread_timeout(self):
+        import concurrent.futures
+        from javabridge.jutil import run_in_main_thread
+        event = threading.Event()
+        try:
+            self.assertRaises(concurrent.futures.TimeoutError,
+                              run_in_main_thread, event.wait, True,
+                              timeout=.1)
+        finally:
+            event.set()
+
+    def test_06_07_main_thread_statistics(self):
+        from javabridge.jutil import run_in_main_thread, \
+             get_main_thread_statistics, PRIORITY_HIGH
+        before = get_main_thread_statistics()
+        run_in_main_thread(lambda: None, True, priority=PRIORITY_HIGH)
+        after = get_main_thread_statistics()
+        self.assertEqual(after["completed"], before["completed"] + 1)
+        self.assertEqual(after["submitted"], before["submitted"] + 1)
+        self.assertTrue(after["max_wait"] >= after["mean_wait"] >= 0)
+
+    def test_06_08_main_thread_statistics_cancelled(self):
+        import concurrent.futures
+        from javabridge.jutil import run_in_main_thread, \
+             get_main_thread_statistics
+        event = threading.Event()
+        before = get_main_thread_statistics()
+        try:
+            blocker = run_in_main_thread(event.wait, False)
+            self.assertRaises(concurrent.futures.TimeoutError,
+                              run_in_main_thread, lambda: None, True,
+                              timeout=.1)
+            cancelled = run_in_main_thread(lambda: None, False)
+            self.assertTrue(cancelled.cancel())
+        finally:
+            event.set()
+        blocker.result()
+        run_in_main_thread(lambda: None, True)
+        after = get_main_thread_statistics()
+        self.assertEqual(after["submitted"], before["submitted"] + 4)
+        self.assertEqual(after["completed"], before["completed"] + 2)
+        self.assertEqual(after["cancelled"], before["cancelled"] + 2)
+        self.assertEqual(after["timed_out"], before["timed_out"] + 1)
+
     def test_07_01_wrap_future(self):
         future = javabridge.run_script("""
         new java.util.concurrent.FutureTask(
@@ -552,7 +655,77 @@ class TestJutil(unittest.TestCase):
         l = javabridge.make_list(["Foo", "Bar", "Baz"])
         del l[1]
         self.assertSequenceEqual(l, ["Foo", "Baz"])
-        
+
+    def test_08_22_wrapper_classes_are_shared(self):
+        l1 = javabridge.make_list(["Foo"])
+        l2 = javabridge.make_list(["Bar"])
+        self.assertIs(type(l1), type(l2))
+        self.assertEqual(l1.get(0), "Foo")
+        self.assertEqual(l2.get(0), "Bar")
+        m = javabridge.get_map_wrapper(
+            javabridge.make_instance("java/util/HashMap", "()V"))
+        m["Foo"] = "Bar"
+        self.assertEqual([javabridge.to_string(k) for k in m.keys()],
+                         ["Foo"])
+
+    def test_08_23_fn_wrapper_per_instance(self):
+        l = javabridge.make_list(["Foo", "Bar"])
+        w1 = javabridge.get_collection_wrapper(l.o, 
+            lambda x: javabridge.to_string(x) + "!")
+        w2 = javabridge.get_collection_wrapper(l.o)
+        self.assertEqual(w1[0], "Foo!")
+        self.assertEqual(w2[0], "Foo")
+        self.assertEqual(list(w1[0:2]), ["Foo!", "Bar!"])
+        self.assertEqual(list(w1), ["Foo!", "Bar!"])
+
+    def test_08_24_wrapper_not_an_instance(self):
+        # Objects that don't implement the interface can still be
+        # wrapped and their methods are looked up by name.
+        s = javabridge.get_env().new_string(u"Foo")
+        w = javabridge.get_collection_wrapper(s)
+        self.assertFalse(w.isEmpty())
+        self.assertRaises(javabridge.JavaException, w.size)
+        o = javabridge.make_instance("java/lang/Object", "()V")
+        self.assertRaises(javabridge.JavaException,
+                          javabridge.get_map_wrapper(o).size)
+
+    def test_08_25_cached_method_from_threads(self):
+        # Each method looks up its method ID on its first call, so have
+        # the threads make the first calls together.
+        class Sizes(object):
+            def __init__(self, o):
+                self.o = o
+        names = ["size%d" % i for i in range(200)]
+        for name in names:
+            setattr(Sizes, name, javabridge.make_method(
+                "size", "()I", class_name="java/util/Collection"))
+        l = javabridge.make_list(["Foo", "Bar"])
+        barrier = threading.Barrier(8)
+        results = []
+        errors = []
+        def run():
+            javabridge.attach()
+            try:
+                sizes = Sizes(l.o)
+                barrier.wait()
+                results.append([getattr(sizes, name)() for name in names])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                javabridge.detach()
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(switch_interval)
+        self.assertEqual(errors, [])
+        self.assertEqual(results, [[2] * len(names)] * 8)
+
     def test_09_01_00_get_field(self):
         o = javabridge.make_instance("org/cellprofiler/javabridge/test/RealRect", "(DDDD)V", 1, 2, 3, 4)
         self.assertEqual(javabridge.get_field(o, "x", "D"), 1)
@@ -661,7 +834,29 @@ class TestJutil(unittest.TestCase):
             'javabridge.unlock_jref(ref_id)', d, d)
         javabridge.unlock_jref(ref_self)
         self.assertRaises(KeyError, javabridge.redeem_jref, ref_self)
-        
+
+    def test_12_04_jref_stale(self):
+        # A token for a collected value must not redeem a later value
+        # that reuses its slot.
+        ref_id, ref = javabridge.create_jref(dict(foo="bar"))
+        del ref
+        refs = [javabridge.create_jref(dict(foo=i)) for i in range(10)]
+        self.assertRaises(KeyError, javabridge.redeem_jref, ref_id)
+        for i, (ref_id, ref) in enumerate(refs):
+            self.assertEqual(javabridge.redeem_jref(ref_id)["foo"], i)
+        self.assertRaises(KeyError, javabridge.redeem_jref, "not a jref")
+
+    def test_12_05_jref_lock_count(self):
+        ref_id, ref = javabridge.create_jref(dict(foo="bar"))
+        javabridge.lock_jref(ref_id)
+        javabridge.lock_jref(ref_id)
+        del ref
+        javabridge.unlock_jref(ref_id)
+        self.assertEqual(javabridge.redeem_jref(ref_id)["foo"], "bar")
+        javabridge.unlock_jref(ref_id)
+        self.assertRaises(KeyError, javabridge.redeem_jref, ref_id)
+        self.assertRaises(KeyError, javabridge.unlock_jref, ref_id)
+
     def test_13_01_unicode_arg(self):
         # On 2.x, check that a unicode argument is properly prepared
         s = u"Hola ni\u00F1os"
@@ -674,5 +869,121 @@ class TestJutil(unittest.TestCase):
             js1, "concat", "(Ljava/lang/String;)Ljava/lang/String;", s2)
         self.assertEqual(s, result)
         
+    def test_14_01_executor_submit(self):
+        with javabridge.JavaThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(
+                javabridge.make_instance, "java/lang/Integer", "(I)V", i)
+                       for i in range(10)]
+            result = [javabridge.call(f.result(), "intValue", "()I")
+                      for f in futures]
+        self.assertEqual(result, list(range(10)))
+
+    def test_14_02_executor_stays_attached(self):
+        envs = []
+        def initializer():
+            envs.append(javabridge.get_env())
+        def fn(env):
+            return env is javabridge.get_env() and env in envs
+        executor = javabridge.JavaThreadPoolExecutor(
+            max_workers=1, initializer=initializer, pass_env=True)
+        try:
+            for i in range(3):
+                self.assertTrue(executor.submit(fn).result())
+        finally:
+            executor.shutdown()
+        self.assertEqual(len(envs), 1)
+        self.assertRaises(RuntimeError, executor.submit, fn)
+
+    def test_14_03_executor_exception(self):
+        with javabridge.JavaThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(
+                javabridge.static_call, "java/lang/Integer", "parseInt",
+                "(Ljava/lang/String;)I", "not a number")
+            self.assertRaises(javabridge.JavaException, future.result)
+
+    def test_14_04_executor_warms_methods(self):
+        to_string = ("java/lang/Object", "toString", "()Ljava/lang/String;")
+        value_of = ("java/lang/Integer", "valueOf",
+                    "(I)Ljava/lang/Integer;", True)
+        for key in (to_string + (False,), value_of):
+            javabridge.jutil._cached_method_ids.pop(key, None)
+        looked_up = []
+        def initializer():
+            looked_up.extend(
+                key for key in (to_string + (False,), value_of)
+                if key in javabridge.jutil._cached_method_ids)
+        def fn(env, i):
+            klass = env.find_class("java/lang/Integer")
+            jint = env.call_static_method(
+                klass, javabridge.get_cached_method_id(*value_of), i)
+            return env.get_string(env.call_method(
+                jint, javabridge.get_cached_method_id(*to_string)))
+        with javabridge.JavaThreadPoolExecutor(
+                max_workers=1, initializer=initializer, pass_env=True,
+                methods=[to_string, value_of]) as executor:
+            self.assertEqual(executor.submit(fn, 42).result(), "42")
+        self.assertEqual(len(looked_up), 2)
+
+    def test_14_05_executor_bad_method(self):
+        with javabridge.JavaThreadPoolExecutor(
+                max_workers=1,
+                methods=[("java/lang/Object", "noSuchMethod", "()V")]) \
+                as executor:
+            future = executor.submit(lambda: None)
+            self.assertRaises(javabridge.JavaError, future.result)
+
+    def test_15_01_register_natives(self):
+        class_name = "org/cellprofiler/javabridge/test/NativeKernel"
+        javabridge.register_natives(class_name, {
+            "apply": ("(DD)D", lambda x, y: x * y),
+            "isPositive": ("(J)Z", lambda value: value > 0),
+            "next": ("(C)C", lambda c: chr(ord(c) + 1))})
+        self.assertEqual(javabridge.static_call(
+            class_name, "apply", "(DD)D", 1.5, 4), 6.0)
+        self.assertTrue(javabridge.static_call(
+            class_name, "isPositive", "(J)Z", 2**40))
+        self.assertFalse(javabridge.static_call(
+            class_name, "isPositive", "(J)Z", -1))
+        self.assertEqual(javabridge.static_call(
+            class_name, "next", "(C)C", "a"), "b")
+        x = np.arange(5, dtype=float)
+        self.assertEqual(javabridge.static_call(
+            class_name, "applyAll", "([D[D)D", x, x), np.sum(x * x))
+
+    def test_15_02_register_natives_objects(self):
+        class_name = "org/cellprofiler/javabridge/test/NativeKernel"
+        def describe(name, values):
+            self.assertIsInstance(values, np.ndarray)
+            return "%s: %g" % (name, values.sum())
+        javabridge.register_natives(class_name, {
+            "describe": ("(Ljava/lang/String;[D)Ljava/lang/String;", describe)})
+        kernel = javabridge.make_instance(class_name, "()V")
+        self.assertEqual(javabridge.call(
+            kernel, "describe", "(Ljava/lang/String;[D)Ljava/lang/String;",
+            "total", np.array([1.5, 2.5])), "total: 4")
+
+    def test_15_03_register_natives_exception(self):
+        class_name = "org/cellprofiler/javabridge/test/NativeKernel"
+        def fail():
+            raise ValueError("kernel failure")
+        javabridge.register_natives(class_name, {"fail": ("()V", fail)})
+        kernel = javabridge.make_instance(class_name, "()V")
+        with self.assertRaises(javabridge.JavaException) as cm:
+            javabridge.call(kernel, "fail", "()V")
+        self.assertTrue(javabridge.is_instance_of(
+            cm.exception.throwable, "java/lang/RuntimeException"))
+        self.assertIn("kernel failure", str(cm.exception))
+
+    def test_15_04_unregister_natives(self):
+        class_name = "org/cellprofiler/javabridge/test/NativeKernel"
+        javabridge.register_natives(
+            class_name, {"apply": ("(DD)D", lambda x, y: x + y)})
+        javabridge.unregister_natives(class_name)
+        self.assertRaises(javabridge.JavaException, javabridge.static_call,
+                          class_name, "apply", "(DD)D", 1.0, 2.0)
+        self.assertRaises(javabridge.JavaException,
+                          javabridge.register_natives, class_name,
+                          {"noSuchMethod": ("(DD)D", lambda x, y: x + y)})
+
 if __name__=="__main__":
     unittest.main()
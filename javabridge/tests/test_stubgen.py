@@ -0,0 +1,93 @@
+'''test_stubgen.py - test generated bindings
+
+python-javabridge is licensed under the BSD license.  See the
+accompanying file LICENSE for details.
+
+Copyright (c) 2003-2009 Massachusetts Institute of Technology
+Copyright (c) 2009-2013 Broad Institute
+All rights reserved.
+
+'''
+import ast
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import javabridge
+import javabridge.stubgen
+
+class TestStubgen(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        cls.package = "stubgen_test_bindings"
+        cls.modules = javabridge.stubgen.generate(
+            ["java.util.ArrayList", "java.lang.Integer", "java.lang.String",
+             "java.awt.Point", "java.util.AbstractList"],
+            os.path.join(cls.root, cls.package))
+        sys.path.insert(0, cls.root)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.root)
+        for name in list(sys.modules):
+            if name.startswith(cls.package):
+                del sys.modules[name]
+        shutil.rmtree(cls.root)
+
+    def import_module(self, name):
+        return importlib.import_module("%s.%s" % (self.package, name))
+
+    def test_01_01_modules(self):
+        self.assertEqual(self.modules, ["java_awt", "java_lang", "java_util"])
+        for name in self.modules:
+            path = os.path.join(self.root, self.package, name + ".pyi")
+            with open(path) as fd:
+                ast.parse(fd.read())
+
+    def test_01_02_methods(self):
+        java_util = self.import_module("java_util")
+        a = java_util.ArrayList()
+        a.add("Hello")
+        a.add(0, "World")
+        self.assertEqual(a.size(), 2)
+        self.assertEqual(a.get(0), "World")
+        self.assertTrue(a.contains("Hello"))
+        self.assertIn("add(ILjava/lang/Object;)V", a.add.__doc__)
+
+    def test_01_03_static_methods_and_results(self):
+        java_lang = self.import_module("java_lang")
+        self.assertEqual(java_lang.Integer.valueOf(42), 42)
+        self.assertEqual(java_lang.Integer.parseInt("123"), 123)
+        self.assertEqual(java_lang.Integer.MAX_VALUE, 2**31 - 1)
+        self.assertEqual(java_lang.String.valueOf(1.5), "1.5")
+
+    def test_01_04_fields(self):
+        java_awt = self.import_module("java_awt")
+        p = java_awt.Point(3, 4)
+        self.assertEqual(p.x, 3)
+        p.x = 5
+        self.assertEqual(p.getX(), 5.0)
+        location = p.getLocation()
+        self.assertIsInstance(location, java_awt.Point)
+        self.assertEqual(location.y, 4)
+
+    def test_01_05_overload_by_java_class(self):
+        java_util = self.import_module("java_util")
+        a = java_util.ArrayList()
+        a.add(javabridge.make_instance("java/lang/Integer", "(I)V", 1))
+        b = java_util.ArrayList(a.o)
+        self.assertEqual(b.size(), 1)
+        self.assertRaises(TypeError, java_util.ArrayList, "foo")
+
+    def test_01_06_abstract_class(self):
+        java_util = self.import_module("java_util")
+        self.assertRaises(TypeError, java_util.AbstractList)
+        a = java_util.AbstractList.from_java(
+            javabridge.make_instance("java/util/ArrayList", "()V"))
+        self.assertTrue(a.isEmpty())
+
+if __name__=="__main__":
+    unittest.main()
@@ -8,7 +8,11 @@ Copyright (c) 2009-2013 Broad Institute
 All rights reserved.
 
 '''
+import gc
+import time
 import unittest
+import weakref
+import numpy as np
 import javabridge as J
 
 class TestJWrapper(unittest.TestCase):
@@ -49,6 +53,106 @@ class TestJWrapper(unittest.TestCase):
         obj.x = 2.5
         self.assertEqual(obj.x, 2.5)
 
+    def test_02_03_int_field(self):
+        obj = J.JClassWrapper("java.awt.Point")(3, 4)
+        self.assertEqual(obj.y, 4)
+        obj.y = 5
+        self.assertEqual(obj.y, 5)
+        self.assertEqual(obj.getY(), 5.0)
+
+    def test_02_04_static_object_field(self):
+        c = J.JClassWrapper("java.lang.Boolean")
+        self.assertIs(c.TRUE, True)
+        c = J.JClassWrapper("java.io.File")
+        self.assertEqual(c.separator, J.get_static_field(
+            "java/io/File", "separator", "Ljava/lang/String;"))
+
+    def test_02_05_hidden_field(self):
+        obj = J.JClassWrapper(
+            "org.cellprofiler.javabridge.test.HiddenFieldRect")()
+        self.assertEqual(obj.f_int, "hidden")
+        obj.f_int = "changed"
+        self.assertEqual(obj.f_int, "changed")
+        self.assertEqual(obj.field_names.count("f_int"), 1)
+
+    def test_03_01_shared_metadata(self):
+        env = J.get_env()
+        obj1 = J.JWrapper(env.new_string(u"foo"))
+        obj2 = J.JWrapper(env.new_string(u"bar"))
+        self.assertIs(obj1.methods, obj2.methods)
+        self.assertIs(obj1.field_names, obj2.field_names)
+        self.assertEqual(obj1.concat("bar"), "foobar")
+        self.assertEqual(obj2.concat("foo"), "barfoo")
+        self.assertEqual(obj1.toLowerCase.__doc__, obj2.toLowerCase.__doc__)
+
+    def test_03_02_dispatch_by_java_class(self):
+        # The overload cached for one class must not be used for an
+        # object of another class.
+        sb = J.JClassWrapper("java.lang.StringBuilder")()
+        jstring = J.get_env().new_string(u"foo")
+        jinteger = J.make_instance("java/lang/Integer", "(I)V", 42)
+        for o in (jstring, jinteger, jstring, 1, "bar", 2):
+            sb.append(o)
+        self.assertEqual(sb.toString(), "foo42foo1bar2")
+
+    def test_03_04_dispatch_independent_of_history(self):
+        from javabridge.wrappers import get_class_metadata
+        metadata = get_class_metadata(
+            J.class_for_name("java.lang.StringBuffer"))
+        jstring = J.get_env().new_string(u"foo")
+        jinteger = J.make_instance("java/lang/Integer", "(I)V", 42)
+        def matches(overload):
+            try:
+                return overload.match_args([jstring]) is not None
+            except TypeError:
+                return False
+        expected = [overload for overload in metadata.get_overloads("append")
+                    if matches(overload)][0]
+        metadata.resolve("append", [jinteger])
+        overload, cargs = metadata.resolve("append", [jstring])
+        self.assertIs(overload, expected)
+
+    def test_03_05_string_prefers_string_overload(self):
+        from javabridge.wrappers import get_class_metadata
+        metadata = get_class_metadata(
+            J.class_for_name("org.cellprofiler.javabridge.CPython"))
+        overload, cargs = metadata.resolve("execute", ["pass"])
+        self.assertEqual(overload.sig, "(Ljava/lang/String;)V")
+        # ... but is still converted for a numeric parameter if nothing
+        # else takes it
+        self.assertEqual(
+            J.JClassWrapper("java.lang.Integer").toHexString("255"), "ff")
+
+    def test_03_06_dispatch_hit_skips_match_args(self):
+        from javabridge.wrappers import _Overload
+        sb = J.JWrapper(J.make_instance("java/lang/StringBuffer", "()V"))
+        def calls(c):
+            sb.append(c)
+            sb.append(J.JWrapper(J.get_env().new_string(c)))
+            sb.insert(0, c)
+            sb.setCharAt(0, c)
+        calls(u"a")
+        match_args = _Overload.match_args
+        matched = []
+        def counting_match_args(overload, args):
+            matched.append(args)
+            return match_args(overload, args)
+        _Overload.match_args = counting_match_args
+        try:
+            calls(u"b")
+        finally:
+            _Overload.match_args = match_args
+        self.assertEqual(matched, [])
+        self.assertEqual(sb.toString(), "baaabb")
+
+    def test_03_03_lazy_methods(self):
+        obj = J.JWrapper(J.make_instance("java/util/ArrayList", "()V"))
+        self.assertNotIn("add", vars(obj))
+        self.assertIn("add", dir(obj))
+        self.assertIn("java.util.ArrayList.add(int,java.lang.Object)",
+                      obj.add.__doc__)
+        self.assertIn("valueOf", dir(J.JClassWrapper("java.lang.String")))
+
 class TestJClassWrapper_Unboxing(unittest.TestCase):
     def setUp(self):
         self.i = J.JClassWrapper('java.lang.Integer')(3)
@@ -88,6 +192,23 @@ class TestJClassWrapper_Collection(unittest.TestCase):
         for i in range(len(self.a)):
             self.assertEqual(self.a[i].intValue(), 10)
 
+    def test_01_05_iterate_linked_list(self):
+        l = J.JClassWrapper('java.util.LinkedList')()
+        for i in self.ints:
+            l.add(i)
+        self.assertEqual([x.intValue() for x in l], self.ints)
+
+    def test_01_06_iterate_chunks(self):
+        # Longer than a chunk of a random-access list
+        a = J.JClassWrapper('java.util.ArrayList')()
+        for i in range(600):
+            a.add(str(i))
+        self.assertEqual(list(a), [str(i) for i in range(600)])
+
+    def test_01_07_iterate_not_collection(self):
+        obj = J.JClassWrapper('java.lang.Object')()
+        self.assertRaises(TypeError, iter, obj)
+
 class TestJClassWrapper(unittest.TestCase):
     def test_01_01_init(self):
         c = J.JClassWrapper("java.lang.Integer")
@@ -122,6 +243,43 @@ class TestJClassWrapper(unittest.TestCase):
         self.assertEqual(args[0], J.to_string(exts[0]))
         self.assertEqual(args[1], J.to_string(exts[1]))
 
+    def test_03_01_shared_metadata(self):
+        c1 = J.JClassWrapper("java.lang.Integer")
+        c2 = J.JClassWrapper("java.lang.Integer")
+        self.assertIs(c1.methods, c2.methods)
+        self.assertEqual(c2.toString(456), "456")
+        self.assertIsNot(c1.methods, J.JClassWrapper("java.lang.Long").methods)
+
+class TestJavaType(unittest.TestCase):
+    def test_01_01_sig(self):
+        from javabridge.wrappers import sig
+        for class_name, expected in (
+            ("java.lang.String", "Ljava/lang/String;"),
+            ("[I", "[I"),
+            ("[Ljava.lang.String;", "[Ljava/lang/String;")):
+            self.assertEqual(sig(J.class_for_name(class_name)), expected)
+        klass = J.get_static_field("java/lang/Integer", "TYPE", 
+                                   "Ljava/lang/Class;")
+        self.assertEqual(sig(klass), "I")
+
+    def test_01_02_interned(self):
+        from javabridge.wrappers import get_java_type
+        t1 = get_java_type(J.class_for_name("java.util.ArrayList"))
+        t2 = get_java_type(J.class_for_name("java.util.ArrayList"))
+        self.assertIs(t1, t2)
+        t3 = get_java_type(J.class_for_name("[Ljava.util.ArrayList;"))
+        self.assertTrue(t3.is_array)
+        self.assertIs(t3.component_type, t1)
+
+    def test_01_03_cast_error(self):
+        from javabridge.wrappers import cast
+        jinteger = J.make_instance("java/lang/Integer", "(I)V", 42)
+        with self.assertRaises(TypeError) as cm:
+            cast(jinteger, J.class_for_name("java.lang.String"))
+        self.assertEqual(
+            str(cm.exception),
+            "Object of class java.lang.Integer cannot be cast to java.lang.String")
+
 class TestJProxy(unittest.TestCase):
     def test_01_01_init(self):
         def whatever():
@@ -165,6 +323,91 @@ class TestJProxy(unittest.TestCase):
                          dict(call = call))
         self.assertEqual(J.JWrapper(proxy.o).call(), "foo")
 
+    def test_01_06_primitive_return_value(self):
+        def compare(a, b):
+            return len(J.to_string(a)) - len(J.to_string(b))
+        proxy = J.JProxy('java.util.Comparator', dict(compare=compare))
+        l = J.make_list(["ccc", "a", "bb"])
+        J.static_call("java/util/Collections", "sort",
+                      "(Ljava/util/List;Ljava/util/Comparator;)V",
+                      l.o, proxy.o)
+        self.assertEqual([J.to_string(x) for x in l], ["a", "bb", "ccc"])
+
+    def test_01_07_primitive_args(self):
+        calls = []
+        def apply_as_int(a, b):
+            calls.append((a, b))
+            return a * b
+        proxies = [J.JProxy('java.util.function.IntBinaryOperator',
+                            dict(applyAsInt=apply_as_int)) for _ in range(2)]
+        for i, proxy in enumerate(proxies):
+            self.assertEqual(J.call(proxy.o, "applyAsInt", "(II)I", 6, i), 6 * i)
+        self.assertEqual(calls, [(6, 0), (6, 1)])
+        self.assertIsInstance(calls[0][0], int)
+
+    def test_01_08_released_kept_alive_by_java(self):
+        magic = []
+        def whatever(magic=magic):
+            magic.append("bus")
+        runnables = J.make_list()
+        runnables.add(J.JProxy('java.lang.Runnable', dict(run=whatever)).release())
+        gc.collect()
+        J.JWrapper(runnables.get(0)).run()
+        self.assertEqual(magic, ["bus"])
+
+    def test_01_09_released_collected_with_java_proxy(self):
+        proxy = J.JProxy('java.lang.Runnable', dict(run=lambda: None))
+        runnables = J.make_list([proxy.release()])
+        self.assertIsNone(proxy.o)
+        proxy_ref = weakref.ref(proxy)
+        del proxy
+        gc.collect()
+        self.assertIsNotNone(proxy_ref())
+        del runnables
+        for _ in range(100):
+            J.static_call("java/lang/System", "gc", "()V")
+            gc.collect()
+            if proxy_ref() is None:
+                break
+            time.sleep(.05)
+        self.assertIsNone(proxy_ref())
+
+class TestJVectorizedDoubleOperator(unittest.TestCase):
+    def test_01_01_apply_as_double(self):
+        @J.vectorized_double_operator
+        def square(x):
+            return x * x
+        self.assertEqual(J.JWrapper(square.o).applyAsDouble(3.0), 9.0)
+        self.assertEqual(square(4.0), 16.0)
+
+    def test_01_02_apply_chunks(self):
+        chunks = []
+        @J.vectorized_double_operator(chunk_size=4)
+        def negate(x):
+            chunks.append(len(x))
+            return -x
+        values = np.arange(10, dtype=np.float64)
+        result = J.get_env().get_double_array_elements(
+            J.JWrapper(negate.o).apply(values).o)
+        np.testing.assert_array_equal(result, -values)
+        self.assertEqual(chunks, [4, 4, 2])
+
+    def test_01_03_apply_stream(self):
+        op = J.JVectorizedDoubleOperator(np.sqrt, 2)
+        stream = J.static_call("java/util/Arrays", "stream",
+                               "([D)Ljava/util/stream/DoubleStream;",
+                               np.array([1.0, 4.0, 9.0]))
+        result = J.call(op.o, "apply", "(Ljava/util/stream/DoubleStream;)"
+                        "Ljava/util/stream/DoubleStream;", stream)
+        result = J.get_env().get_double_array_elements(
+            J.call(result, "toArray", "()[D"))
+        np.testing.assert_array_equal(result, [1.0, 2.0, 3.0])
+
+    def test_01_04_wrong_length(self):
+        op = J.JVectorizedDoubleOperator(lambda x: x[:1])
+        self.assertRaises(J.JavaException, J.JWrapper(op.o).apply,
+                          np.zeros(3))
+
 if __name__=="__main__":
     import javabridge
     javabridge.start_vm()
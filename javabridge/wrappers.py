@@ -12,6 +12,7 @@ All rights reserved.
 
 import inspect
 import sys
+import threading
 import numpy as np
 import javabridge as J
 
@@ -21,6 +22,402 @@ except NameError:
     basestring = (str, )  # Python 3
 
 
+#
+# Method IDs of java.lang.Object and friends used on every wrap. These
+# classes are never unloaded, so the IDs stay valid.
+#
+_method_ids = {}
+
+def _get_method_id(class_name, name, sig):
+    key = (class_name, name, sig)
+    method_id = _method_ids.get(key)
+    if method_id is None:
+        env = J.get_env()
+        method_id = env.get_method_id(env.find_class(class_name), name, sig)
+        _method_ids[key] = method_id
+    return method_id
+
+def _get_class(o):
+    '''Return the java.lang.Class of a Java object'''
+    return J.get_env().call_method(
+        o, _get_method_id("java/lang/Object", "getClass",
+                          "()Ljava/lang/Class;"))
+
+class _ClassKey(object):
+    '''A dispatch table key for a java.lang.Class, compared by identity'''
+    __slots__ = ("klass", "hash")
+    def __init__(self, klass):
+        self.klass = klass
+        self.hash = J.get_env().call_method(
+            klass, _get_method_id("java/lang/Object", "hashCode", "()I"))
+        
+    def __hash__(self):
+        return self.hash
+    
+    def __eq__(self, other):
+        return isinstance(other, _ClassKey) and self.hash == other.hash and \
+            J.get_env().is_same_object(self.klass, other.klass)
+    
+    def __ne__(self, other):
+        return not self == other
+
+def _type_key(args):
+    '''Return the key of a call's arguments in a dispatch table
+    
+    The key is the tuple of the arguments' Python types, with the class
+    of each Java object, so that an overload that takes a superclass is
+    not chosen for objects of a subclass with an overload of its own.
+    A JWrapper already knows its class, so it stands for it with its
+    class metadata, without a call to Java. Returns None for sequence
+    arguments - whether those can be cast depends on their contents.
+    '''
+    key = []
+    for arg in args:
+        if isinstance(arg, JWrapper):
+            key.append(arg._JWrapper__metadata)
+            continue
+        o = arg.o if hasattr(arg, "o") else arg
+        if isinstance(o, J.JB_Object):
+            key.append(_ClassKey(_get_class(o)))
+        elif o is None or np.isscalar(o):
+            key.append(type(o))
+        else:
+            return None
+    return tuple(key)
+
+class _Overload(object):
+    '''One overload of a method or constructor, with its signature'''
+    def __init__(self, jmethod, params, is_var_args, return_type, 
+                 is_static=False):
+        self.o = jmethod
+        self.params = params
+        self.is_var_args = is_var_args
+        self.types = [get_java_type(klass) for klass in params]
+        self.ret_sig = "V" if return_type is None else sig(return_type)
+        self.sig = "(%s)%s" % (
+            "".join([java_type.sig for java_type in self.types]), 
+            self.ret_sig)
+        self.method_id = J.get_env().from_reflected_method(
+            jmethod, self.sig, is_static)
+
+    def match_args(self, args):
+        '''Cast args to this overload's parameter types
+        
+        :returns: the cast arguments or None if the number of arguments
+                  is wrong.
+        
+        raises a TypeError if an argument can't be cast.
+        '''
+        nparams = len(self.params)
+        if len(args) < nparams - (1 if self.is_var_args else 0):
+            return None
+        if len(args) > nparams and not self.is_var_args:
+            return None
+        if self.is_var_args:
+            args = list(args[:nparams-1]) + [args[nparams-1:]]
+        return [java_type.cast(o) for o, java_type in zip(args, self.types)]
+
+    def converters(self, key):
+        '''Return functions that cast arguments with the given types
+        
+        :param key: the dispatch key of arguments that match_args accepted
+        
+        :returns: one function per parameter or None for a varargs
+                  overload, whose arguments are packed by match_args.
+        '''
+        if self.is_var_args:
+            return None
+        return [java_type.converter(arg_type)
+                for java_type, arg_type in zip(self.types, key)]
+
+    def converts_strings(self, args):
+        '''True if a string argument is passed as a number or boolean
+        
+        These conversions are only used if no other overload takes the
+        arguments, so that, for instance, a string chooses execute(String)
+        over execute(long).
+        '''
+        return any([isinstance(o, basestring) and java_type.sig in "ZBSIJFD"
+                    for o, java_type in zip(args, self.types)])
+
+_FIELD_KINDS = dict(
+    Z="boolean", B="byte", C="char", S="short", I="int", J="long",
+    F="float", D="double")
+
+class _Field(object):
+    '''A public field of a class, with its field ID
+    
+    get and set make a single typed Get/Set<Type>Field call.
+    '''
+    def __init__(self, jfield, name, field_type, is_static):
+        self.name = name
+        self.sig = field_type.sig
+        self.is_static = is_static
+        self.field_id = J.get_env().from_reflected_field(
+            jfield, self.sig, is_static)
+        kind = _FIELD_KINDS.get(self.sig, "object")
+        if is_static:
+            kind = "static_" + kind
+        self.__getter = getattr(J.JB_Env, "get_%s_field" % kind)
+        self.__setter = getattr(J.JB_Env, "set_%s_field" % kind)
+        self.__is_object = self.sig not in _FIELD_KINDS
+        
+    def get(self, target):
+        '''Get the field's value
+        
+        :param target: the object for an instance field or the JB_Class
+                       for a static field
+        '''
+        result = self.__getter(J.get_env(), target, self.field_id)
+        if self.__is_object:
+            result = J.get_nice_result(result, self.sig)
+        return result
+    
+    def set(self, target, value):
+        '''Set the field's value
+        
+        :param target: the object for an instance field or the JB_Class
+                       for a static field
+        :param value: the new value
+        '''
+        if self.__is_object:
+            value = J.get_nice_arg(value, self.sig)
+        self.__setter(J.get_env(), target, self.field_id, value)
+
+class _ClassMetadata(object):
+    '''Reflection results for a Java class, shared by all of its wrappers
+    
+    The methods, their documentation, the public fields and the
+    signatures of overloads are looked up once per class. Use
+    get_class_metadata to get the metadata for a class.
+    '''
+    def __init__(self, klass):
+        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
+        env = J.get_env()
+        self.klass = klass
+        self.class_wrapper = J.get_class_wrapper(klass, True)
+        self.methods = {}
+        self.static_methods = {}
+        for jmethod in env.get_object_array_elements(
+            self.class_wrapper.getMethods()):
+            if (J.call(jmethod, "getModifiers", "()I") & STATIC) == STATIC:
+                methods = self.static_methods
+            else:
+                methods = self.methods
+            method = J.get_method_wrapper(jmethod)
+            name = method.getName()
+            if name not in methods:
+                methods[name] = []
+            methods[name].append(method)
+        self.field_names = []
+        self.fields = {}
+        for jfield in env.get_object_array_elements(
+            self.class_wrapper.getFields()):
+            name = J.call(jfield, "getName", "()Ljava/lang/String;")
+            if name in self.fields:
+                #
+                # An inherited field hidden by one of the same name.
+                # getFields lists a class's own fields before those it
+                # inherits, so the first is the one getField returns.
+                #
+                continue
+            field_type = J.call(jfield, "getType", "()Ljava/lang/Class;")
+            is_static = \
+                (J.call(jfield, "getModifiers", "()I") & STATIC) == STATIC
+            self.field_names.append(name)
+            self.fields[name] = _Field(
+                jfield, name, get_java_type(field_type), is_static)
+        self.__overloads = {}
+        self.__constructors = None
+        self.__dispatch = {}
+        self.__docs = {}
+        self.__is_instance_of = {}
+        
+    def is_instance_of(self, o, class_name):
+        '''Return True if o, an instance of this class, is a class_name
+        
+        The answer is the same for every instance of the class, so it is
+        looked up once.
+        
+        :param o: an instance of the class
+        :param class_name: the name of a class or interface in slash form
+        '''
+        result = self.__is_instance_of.get(class_name)
+        if result is None:
+            result = J.is_instance_of(o, class_name)
+            self.__is_instance_of[class_name] = result
+        return result
+        
+    def get_method_doc(self, name, is_static=False):
+        '''Return the docstring for the methods with the given name
+        
+        The docstring lists the signatures of the overloads. It is built
+        the first time it is asked for.
+        '''
+        key = (name, is_static)
+        doc = self.__docs.get(key)
+        if doc is None:
+            methods = self.static_methods if is_static else self.methods
+            doc = "\n".join([J.to_string(method.o) for method in methods[name]])
+            self.__docs[key] = doc
+        return doc
+        
+    def get_overloads(self, name, is_static=False):
+        '''Return the _Overloads of the methods with the given name'''
+        key = (name, is_static)
+        overloads = self.__overloads.get(key)
+        if overloads is None:
+            env = J.get_env()
+            methods = self.static_methods if is_static else self.methods
+            overloads = [
+                _Overload(method.o, 
+                          env.get_object_array_elements(
+                              method.getParameterTypes()),
+                          J.call(method.o, "isVarArgs", "()Z"),
+                          J.call(method.o, "getReturnType", 
+                                 "()Ljava/lang/Class;"),
+                          is_static)
+                for method in methods.get(name, [])]
+            self.__overloads[key] = overloads
+        return overloads
+    
+    def get_constructors(self):
+        '''Return the _Overloads of the class's public constructors'''
+        if self.__constructors is None:
+            env = J.get_env()
+            constructors = []
+            for jconstructor in env.get_object_array_elements(
+                self.class_wrapper.getConstructors()):
+                constructor = J.get_constructor_wrapper(jconstructor)
+                constructors.append(_Overload(
+                    jconstructor,
+                    env.get_object_array_elements(
+                        constructor.getParameterTypes()),
+                    J.call(jconstructor, "isVarArgs", "()Z"), None))
+            self.__constructors = constructors
+        return self.__constructors
+    
+    def resolve(self, name, args, is_static=False):
+        '''Choose the overload of a method to call with the given arguments
+        
+        The overload chosen for a tuple of argument types is kept in a
+        dispatch table with the functions that cast arguments of those
+        types, so later calls with the same types skip the search and the
+        reflective checks of match_args.
+        
+        :param name: the method name or "<init>" for a constructor
+        :param args: the Python arguments to the call
+        :param is_static: True to look for a static method
+        
+        :returns: a tuple of the _Overload and the cast arguments
+        
+        raises a TypeError if no overload takes the arguments.
+        '''
+        key = _type_key(args)
+        table = self.__dispatch.get((name, is_static))
+        if table is None:
+            table = self.__dispatch.setdefault((name, is_static), {})
+        entry = table.get(key) if key is not None else None
+        if entry is not None:
+            overload, converters = entry
+            try:
+                if converters is None:
+                    cargs = overload.match_args(args)
+                else:
+                    cargs = [convert(o) for convert, o in zip(converters, args)]
+                if cargs is not None:
+                    return overload, cargs
+            except (TypeError, ValueError, AttributeError, OverflowError,
+                    J.JavaException):
+                #
+                # The values, not the types, ruled the overload out,
+                # e.g. a string that isn't a single character.
+                #
+                pass
+        if name == "<init>":
+            overloads = self.get_constructors()
+        else:
+            overloads = self.get_overloads(name, is_static)
+        fallback = None
+        for overload in overloads:
+            try:
+                cargs = overload.match_args(args)
+            except (TypeError, ValueError, AttributeError, OverflowError,
+                    J.JavaException):
+                continue
+            if cargs is None:
+                continue
+            if overload.converts_strings(args):
+                if fallback is None:
+                    fallback = overload, cargs
+                continue
+            if key is not None:
+                table.setdefault(key, (overload, overload.converters(key)))
+            return overload, cargs
+        if fallback is not None:
+            if key is not None:
+                table.setdefault(
+                    key, (fallback[0], fallback[0].converters(key)))
+            return fallback
+        if name == "<init>":
+            raise TypeError("No matching constructor found")
+        raise TypeError("No matching method found for %s" % name)
+
+class _ClassCache(object):
+    '''A cache of objects made from a java.lang.Class, keyed by the Class
+    
+    The cache maps the identity hash code of a Class to the entries for
+    the classes with that hash code. A Class is specific to its class
+    loader, so classes with the same name from different loaders get their
+    own entries. The cache holds a reference to each Class, so cached
+    classes are never unloaded.
+    
+    The cache can be keyed by the identity of other Java objects too,
+    for instance java.lang.reflect.Methods.
+    '''
+    def __init__(self, factory, attribute="klass"):
+        '''Create a cache
+        
+        :param factory: a function that takes a java.lang.Class and
+                        returns the object to cache.
+        :param attribute: the attribute of the factory's result that
+                          holds the class.
+        '''
+        self.factory = factory
+        self.attribute = attribute
+        self.entries = {}
+        self.lock = threading.Lock()
+        
+    def get(self, klass):
+        '''Return the cached object for the class, creating it if needed'''
+        env = J.get_env()
+        key = env.call_method(
+            klass, _get_method_id("java/lang/Object", "hashCode", "()I"))
+        with self.lock:
+            for entry in self.entries.get(key, []):
+                if env.is_same_object(getattr(entry, self.attribute), klass):
+                    return entry
+        #
+        # The factory may reflect on other classes, so it runs unlocked.
+        #
+        entry = self.factory(klass)
+        with self.lock:
+            candidates = self.entries.setdefault(key, [])
+            for other in candidates:
+                if env.is_same_object(getattr(other, self.attribute), klass):
+                    return other
+            candidates.append(entry)
+        return entry
+
+_class_metadata = _ClassCache(_ClassMetadata)
+
+def get_class_metadata(klass):
+    '''Return the cached reflection metadata for a java.lang.Class
+    
+    :param klass: a java.lang.Class
+    '''
+    return _class_metadata.get(klass)
+
 class JWrapper(object):
     '''A class that wraps a Java object
     
@@ -53,74 +450,55 @@ class JWrapper(object):
         
         :param o: a Java object (class = JB_Object)
         '''
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
         self.o = o
-        self.class_wrapper = J.get_class_wrapper(o)
-        env = J.get_env()
-        jmethods = env.get_object_array_elements(self.class_wrapper.getMethods())
-        methods = {}
-        for jmethod in jmethods:
-            if (J.call(jmethod, "getModifiers", "()I") & STATIC) == STATIC:
-                continue
-            method = J.get_method_wrapper(jmethod)
-            name = method.getName()
-            if name not in methods:
-                methods[name] = []
-                fn = lambda naame=name: lambda *args: self.__call(naame, *args)
-                fn = fn()
-                fn.__doc__ = J.to_string(jmethod)
-                setattr(self, name, fn)
-            else:
-                fn = getattr(self, name)
-                fn.__doc__ = fn.__doc__ +"\n"+J.to_string(jmethod)
-            methods[name].append(method)
-        jfields = env.get_object_array_elements(
-            self.class_wrapper.getFields(self))
-        field_class = env.find_class("java/lang/reflect/Field")
-        method_id = env.get_method_id(
-            field_class, "getName", "()Ljava/lang/String;")
-        self.field_names = [ 
-            env.get_string_utf(env.call_method(o, method_id)) for o in jfields]
-        self.methods = methods
+        metadata = get_class_metadata(_get_class(o))
+        self.class_wrapper = metadata.class_wrapper
+        self.field_names = metadata.field_names
+        self.__metadata = metadata
+        self.methods = metadata.methods
         
     def __getattr__(self, name):
-        if name in ("o", "class_wrapper", "methods", "field_names"):
+        if name in ("o", "class_wrapper", "methods", "field_names",
+                    "_JWrapper__metadata"):
             raise AttributeError()
         if not hasattr(self, "methods") or not hasattr(self, "field_names"):
             # not initialized
             raise AttributeError()
-        if name not in self.field_names:
+        if name in self.__metadata.methods:
+            fn = lambda *args: self.__call(name, *args)
+            fn.__name__ = name
+            fn.__doc__ = self.__metadata.get_method_doc(name)
+            return fn
+        if name not in self.__metadata.fields:
             raise AttributeError()
-        try:
-            jfield = self.class_wrapper.getField(name)
-        except:
+        field = self.__metadata.fields[name]
+        if field.is_static:
             raise AttributeError()
-    
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
-        if (J.call(jfield, "getModifiers", "()I") & STATIC) == STATIC:
-            raise AttributeError()
-        klass = J.call(jfield, "getType", "()Ljava/lang/Class;")
-        result = J.get_field(self.o, name, sig(klass))
+        result = field.get(self.o)
         if isinstance(result, J.JB_Object):
             result = JWrapper(result)
         return result
     
     def __setattr__(self, name, value):
-        if name in ("o", "class_wrapper", "methods", "field_names") or \
-           not hasattr(self, "methods"):
-            object.__setattr__(self, name, value)
-            return
-        try:
-            jfield = self.class_wrapper.getField(name)
-        except:
+        if name in ("o", "class_wrapper", "methods", "field_names",
+                    "_JWrapper__metadata") or \
+           not hasattr(self, "methods") or \
+           name not in self.__metadata.fields:
             object.__setattr__(self, name, value)
             return
-    
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
-        if (J.call(jfield, "getModifiers", "()I") & STATIC) == STATIC:
+        field = self.__metadata.fields[name]
+        if field.is_static:
             raise AttributeError()
-        klass = J.call(jfield, "getType", "()Ljava/lang/Class;")
-        result = J.set_field(self.o, name, sig(klass), value)
+        field.set(self.o, value)
+        
+    def __dir__(self):
+        result = set(dir(type(self)))
+        result.update(self.__dict__)
+        if hasattr(self, "methods"):
+            result.update(self.__metadata.methods)
+            result.update([name for name, field in self.__metadata.fields.items()
+                           if not field.is_static])
+        return sorted(result)
             
     def __call(self, method_name, *args):
         '''Call the appropriate overloaded method with the given name
@@ -129,34 +507,16 @@ class JWrapper(object):
         :param *args: the arguments to the method, which are used to
                       disambiguate between similarly named methods
         '''
+        overload, cargs = self.__metadata.resolve(method_name, args)
         env = J.get_env()
-        last_e = None
-        for method in self.methods[method_name]:
-            params = env.get_object_array_elements(method.getParameterTypes())
-            is_var_args = J.call(method.o, "isVarArgs", "()Z")
-            if len(args) < len(params) - (1 if is_var_args else 0):
-                continue
-            if len(args) > len(params) and not is_var_args:
-                continue
-            if is_var_args:
-                pm1 = len(params)-1
-                args1 = list(args[:pm1]) + [args[pm1:]]
-            else:
-                args1 = args
-            try:
-                cargs = [cast(o, klass) for o, klass in zip(args1, params)]
-            except:
-                last_e = sys.exc_info()[1]
-                continue
-            rtype = J.call(method.o, "getReturnType", "()Ljava/lang/Class;")
-            args_sig = "".join(map(sig, params))
-            rsig = sig(rtype)
-            msig = "(%s)%s" % (args_sig, rsig)
-            result =  J.call(self.o, method_name, msig, *cargs)
-            if isinstance(result, J.JB_Object):
-                result = JWrapper(result)
-            return result
-        raise TypeError("No matching method found for %s" % method_name)
+        result = env.call_method(self.o, overload.method_id, *cargs)
+        jexception = env.exception_occurred()
+        if jexception is not None:
+            raise J.JavaException(jexception)
+        result = J.get_nice_result(result, overload.ret_sig)
+        if isinstance(result, J.JB_Object):
+            result = JWrapper(result)
+        return result
     
     def __repr__(self):
         classname = J.call(J.call(self.o, "getClass", "()Ljava/lang/Class;"), 
@@ -172,39 +532,78 @@ class JWrapper(object):
     def __float__(self):
         return self.floatValue()
 
+    def __is_collection(self):
+        return self.__metadata.is_instance_of(self.o, 'java/util/Collection')
+
     def __len__(self):
-        if not J.is_instance_of(self.o,'java/util/Collection'):
+        if not self.__is_collection():
             raise TypeError("%s is not a Collection and does not support __len__" % self)
-        return self.size()
+        return _call_method(self.o, "java/util/Collection", "size", "()I")
 
     def __getitem__(self, i):
-        if not J.is_instance_of(self.o,'java/util/Collection'):
+        if not self.__is_collection():
             raise TypeError("%s is not a Collection and does not support __getitem__" % self)
         return self.get(i)
 
     def __setitem__(self, i, v):
-        if not J.is_instance_of(self.o,'java/util/Collection'):
+        if not self.__is_collection():
             raise TypeError("%s is not a Collection and does not support __setitem__" % self)
         return self.set(i, v) 
     
-    class Iterator:
-        def __init__(self, o):
-            self.o = o
-            self.i = 0
+    def __iter__(self):
+        if not self.__is_collection():
+            raise TypeError("%s is not a Collection and does not support __iter__" % self)
+        if self.__metadata.is_instance_of(self.o, 'java/util/RandomAccess') and \
+           self.__metadata.is_instance_of(self.o, 'java/util/List'):
+            return _iterate_random_access(self.o)
+        return _iterate(self.o)
 
-        def next(self):
-            return self.__next__()
+#
+# Lists that support random access are fetched this many elements at a time
+#
+_ITERATION_CHUNK_SIZE = 256
 
-        def __next__(self):
-            if self.i == len(self.o):
-                raise StopIteration
-            self.i = self.i +1
-            return self.o[self.i-1]
+def _call_method(o, class_name, method_name, sig, *args):
+    '''Call a method using a cached method ID, raising Java exceptions'''
+    env = J.get_env()
+    result = env.call_method(
+        o, _get_method_id(class_name, method_name, sig), *args)
+    jexception = env.exception_occurred()
+    if jexception is not None:
+        raise J.JavaException(jexception)
+    return result
 
-    def __iter__(self):
-        if not J.is_instance_of(self.o,'java/util/Collection'):
-            raise TypeError("%s is not a Collection and does not support __iter__" % self)
-        return self.Iterator(self)
+def _wrap_element(element):
+    '''Convert a collection element the way JWrapper converts results'''
+    element = J.get_nice_result(element, "Ljava/lang/Object;")
+    if isinstance(element, J.JB_Object):
+        element = JWrapper(element)
+    return element
+
+def _iterate(o):
+    '''Iterate over a java.util.Collection using its java.util.Iterator'''
+    it = _call_method(o, "java/lang/Iterable", "iterator", 
+                      "()Ljava/util/Iterator;")
+    while _call_method(it, "java/util/Iterator", "hasNext", "()Z"):
+        yield _wrap_element(_call_method(
+            it, "java/util/Iterator", "next", "()Ljava/lang/Object;"))
+
+def _iterate_random_access(o):
+    '''Iterate over a random-access java.util.List, a chunk at a time'''
+    env = J.get_env()
+    i = 0
+    while True:
+        size = _call_method(o, "java/util/Collection", "size", "()I")
+        if i >= size:
+            return
+        end = min(size, i + _ITERATION_CHUNK_SIZE)
+        chunk = _call_method(o, "java/util/List", "subList", 
+                             "(II)Ljava/util/List;", i, end)
+        array = _call_method(chunk, "java/util/Collection", "toArray",
+                             "()[Ljava/lang/Object;")
+        for element in env.get_object_array_elements(array):
+            yield _wrap_element(element)
+        i = end
 
 class JClassWrapper(object):
     '''Wrapper for a class
@@ -226,73 +625,58 @@ class JClassWrapper(object):
         
         :param class_name: name of class in dotted form, e.g. java.lang.Integer
         '''
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
         self.cname = class_name.replace(".", "/")
-        self.klass = J.get_class_wrapper(J.class_for_name(class_name), True)
+        metadata = get_class_metadata(J.class_for_name(class_name))
+        self.klass = metadata.class_wrapper
         self.static_methods = {}
-        env = J.get_env()
-        jmethods = env.get_object_array_elements(self.klass.getMethods())
-        methods = {}
-        for jmethod in jmethods:
-            if (J.call(jmethod, "getModifiers", "()I") & STATIC) != STATIC:
-                continue
-            method = J.get_method_wrapper(jmethod)
-            name = method.getName()
-            if name not in methods:
-                methods[name] = []
-                fn = lambda naame=name: lambda *args: self.__call_static(naame, *args)
-                fn = fn()
-                fn.__doc__ = J.to_string(jmethod)
-                setattr(self, name, fn)
-            else:
-                fn = getattr(self, name)
-                fn.__doc__ = fn.__doc__ +"\n"+J.to_string(jmethod)
-            methods[name].append(method)
-        jfields = env.get_object_array_elements(self.klass.getFields(self))
-        field_class = env.find_class("java/lang/reflect/Field")
-        method_id = env.get_method_id(
-            field_class, "getName", "()Ljava/lang/String;")
-        self.field_names = [ 
-            env.get_string_utf(env.call_method(o, method_id)) for o in jfields]
-        self.methods = methods
+        self.field_names = metadata.field_names
+        self.__jclass = J.get_env().find_class(self.cname)
+        self.__metadata = metadata
+        self.methods = metadata.static_methods
         
     def __getattr__(self, name):
         if name in ("klass", "static_methods", "methods", "cname", 
-                    "field_names"):
+                    "field_names", "_JClassWrapper__metadata",
+                    "_JClassWrapper__jclass"):
             raise AttributeError()
         if not hasattr(self, "methods") or not hasattr(self, "field_names"):
             raise AttributeError()
-        if name not in self.field_names:
-            raise AttributeError("Cound not find field %s" % name)
-        try:
-            jfield = self.klass.getField(name)
-        except:
+        if name in self.__metadata.static_methods:
+            fn = lambda *args: self.__call_static(name, *args)
+            fn.__name__ = name
+            fn.__doc__ = self.__metadata.get_method_doc(name, True)
+            return fn
+        if name not in self.__metadata.fields:
             raise AttributeError("Could not find field %s" % name)
-    
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
-        if (J.call(jfield, "getModifiers", "()I") & STATIC) != STATIC:
+        field = self.__metadata.fields[name]
+        if not field.is_static:
             raise AttributeError("Field %s is not static" % name)
-        klass = J.call(jfield, "getType", "()Ljava/lang/Class;")
-        result = J.get_static_field(self.cname, name, sig(klass))
+        result = field.get(self.__jclass)
         if isinstance(result, J.JB_Object):
             result = JWrapper(result)
         return result
     
     def __setattr__(self, name, value):
         if name in ("klass", "static_methods", "methods", "cname", 
-                    "field_names") or not hasattr(self, "methods"):
+                    "field_names", "_JClassWrapper__metadata",
+                    "_JClassWrapper__jclass") or \
+           not hasattr(self, "methods") or \
+           name not in self.__metadata.fields:
             object.__setattr__(self, name, value)
             return
-        try:
-            jfield = self.klass.getField(name)
-        except:
-            return object.__setattr__(self, name, value)
-
-        STATIC = J.get_static_field("java/lang/reflect/Modifier", "STATIC", "I")
-        if (J.call(jfield, "getModifiers", "()I") & STATIC) != STATIC:
+        field = self.__metadata.fields[name]
+        if not field.is_static:
             raise AttributeError()
-        klass = J.call(jfield, "getType", "()Ljava/lang/Class;")
-        result = J.set_static_field(self.cname, name, sig(klass), value)
+        field.set(self.__jclass, value)
+        
+    def __dir__(self):
+        result = set(dir(type(self)))
+        result.update(self.__dict__)
+        if hasattr(self, "methods"):
+            result.update(self.__metadata.static_methods)
+            result.update([name for name, field in self.__metadata.fields.items()
+                           if field.is_static])
+        return sorted(result)
     
     def __call_static(self, method_name, *args):
         '''Call the appropriate overloaded method with the given name
@@ -301,64 +685,27 @@ class JClassWrapper(object):
         :param *args: the arguments to the method, which are used to
                       disambiguate between similarly named methods
         '''
+        overload, cargs = self.__metadata.resolve(method_name, args, True)
         env = J.get_env()
-        last_e = None
-        for method in self.methods[method_name]:
-            params = env.get_object_array_elements(method.getParameterTypes())
-            is_var_args = J.call(method.o, "isVarArgs", "()Z")
-            if len(args) < len(params) - (1 if is_var_args else 0):
-                continue
-            if len(args) > len(params) and not is_var_args:
-                continue
-            if is_var_args:
-                pm1 = len(params)-1
-                args1 = list(args[:pm1]) + [args[pm1:]]
-            else:
-                args1 = args
-            try:
-                cargs = [cast(o, klass) for o, klass in zip(args1, params)]
-            except:
-                last_e = sys.exc_info()[1]
-                continue
-            rtype = J.call(method.o, "getReturnType", "()Ljava/lang/Class;")
-            args_sig = "".join(map(sig, params))
-            rsig = sig(rtype)
-            msig = "(%s)%s" % (args_sig, rsig)
-            result =  J.static_call(self.cname, method_name, msig, *cargs)
-            if isinstance(result, J.JB_Object):
-                result = JWrapper(result)
-            return result
-        raise TypeError("No matching method found for %s" % method_name)
+        result = env.call_static_method(
+            self.__jclass, overload.method_id, *cargs)
+        jexception = env.exception_occurred()
+        if jexception is not None:
+            raise J.JavaException(jexception)
+        result = J.get_nice_result(result, overload.ret_sig)
+        if isinstance(result, J.JB_Object):
+            result = JWrapper(result)
+        return result
 
     def __call__(self, *args):
         '''Constructors'''
+        overload, cargs = self.__metadata.resolve("<init>", args)
         env = J.get_env()
-        jconstructors = self.klass.getConstructors()
-        for jconstructor in env.get_object_array_elements(jconstructors):
-            constructor = J.get_constructor_wrapper(jconstructor)
-            params = env.get_object_array_elements(
-                constructor.getParameterTypes())
-            is_var_args = J.call(constructor.o, "isVarArgs", "()Z")
-            if len(args) < len(params) - (1 if is_var_args else 0):
-                continue
-            if len(args) > len(params) and not is_var_args:
-                continue
-            if is_var_args:
-                pm1 = len(params)-1
-                args1 = list(args[:pm1]) + [args[pm1:]]
-            else:
-                args1 = args
-            try:
-                cargs = [cast(o, klass) for o, klass in zip(args1, params)]
-            except:
-                last_e = sys.exc_info()[1]
-                continue
-            args_sig = "".join(map(sig, params))
-            msig = "(%s)V" % (args_sig)
-            result =  J.make_instance(self.cname, msig, *cargs)
-            result = JWrapper(result)
-            return result
-        raise TypeError("No matching constructor found")
+        result = env.new_object(self.__jclass, overload.method_id, *cargs)
+        jexception = env.exception_occurred()
+        if jexception is not None:
+            raise J.JavaException(jexception)
+        return JWrapper(result)
     
 class JProxy(object):
     '''A wrapper around java.lang.reflect.Proxy
@@ -367,6 +714,13 @@ class JProxy(object):
     `java.lang.reflect.Method` instance to a callable that handles
     the method. You can also subclass JProxy and define methods
     with the same names as the Java methods and they will be called.    
+    Arguments of primitive types are passed as Python values and other
+    arguments as Java objects.
+
+    The proxy's `o` attribute holds the Java object. The Python proxy
+    has to be kept alive for as long as Java might call it. Call
+    `release` to hand the Java object over to Java instead, after
+    which both are garbage-collected once Java no longer refers to it.
 
     An example:
 
@@ -396,7 +750,7 @@ class JProxy(object):
                                 in dotted form (e.g. java.lang.Runnable)
         :param d: an optional dictionary of method name to implementation
         '''
-        self.ref_id, self.ref = J.create_jref(self)
+        self.handle, self.ref = J.create_proxy_handle(self)
         self.__d = d or {}
         jclass = J.class_for_name(base_class_name)
         loader = J.call(jclass, "getClassLoader",
@@ -406,7 +760,7 @@ class JProxy(object):
         env.set_object_array_element(classes, 0, jclass)
         handler = J.make_instance(
             "org/cellprofiler/javabridge/CPythonInvocationHandler",
-            "(Ljava/lang/String;)V", self.ref_id)
+            "(J)V", self.handle)
         self.o = J.static_call(
             "java/lang/reflect/Proxy",
             "newProxyInstance",
@@ -416,17 +770,134 @@ class JProxy(object):
             "Ljava/lang/Object;",
             loader, classes, handler)
         
+    def release(self):
+        '''Hand the Java object over to Java
+        
+        Python no longer holds the Java object and the proxy lives until
+        Java has garbage-collected the Java object, so there is no need to
+        keep a reference to it or lock it with lock_jref. `o` is None
+        afterwards.
+        
+        :returns: the Java object, for instance to pass to a Java method.
+        '''
+        o = self.o
+        if o is None:
+            raise J.JavaError("The proxy has already been released")
+        handler = J.static_call(
+            "java/lang/reflect/Proxy",
+            "getInvocationHandler",
+            "(Ljava/lang/Object;)Ljava/lang/reflect/InvocationHandler;", o)
+        J.lock_jref(self.handle)
+        J.call(handler, "unlockWhenCollected", "()V")
+        self.o = None
+        return o
+        
     def __call__(self, proxy, method, jargs):
-        name = J.call(method, "getName", "()Ljava/lang/String;")
+        proxy_method = _proxy_methods.get(method)
         env = J.get_env()
-        args = tuple(env.get_object_array_elements(jargs))
+        args = env.get_object_array_elements(jargs)
+        if proxy_method.unboxers is not None:
+            args = [arg if unboxer is None else env.call_method(arg, unboxer)
+                    for arg, unboxer in zip(args, proxy_method.unboxers)]
+        name = proxy_method.name
         if name in self.__d:
             result = self.__d[name](*args)
         else:
             result = getattr(self, name)(*args)
-        retclass = J.call(method, "getReturnType", "()Ljava/lang/Class;")
-        return cast(result, retclass)
+        return proxy_method.return_type.cast(result)
+
+#
+# The method IDs of the methods that unbox primitive arguments
+#
+_UNBOXERS = dict(
+    Z=("java/lang/Boolean", "booleanValue"), B=("java/lang/Byte", "byteValue"),
+    C=("java/lang/Character", "charValue"), S=("java/lang/Short", "shortValue"),
+    I=("java/lang/Integer", "intValue"), J=("java/lang/Long", "longValue"),
+    F=("java/lang/Float", "floatValue"), D=("java/lang/Double", "doubleValue"))
+
+class _ProxyMethod(object):
+    '''What JProxy needs to dispatch a call of a java.lang.reflect.Method
     
+    A proxy class passes the same Method objects to every call, so these
+    are cached by the Method's identity and shared by all proxies of the
+    class.
+    '''
+    def __init__(self, method):
+        self.method = method
+        self.name = J.call(method, "getName", "()Ljava/lang/String;")
+        parameter_types = J.get_env().get_object_array_elements(J.call(
+            method, "getParameterTypes", "()[Ljava/lang/Class;"))
+        unboxers = []
+        for parameter_type in parameter_types:
+            parameter_sig = sig(parameter_type)
+            if parameter_sig in _UNBOXERS:
+                class_name, method_name = _UNBOXERS[parameter_sig]
+                unboxers.append(_get_method_id(
+                    class_name, method_name, "()" + parameter_sig))
+            else:
+                unboxers.append(None)
+        if any([unboxer is not None for unboxer in unboxers]):
+            self.unboxers = unboxers
+        else:
+            self.unboxers = None
+        self.return_type = get_java_type(
+            J.call(method, "getReturnType", "()Ljava/lang/Class;"))
+
+_VECTORIZED_CHUNK_SIZE = 4096
+
+class JVectorizedDoubleOperator(object):
+    '''A java.util.function.DoubleUnaryOperator backed by a NumPy function
+
+    The function takes a 1-d array of doubles and returns an array of the
+    results. The Java object, an
+    ``org.cellprofiler.javabridge.VectorizedDoubleOperator``, passes the
+    values given to its ``apply(double[])`` and ``apply(DoubleStream)``
+    methods to the function up to ``chunk_size`` at a time, so a stream
+    of values costs one call into Python per chunk rather than per value.
+
+    An example:
+
+        >>> import javabridge
+        >>> import numpy as np
+        >>> op = javabridge.JVectorizedDoubleOperator(np.sqrt)
+        >>> javabridge.JWrapper(op.o).applyAsDouble(4.0)
+        2.0
+
+    The operator is only valid while this object is alive.
+    '''
+    def __init__(self, fn, chunk_size=_VECTORIZED_CHUNK_SIZE):
+        '''Initialize the operator with its function
+
+        :param fn: a function of a 1-d float64 array returning an array
+                   of the same length
+        :param chunk_size: the maximum number of values passed to ``fn``
+                           in one call
+        '''
+        self.fn = fn
+        self.handle, self.ref = J.create_proxy_handle(self.__apply)
+        self.o = J.make_instance(
+            "org/cellprofiler/javabridge/VectorizedDoubleOperator",
+            "(JI)V", self.handle, chunk_size)
+
+    def __apply(self, values):
+        return np.asarray(self.fn(values), np.float64)
+
+    def __call__(self, values):
+        return self.fn(values)
+
+def vectorized_double_operator(fn=None, chunk_size=_VECTORIZED_CHUNK_SIZE):
+    '''Decorate a NumPy function to make a Java DoubleUnaryOperator
+
+    Use as ``@vectorized_double_operator`` or, to set the number of values
+    passed to the function at a time, as
+    ``@vectorized_double_operator(chunk_size=1024)``. The decorated name
+    is bound to a :py:class:`JVectorizedDoubleOperator`, which can still be
+    called from Python.
+    '''
+    if fn is None:
+        return lambda fn: JVectorizedDoubleOperator(fn, chunk_size)
+    return JVectorizedDoubleOperator(fn, chunk_size)
+
 def importClass(class_name, import_name = None):
     '''Import a wrapped class into the global context
     
@@ -441,31 +912,136 @@ def importClass(class_name, import_name = None):
     frame = inspect.currentframe(1)
     frame.f_locals[import_name] = JClassWrapper(class_name)
 
+_PRIMITIVE_SIGS = dict(
+    void="V", int="I", byte="B", boolean="Z", long="J", float="F", 
+    double="D", char="C", short="S")
+
+class _CastError(TypeError):
+    '''A failure to cast a Java object to a class
+    
+    The message is built when it is needed - overload dispatch discards
+    most of these errors unread.
+    '''
+    def __init__(self, o, java_type):
+        TypeError.__init__(self, o, java_type)
+        self.o = o
+        self.java_type = java_type
+        
+    def __str__(self):
+        classname = J.call(_get_class(self.o), "getName", "()Ljava/lang/String;")
+        return "Object of class %s cannot be cast to %s" % (
+            classname, self.java_type.name)
+
+class JavaType(object):
+    '''What the wrappers need to know about a java.lang.Class
+    
+    Use get_java_type to get the interned JavaType for a class, so that
+    the reflection is done once per class.
+    
+    `klass` is the java.lang.Class, `name` is its name (as returned by
+    Class.getName()), `sig` is its JNI signature, `is_primitive` and
+    `is_array` are its kind and `component_type` is the JavaType of an
+    array's elements or None.
+    '''
+    def __init__(self, klass):
+        self.klass = klass
+        self.name = J.call(klass, "getName", "()Ljava/lang/String;")
+        self.is_primitive = J.call(klass, "isPrimitive", "()Z")
+        self.is_array = J.call(klass, "isArray", "()Z")
+        if self.is_primitive:
+            self.sig = _PRIMITIVE_SIGS[self.name]
+        elif self.is_array:
+            self.sig = self.name.replace(".", "/")
+        else:
+            self.sig = "L%s;" % self.name.replace(".", "/")
+        if self.is_array:
+            self.component_type = get_java_type(
+                J.call(klass, "getComponentType", "()Ljava/lang/Class;"))
+        else:
+            self.component_type = None
+        if self.sig == 'Ljava/lang/CharSequence;':
+            self.__nice_sig = 'Ljava/lang/String;'
+        elif self.is_primitive or self.sig in (
+            'Ljava/lang/String;', 'Ljava/lang/Object;'):
+            self.__nice_sig = self.sig
+        else:
+            self.__nice_sig = None
+        self.__is_instance_id = _get_method_id(
+            "java/lang/Class", "isInstance", "(Ljava/lang/Object;)Z")
+        
+    def cast(self, o):
+        '''Cast the given object to this type
+        
+        :param o: either a Python object or Java object to be cast
+        
+        raises a TypeError if the object can't be cast.
+        '''
+        if self.sig == 'V':
+            return None
+        if o is None:
+            if not self.is_primitive:
+                return None
+            else:
+                raise TypeError("Can't cast None to a primitive type")
+        if isinstance(o, J.JB_Object):
+            if J.get_env().call_method(self.klass, self.__is_instance_id, o):
+                return o
+            raise _CastError(o, self)
+        elif hasattr(o, "o"):
+            return self.cast(o.o)
+        elif not np.isscalar(o):
+            if self.component_type is None:
+                raise TypeError("Argument must not be a sequence")
+            if len(o) > 0:
+                # Test if an element can be cast to the array type
+                self.component_type.cast(o[0])
+            return J.get_nice_arg(o, self.sig)
+        elif self.__nice_sig is not None:
+            if self.sig == 'C' and isinstance(o, basestring) and len(o) != 1:
+                raise TypeError("Failed to convert string of length %d to char" %
+                                len(o))
+            return J.get_nice_arg(o, self.__nice_sig)
+        raise TypeError("Failed to convert argument to %s" % self.sig)
+
+    def converter(self, arg_type):
+        '''Return a function that casts arguments of one type to this type
+        
+        :param arg_type: an argument's entry in a dispatch key - its Python
+                         type or a stand-in for its Java class
+        
+        The function does not check that a Java object is an instance of
+        this type, so only use it for argument types that cast accepted.
+        Whether a string is a char depends on its length, so that
+        conversion still goes through cast.
+        '''
+        if arg_type is type(None):
+            return _return_none
+        if not isinstance(arg_type, type):
+            return _unwrap
+        if self.sig == 'C' and issubclass(arg_type, basestring):
+            return self.cast
+        nice_sig = self.__nice_sig
+        return lambda o: J.get_nice_arg(o, nice_sig)
+
+def _return_none(o):
+    return None
+
+def _unwrap(o):
+    return o.o if hasattr(o, "o") else o
+
+_java_types = _ClassCache(JavaType)
+_proxy_methods = _ClassCache(_ProxyMethod, "method")
+
+def get_java_type(klass):
+    '''Return the interned JavaType for a java.lang.Class
+    
+    :param klass: a java.lang.Class
+    '''
+    return _java_types.get(klass)
+
 def sig(klass):
     '''Return the JNI signature for a class'''
-    name = J.call(klass, "getName", "()Ljava/lang/String;")
-    if not (J.call(klass, "isPrimitive", "()Z") or 
-            J.call(klass, "isArray", "()Z")):
-        name = "L%s;" % name
-    if name == 'void':
-        return "V"
-    if name == 'int':
-        return "I"
-    if name == 'byte':
-        return "B"
-    if name == 'boolean':
-        return "Z"
-    if name == 'long':
-        return "J"
-    if name == 'float':
-        return "F"
-    if name == 'double':
-        return "D"
-    if name == 'char':
-        return "C"
-    if name == 'short':
-        return "S"
-    return name.replace(".", "/")
+    return get_java_type(klass).sig
 
 def cast(o, klass):
     '''Cast the given object to the given class
@@ -475,42 +1051,6 @@ def cast(o, klass):
     
     raises a TypeError if the object can't be cast.
     '''
-    if J.call(klass, "getName", "()Ljava/lang/String;") == 'void':
-        return None
-    is_primitive = J.call(klass, "isPrimitive", "()Z")
-    csig = sig(klass)
-    if o is None:
-        if not is_primitive:
-            return None
-        else:
-            raise TypeError("Can't cast None to a primitive type")
-        
-    if isinstance(o, J.JB_Object):
-        if J.call(klass, "isInstance", "(Ljava/lang/Object;)Z", o):
-            return o
-        classname = J.run_script("o.getClass().getCanonicalName()", dict(o=o))
-        klassname = J.run_script("klass.getCanonicalName()", dict(klass=klass))
-        raise TypeError("Object of class %s cannot be cast to %s",
-                        classname, klassname)
-    elif hasattr(o, "o"):
-        return cast(o.o, klass)
-    elif not np.isscalar(o):
-        component_type = J.call(klass, "getComponentType", "()Ljava/lang/Class;")
-        if component_type is None:
-            raise TypeError("Argument must not be a sequence")
-        if len(o) > 0:
-            # Test if an element can be cast to the array type
-            cast(o[0], component_type)
-        return J.get_nice_arg(o, csig)
-    elif is_primitive or csig in \
-         ('Ljava/lang/String;', 'Ljava/lang/CharSequence;', 
-          'Ljava/lang/Object;'):
-        if csig == 'Ljava/lang/CharSequence;':
-            csig = 'Ljava/lang/String;'
-        elif csig == 'C' and isinstance(o, basestring) and len(o) != 1:
-            raise TypeError("Failed to convert string of length %d to char" %
-                            len(o))
-        return J.get_nice_arg(o, csig)
-    raise TypeError("Failed to convert argument to %s" % csig)
+    return get_java_type(klass).cast(o)
 
 all = [JWrapper, JClassWrapper]
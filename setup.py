@@ -252,7 +252,15 @@ class build_ext(_build_ext):
         library_dirs = [python_lib_dir]
         output_dir = os.path.join(os.path.dirname(
             self.get_ext_fullpath("javabridge.jars")), "jars")
-        export_symbols = ['Java_org_cellprofiler_javabridge_CPython_exec']
+        export_symbols = ['Java_org_cellprofiler_javabridge_CPython_exec',
+                          'Java_org_cellprofiler_javabridge_CPython_compile',
+                          'Java_org_cellprofiler_javabridge_CPython_execCode',
+                          'Java_org_cellprofiler_javabridge_CPython_releaseCode',
+                          'Java_org_cellprofiler_javabridge_CPython_invokeProxy',
+                          'Java_org_cellprofiler_javabridge_CPython_call',
+                          'Java_org_cellprofiler_javabridge_CPython_eval',
+                          'Java_org_cellprofiler_javabridge_CPython_statistics',
+                          'Java_org_cellprofiler_javabridge_CPython_setPersistentThreadStates']
         objects = self.compiler.compile(sources,
                                         output_dir=self.build_temp,
                                         include_dirs=include_dirs,
@@ -309,13 +317,17 @@ class build_ext(_build_ext):
         jar = 'javabridge.jars.cpython'
         sources = [
             'java/org/cellprofiler/javabridge/CPython.java',
-            'java/org/cellprofiler/javabridge/CPythonInvocationHandler.java']
+            'java/org/cellprofiler/javabridge/CPythonInvocationHandler.java',
+            'java/org/cellprofiler/javabridge/VectorizedDoubleOperator.java']
         self.build_jar_from_sources(jar, sources)
 
     def build_test(self):
         jar = 'javabridge.jars.test'
-        source = 'java/org/cellprofiler/javabridge/test/RealRect.java'
-        self.build_jar_from_single_source(jar, source)
+        sources = [
+            'java/org/cellprofiler/javabridge/test/RealRect.java',
+            'java/org/cellprofiler/javabridge/test/NativeKernel.java',
+            'java/org/cellprofiler/javabridge/test/HiddenFieldRect.java']
+        self.build_jar_from_sources(jar, sources)
 
     def build_java(self):
         self.build_runnablequeue()
@@ -397,7 +409,7 @@ cell image analysis software CellProfiler (cellprofiler.org).''',
                        ],
           license='BSD License',
           setup_requires=['cython', 'numpy'],
-          install_requires=['numpy'],
+          install_requires=['numpy', 'futures; python_version < "3"'],
           tests_require="nose",
           entry_points={'nose.plugins.0.10': [
                 'javabridge = javabridge.noseplugin:JavabridgePlugin'